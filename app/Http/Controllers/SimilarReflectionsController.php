@@ -17,8 +17,12 @@ public function index(Request $request, Event $event, VectorSearchService $vecto
 
         $similar = $vectorSearch->findSimilar($event, limit: 5);
 
+        // Public reflections by other users on the same theme
+        $community = $vectorSearch->findCommunitySimilar($event, limit: 3);
+
         return response()->json([
             'similar_reflections' => $similar,
+            'community_reflections' => $community,
         ]);
     }
 }
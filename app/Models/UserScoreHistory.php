@@ -17,6 +17,7 @@ class UserScoreHistory extends Model
         'recorded_at',
         'overall_score',
         'delta',
+        'weights_version',
     ];
 
     protected $casts = [
@@ -49,6 +49,6 @@ public function updated(Event $event): void
      */
     public function deleted(Event $event): void
     {
-        // Nothing to do for now
+        $this->vectorSearch->removeFromAnnIndex($event->id);
     }
 }
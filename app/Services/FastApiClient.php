@@ -13,19 +13,28 @@ public function __construct()
         $this->base = config('fastapi.url', env('FASTAPI_URL'));
     }
 
+    /**
+     * Pending request with our timeout, which FastAPI also uses as the
+     * deadline for its upstream (Gemini) calls.
+     */
+    protected function http($timeout)
+    {
+        return Http::timeout($timeout)->withHeaders(['X-Request-Timeout' => $timeout]);
+    }
+
     public function predict(array $payload, $timeout = 5)
     {
-        return Http::timeout($timeout)->post($this->base . '/predict', $payload);
+        return $this->http($timeout)->post($this->base . '/predict', $payload);
     }
 
     public function questions($timeout = 5)
     {
-        return Http::timeout($timeout)->get($this->base . '/questions');
+        return $this->http($timeout)->get($this->base . '/questions');
     }
 
     public function initQuiz(array $answers, $timeout = 10)
     {
-        return Http::timeout($timeout)->post($this->base . '/scoring/init-quiz', [
+        return $this->http($timeout)->post($this->base . '/scoring/init-quiz', [
             'answers' => $answers,
         ]);
     }
@@ -40,7 +49,7 @@ public function diagnosticStart(string $userInput, ?array $currentScores = null,
             $payload['event_context'] = $eventContext;
         }
 
-        return Http::timeout($timeout)->post($this->base . '/diagnostic/start', $payload);
+        return $this->http($timeout)->post($this->base . '/diagnostic/start', $payload);
     }
 
     public function diagnosticAnswer(array $state, string $answer, ?array $currentScores = null, ?array $eventContext = null, $timeout = 60)
@@ -56,6 +65,35 @@ public function diagnosticAnswer(array $state, string $answer, ?array $currentSc
             $payload['event_context'] = $eventContext;
         }
 
-        return Http::timeout($timeout)->post($this->base . '/diagnostic/answer', $payload);
+        return $this->http($timeout)->post($this->base . '/diagnostic/answer', $payload);
+    }
+
+    /**
+     * Queue the analysis instead of waiting for it. The response carries a job_id
+     * to poll with job(); with $callbackUrl the finished job is POSTed there.
+     */
+    public function diagnosticAnswerAsync(array $state, string $answer, ?array $currentScores = null, ?array $eventContext = null, ?string $callbackUrl = null, string $priority = 'interactive', $timeout = 5)
+    {
+        $payload = [
+            'state' => $state,
+            'answer' => $answer,
+            'priority' => $priority,
+        ];
+        if ($currentScores) {
+            $payload['current_scores'] = $currentScores;
+        }
+        if ($eventContext) {
+            $payload['event_context'] = $eventContext;
+        }
+        if ($callbackUrl) {
+            $payload['callback_url'] = $callbackUrl;
+        }
+
+        return $this->http($timeout)->post($this->base . '/diagnostic/answer/async', $payload);
+    }
+
+    public function job(string $jobId, $timeout = 5)
+    {
+        return $this->http($timeout)->get($this->base . '/jobs/' . $jobId);
     }
 }
@@ -16,13 +16,16 @@ public function __construct()
     }
 
     /**
-     * Generate embedding for text using FastAPI
+     * Generate embedding for text using FastAPI.
+     * With a $docId, FastAPI may answer null for a near-identical re-embed of
+     * that document (dedupe policy "skip"); the stored vector is then kept.
      */
-    public function generateEmbedding(string $text): ?array
+    public function generateEmbedding(string $text, ?string $docId = null): ?array
     {
         try {
-            $response = Http::timeout(30)->post("{$this->fastApiUrl}/embeddings/generate", [
+            $response = Http::timeout(30)->withHeaders(['X-Request-Timeout' => 30])->post("{$this->fastApiUrl}/embeddings/generate", [
                 'text' => $text,
+                'doc_id' => $docId,
             ]);
 
             if ($response->successful()) {
@@ -47,19 +50,97 @@ public function indexReflection(Event $event): void
             // Build full text for embedding
             $fullText = $this->buildFullText($event);
             
-            // Generate embedding via FastAPI
-            $embedding = $this->generateEmbedding($fullText);
+            // Generate embedding via FastAPI; only an event that already has a
+            // vector may be told its new text is close enough to keep it
+            $embedding = $this->generateEmbedding($fullText, $event->embedding ? "event:{$event->id}" : null);
 
             if ($embedding) {
                 // Store embedding in the database
                 $event->embedding = $embedding;
                 $event->saveQuietly(); // Don't trigger observer again
             }
+
+            if ($event->embedding) {
+                $this->syncAnnIndex($event);
+            }
         } catch (\Exception $e) {
             Log::error("Failed to index reflection {$event->id}: " . $e->getMessage());
         }
     }
 
+    /**
+     * Add or refresh the event in FastAPI's cross-user ANN index and its
+     * lexical index (visibility and label may change without the text changing)
+     */
+    public function syncAnnIndex(Event $event): void
+    {
+        $response = Http::timeout(10)->withHeaders(['X-Request-Timeout' => 10])->put("{$this->fastApiUrl}/embeddings/index/{$event->id}", [
+            'user_id' => $event->user_id,
+            'is_public' => (bool) $event->is_public,
+            'label' => $event->identification->tag ?? null,
+            'embedding' => $event->embedding,
+            'text' => $this->buildFullText($event),
+        ]);
+
+        if (!$response->successful()) {
+            Log::warning("ANN index update failed for event {$event->id}: " . $response->body());
+        }
+    }
+
+    /**
+     * Remove a deleted event from the ANN index
+     */
+    public function removeFromAnnIndex(int $eventId): void
+    {
+        try {
+            Http::timeout(10)->withHeaders(['X-Request-Timeout' => 10])->delete("{$this->fastApiUrl}/embeddings/index/{$eventId}");
+        } catch (\Exception $e) {
+            Log::warning("ANN index removal failed for event {$eventId}: " . $e->getMessage());
+        }
+    }
+
+    /**
+     * Similar public reflections by other users ("community learning"), via the ANN index
+     */
+    public function findCommunitySimilar(Event $event, int $limit = 5): array
+    {
+        if (!$event->embedding) {
+            return [];
+        }
+
+        try {
+            $response = Http::timeout(10)->withHeaders(['X-Request-Timeout' => 10])->post("{$this->fastApiUrl}/embeddings/search", [
+                'embedding' => $event->embedding,
+                'k' => $limit,
+                'public_only' => true,
+                'exclude_user_id' => $event->user_id,
+            ]);
+
+            if (!$response->successful()) {
+                Log::warning('Community search failed: ' . $response->body());
+                return [];
+            }
+
+            $scores = collect($response->json('results'))->pluck('score', 'id');
+            $events = Event::whereIn('id', $scores->keys())->where('is_public', true)->get()->keyBy('id');
+
+            return $scores
+                ->filter(fn ($score, $id) => $events->has($id))
+                ->map(fn ($score, $id) => [
+                    'id' => $id,
+                    'title' => $events[$id]->title,
+                    'description' => $events[$id]->description,
+                    'similarity_score' => $score,
+                    'created_at' => $events[$id]->created_at->timestamp,
+                ])
+                ->values()
+                ->all();
+        } catch (\Exception $e) {
+            Log::error('Community search failed: ' . $e->getMessage());
+            return [];
+        }
+    }
+
     /**
      * Find similar reflections using cosine similarity
      */
@@ -75,16 +156,49 @@ public function findSimilar(Event $event, int $limit = 5): array
                 return [];
             }
 
-            // Find similar events using cosine similarity
-            $similar = $this->cosineSimilaritySearch($event->user_id, $event->id, $embedding, $limit);
-
-            return $similar;
+            // FastAPI serves a precomputed neighbour list; scan here only if it can't answer
+            return $this->fastApiSimilar($event, $limit)
+                ?? $this->cosineSimilaritySearch($event->user_id, $event->id, $embedding, $limit);
         } catch (\Exception $e) {
             Log::error('Vector search failed: ' . $e->getMessage());
             return [];
         }
     }
 
+    /**
+     * The user's most similar reflections, precomputed by FastAPI when events are indexed; null if unavailable
+     */
+    private function fastApiSimilar(Event $event, int $limit): ?array
+    {
+        try {
+            $response = Http::timeout(5)->withHeaders(['X-Request-Timeout' => 5])->get("{$this->fastApiUrl}/embeddings/events/{$event->id}/neighbors", [
+                'k' => $limit,
+            ]);
+        } catch (\Exception $e) {
+            return null;
+        }
+
+        if (!$response->successful()) {
+            return null;
+        }
+
+        $scores = collect($response->json('results'))->pluck('score', 'id');
+        $events = Event::whereIn('id', $scores->keys())->with('identification')->get()->keyBy('id');
+
+        return $scores
+            ->filter(fn ($score, $id) => $events->has($id))
+            ->map(fn ($score, $id) => [
+                'id' => $id,
+                'title' => $events[$id]->title,
+                'description' => $events[$id]->description,
+                'category' => $events[$id]->identification->main_category ?? null,
+                'similarity_score' => $score,
+                'created_at' => $events[$id]->created_at->timestamp,
+            ])
+            ->values()
+            ->all();
+    }
+
     /**
      * Perform cosine similarity search in SQLite
      */
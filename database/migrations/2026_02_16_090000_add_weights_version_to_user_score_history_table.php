@@ -0,0 +1,23 @@
+<?php
+
+use Illuminate\Database\Migrations\Migration;
+use Illuminate\Database\Schema\Blueprint;
+use Illuminate\Support\Facades\Schema;
+
+return new class extends Migration
+{
+    public function up(): void
+    {
+        Schema::table('user_score_history', function (Blueprint $table) {
+            // Scoring weight table version (fastapi/app/weights.py) that produced the point
+            $table->string('weights_version', 64)->nullable()->after('delta');
+        });
+    }
+
+    public function down(): void
+    {
+        Schema::table('user_score_history', function (Blueprint $table) {
+            $table->dropColumn('weights_version');
+        });
+    }
+};
@@ -0,0 +1,24 @@
+<?php
+
+use Illuminate\Database\Migrations\Migration;
+use Illuminate\Database\Schema\Blueprint;
+use Illuminate\Support\Facades\Schema;
+
+return new class extends Migration
+{
+    public function up(): void
+    {
+        Schema::create('user_score_versions', function (Blueprint $table) {
+            // Version of the scores kept by the FastAPI score store (fastapi/app/repositories/scores.py).
+            // Only that store bumps it; Laravel's own history writes leave it alone.
+            $table->foreignId('user_id')->primary()->constrained()->onDelete('cascade');
+            $table->unsignedBigInteger('version')->default(0);
+            $table->timestamps();
+        });
+    }
+
+    public function down(): void
+    {
+        Schema::dropIfExists('user_score_versions');
+    }
+};
@@ -1,8 +1,40 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from .routers import diagnostic_router, predict_router, questions_router, root_router, scoring_router, embeddings_router
+from fastapi.responses import JSONResponse
+
+from .deadline import RequestDeadlineMiddleware
+from .responses import FastJSONResponse, fast_json_enabled
+from .routers import diagnostic_router, predict_router, questions_router, root_router, scoring_router, embeddings_router, jobs_router
+from .services.jobs import job_queue
+from .services.percentiles import cohort_sketches
+from .services.shared_cache import shared_cache
+from .settings import settings
+from .weights import active_weights
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    active_weights()  # a missing or invalid SCORING_WEIGHTS_VERSION fails startup, not the first request
+    await asyncio.to_thread(shared_cache.warm, settings.SHARED_CACHE_WARM_ENTRIES)
+    await job_queue.start()
+    await cohort_sketches.start()
+    try:
+        yield
+    finally:
+        await job_queue.stop()
+        await cohort_sketches.stop()
+
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="FastAPI prototype for Laravel")
+    app = FastAPI(
+        title="FastAPI prototype for Laravel",
+        default_response_class=FastJSONResponse if fast_json_enabled() else JSONResponse,
+        lifespan=lifespan,
+    )
+
+    app.add_middleware(RequestDeadlineMiddleware)
 
     app.include_router(root_router)
     app.include_router(predict_router)
@@ -10,5 +42,6 @@ def create_app() -> FastAPI:
     app.include_router(questions_router)
     app.include_router(embeddings_router)
     app.include_router(diagnostic_router)
+    app.include_router(jobs_router)
 
     return app
@@ -0,0 +1,26 @@
+"""
+Maintenance for the binary embedding store (app/services/embedding_store.py).
+
+    uv run python -m app.commands.embedding_store stats
+    uv run python -m app.commands.embedding_store compact
+
+Deletes already compact the store once a quarter of its rows are dead; `compact`
+does it now, e.g. after bulk re-embedding has replaced most vectors.
+"""
+
+import argparse
+import json
+
+from app.services.embedding_store import embedding_store
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=["stats", "compact"])
+    opts = parser.parse_args()
+    result = embedding_store.compact() if opts.action == "compact" else embedding_store.stats()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
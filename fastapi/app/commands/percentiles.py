@@ -0,0 +1,50 @@
+"""
+Maintenance for the cohort percentile sketches (app/services/percentiles.py).
+
+    uv run python -m app.commands.percentiles summary
+    uv run python -m app.commands.percentiles rebuild
+
+The sketches grow with every score update, so active users weigh more than
+users who rarely log. `rebuild` replaces them with one sample per user and key
+(the current score in user_label_history), e.g. nightly.
+"""
+
+import argparse
+import json
+from typing import Dict
+
+from sqlalchemy import text
+
+from app.database import read_engine
+from app.services.percentiles import TDigest, cohort_sketches
+
+
+def rebuild() -> Dict[str, int]:
+    digests: Dict[str, TDigest] = {}
+    with read_engine.connect() as conn:
+        rows = conn.execution_options(stream_results=True).execute(text(
+            "SELECT h.label_key, h.score FROM user_label_history h "
+            "JOIN (SELECT user_id, label_key, MAX(recorded_at) AS recorded_at"
+            "      FROM user_label_history GROUP BY user_id, label_key) latest"
+            "  ON latest.user_id = h.user_id AND latest.label_key = h.label_key"
+            "  AND latest.recorded_at = h.recorded_at"
+        ))
+        for key, score in rows:
+            digest = digests.get(key)
+            if digest is None:
+                digest = digests[key] = TDigest()
+            digest.add(float(score))
+    cohort_sketches.replace_all(digests)
+    return {key: int(digest.count) for key, digest in sorted(digests.items())}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=["summary", "rebuild"])
+    opts = parser.parse_args()
+    result = rebuild() if opts.action == "rebuild" else cohort_sketches.summary()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
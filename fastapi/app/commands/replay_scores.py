@@ -0,0 +1,128 @@
+"""
+Re-score every user from the score log (app/services/score_log.py) with a
+weight table (app/weights.py).
+
+    uv run python -m app.commands.replay_scores --weights v2
+    uv run python -m app.commands.replay_scores --base-penalty 4 --severity-multiplier 0.6
+    SCORE_STORE=database SCORING_WEIGHTS_VERSION=v2 uv run python -m app.commands.replay_scores --write
+
+--weights picks the table (default: the active one, SCORING_WEIGHTS_VERSION), and
+--base-reward / --base-penalty / --severity-multiplier override its constants
+for a quick what-if. Without --write it is a dry run. The dry run reports how
+far each user's current overall score would move compared with the active table.
+
+--write is the recompute job for a new version. It stores the replayed scores,
+including the rebuilt line chart history, tagged with the version. It only
+runs with the active table, so switch SCORING_WEIGHTS_VERSION and restart the
+API first: users scored between the restart and the recompute are recomputed
+too. It needs SCORE_STORE=database, because the in-memory store lives inside
+the API process. A user who is updated while the job runs keeps the newer
+state and is reported as a conflict; rerun to pick them up.
+
+Only users with a quiz or PUT in the score log can be replayed: the log holds
+no events for scores that Laravel wrote straight into user_score_history /
+user_label_history, or that predate the log, so there is nothing to re-score.
+--write leaves those users on their old weights_version and reports how many
+there are as `not_in_log`; re-initialise them (quiz or PUT through the
+stateful routes) to bring them under the log.
+"""
+
+import argparse
+import dataclasses
+import json
+import logging
+import sys
+
+import numpy as np
+from sqlalchemy import text
+
+from app.database import read_engine
+from app.services.score_log import score_log
+from app.services.score_replay import ReplayProgress, replay_all
+from app.services.score_store import UnknownUser, VersionConflict, score_store
+from app.settings import settings
+from app.weights import active_weights, load_weights
+
+logger = logging.getLogger("app.commands.replay_scores")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default=settings.SCORING_WEIGHTS_VERSION, help="weight table version")
+    parser.add_argument("--base-reward", type=float)
+    parser.add_argument("--base-penalty", type=float)
+    parser.add_argument("--severity-multiplier", type=float)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--write", action="store_true", help="store the replayed scores")
+    opts = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+
+    try:
+        active, table = active_weights(), load_weights(opts.weights)
+    except ValueError as exc:
+        sys.exit(str(exc))
+    overrides = {
+        name: value
+        for name, value in (
+            ("base_reward", opts.base_reward),
+            ("base_penalty", opts.base_penalty),
+            ("severity_multiplier", opts.severity_multiplier),
+        )
+        if value is not None
+    }
+    if overrides:
+        table = dataclasses.replace(table, **overrides, version=f"{table.version}+overrides")
+    if opts.write and table != active:
+        sys.exit(f"--write replays with the active weight table ({active.version}); set SCORING_WEIGHTS_VERSION first")
+    if opts.write and settings.SCORE_STORE != "database":
+        sys.exit("--write needs SCORE_STORE=database")
+
+    def report(progress: ReplayProgress) -> None:
+        logger.info("replayed %s", progress.as_dict())
+
+    shifts, written, conflicts = [], 0, 0
+    for result in replay_all(
+        score_log,
+        table,
+        workers=opts.workers,
+        chunk_size=opts.chunk_size,
+        baseline=None if opts.write else active,
+        on_progress=report,
+    ):
+        if not opts.write:
+            shifts.append(result.user.line_chart_history[-1].overall_score - result.baseline_overall)
+            continue
+        try:
+            score_store.put(result.user_id, result.user, expected_version=result.version, origin="replay")
+            written += 1
+        except (VersionConflict, UnknownUser):
+            conflicts += 1
+
+    if opts.write:
+        with read_engine.connect() as conn:
+            stored = {user_id for (user_id,) in conn.execute(text("SELECT DISTINCT user_id FROM user_score_history"))}
+        summary = {
+            "weights_version": table.version,
+            "written": written,
+            "conflicts": conflicts,
+            "not_in_log": len(stored - set(score_log.user_ids())),
+        }
+    else:
+        users = len(shifts)
+        shifts = np.abs(np.array(shifts)) if shifts else np.zeros(1)
+        summary = {
+            "weights_version": table.version,
+            "compared_with": active.version,
+            "fingerprint": table.fingerprint,
+            "users": users,
+            "changed": int((shifts > 0).sum()),
+            "mean_abs_overall_shift": round(float(shifts.mean()), 3),
+            "p95_abs_overall_shift": round(float(np.percentile(shifts, 95)), 3),
+            "max_abs_overall_shift": round(float(shifts.max()), 3),
+        }
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Multi-worker launcher.
+
+    uv run python -m app.commands.serve --workers 4
+
+Prepares the shared cache file once in the parent, then runs uvicorn's
+process supervisor with that many workers on one socket. Send SIGHUP to the
+parent for a rolling reload: workers are replaced one at a time, each new one
+warming its front cache from the shared tier, so no worker starts cold.
+"""
+
+import argparse
+import logging
+import os
+
+import uvicorn
+
+from app.services.shared_cache import shared_cache
+from app.settings import settings
+
+logger = logging.getLogger("app.commands.serve")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=settings.FASTAPI_WORKERS)
+    parser.add_argument("--host", default=settings.FASTAPI_HOST)
+    parser.add_argument("--port", type=int, default=settings.FASTAPI_PORT)
+    opts = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+
+    if opts.workers > 1:
+        if settings.SCORE_STORE == "memory":
+            logger.warning("SCORE_STORE=memory keeps stateful scores per worker; use SCORE_STORE=database")
+        if not settings.JOB_QUEUE_PERSIST:
+            logger.warning("JOB_QUEUE_PERSIST is off: a job can only be polled on the worker that accepted it")
+
+    shared_cache.setup()
+    logger.info("Shared cache at %s; reload with: kill -HUP %d", shared_cache.path, os.getpid())
+
+    uvicorn.run(
+        "main:app",
+        host=opts.host,
+        port=opts.port,
+        workers=opts.workers,
+        timeout_graceful_shutdown=settings.GRACEFUL_SHUTDOWN_S,
+    )
+
+
+if __name__ == "__main__":
+    main()
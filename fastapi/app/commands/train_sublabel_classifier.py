@@ -0,0 +1,138 @@
+"""
+Train the local sub-label classifier (app/services/sublabel_classifier.py) from
+past analyzer results.
+
+    uv run python -m app.commands.train_sublabel_classifier
+    uv run python -m app.commands.train_sublabel_classifier --holdout 0.2 --seed 7
+
+Each ai_diagnostic_results row attached to an event becomes one example: the
+event's vector (from the embedding store, else the events.embedding column)
+and the target `derive_target` reads from its sub-label scores. The model is
+first fitted on all but a held-out share and evaluated there, then refitted on
+everything and saved. The evaluation lands in
+sublabel_classifier_report.json next to the model.
+"""
+
+import argparse
+import json
+import logging
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from app.database import read_engine
+from app.services.embedding_store import embedding_store
+from app.services.sublabel_classifier import Prediction, SublabelClassifier, derive_target, model_path
+from app.settings import settings
+
+logger = logging.getLogger("app.commands.train_sublabel_classifier")
+
+Target = Tuple[str, bool, float]
+
+
+def load_examples() -> Tuple[np.ndarray, List[Target]]:
+    with read_engine.connect() as conn:
+        rows = conn.execute(text(
+            """
+            SELECT r.event_id, r.sublabel_scores, e.embedding
+            FROM ai_diagnostic_results r
+            JOIN events e ON e.id = r.event_id
+            WHERE r.sublabel_scores IS NOT NULL
+            ORDER BY r.id
+            """
+        )).fetchall()
+
+    vectors, targets = [], []
+    for event_id, sublabel_scores, embedding in rows:
+        target = derive_target(json.loads(sublabel_scores) if isinstance(sublabel_scores, str) else sublabel_scores)
+        vector = embedding_store.get(event_id)
+        if vector is None and embedding:
+            vector = json.loads(embedding) if isinstance(embedding, str) else embedding
+        if target is None or vector is None:
+            continue
+        vectors.append(np.asarray(vector, dtype=np.float32))
+        targets.append(target)
+    if len({len(vector) for vector in vectors}) > 1:
+        dim = Counter(len(vector) for vector in vectors).most_common(1)[0][0]
+        logger.warning("Dropping vectors that are not %d-dimensional (older embedding model)", dim)
+        kept = [i for i, vector in enumerate(vectors) if len(vector) == dim]
+        vectors, targets = [vectors[i] for i in kept], [targets[i] for i in kept]
+    return (np.stack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)), targets
+
+
+def fit(vectors: np.ndarray, targets: Sequence[Target]) -> SublabelClassifier:
+    sublabels, improvements, magnitudes = zip(*targets)
+    return SublabelClassifier.fit(vectors, sublabels, improvements, magnitudes)
+
+
+def evaluate(
+    classifier: SublabelClassifier, vectors: np.ndarray, targets: Sequence[Target], threshold: float
+) -> Dict:
+    predictions: List[Prediction] = classifier.predict_many(vectors)
+    truth = [target[0] for target in targets]
+    hits = np.array([p.sublabel == t for p, t in zip(predictions, truth)])
+    top3 = classifier.top_k(vectors, 3)
+
+    per_class = {}
+    for name in sorted(set(truth) | {p.sublabel for p in predictions}):
+        tp = sum(1 for p, t in zip(predictions, truth) if p.sublabel == name and t == name)
+        predicted = sum(1 for p in predictions if p.sublabel == name)
+        actual = truth.count(name)
+        precision = tp / predicted if predicted else 0.0
+        recall = tp / actual if actual else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        per_class[name] = {"support": actual, "precision": round(precision, 3), "recall": round(recall, 3), "f1": round(f1, 3)}
+
+    confident = np.array([p.confidence >= threshold for p in predictions])
+    exact = hits & np.array([p.is_improvement == t[1] for p, t in zip(predictions, targets)])
+    return {
+        "examples": len(targets),
+        "sublabel_accuracy": round(float(hits.mean()), 4),
+        "sublabel_top3_accuracy": round(float(np.mean([t in top for t, top in zip(truth, top3)])), 4),
+        "majority_baseline_accuracy": round(Counter(truth).most_common(1)[0][1] / len(truth), 4),
+        "macro_f1": round(float(np.mean([c["f1"] for c in per_class.values() if c["support"]])), 4),
+        "polarity_accuracy": round(float(np.mean([p.is_improvement == t[1] for p, t in zip(predictions, targets)])), 4),
+        "magnitude_mae": round(float(np.mean([abs(p.magnitude - t[2]) for p, t in zip(predictions, targets)])), 4),
+        # What routing at the threshold would do: the share answered locally and how good those answers are
+        "min_confidence": threshold,
+        "local_coverage": round(float(confident.mean()), 4),
+        "local_accuracy": round(float(exact[confident].mean()), 4) if confident.any() else None,
+        "per_class": per_class,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--holdout", type=float, default=0.2, help="share of examples held out for evaluation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-examples", type=int, default=50)
+    opts = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+
+    vectors, targets = load_examples()
+    if len(targets) < opts.min_examples or len({t[0] for t in targets}) < 2:
+        raise SystemExit(f"Not enough training data: {len(targets)} examples (need {opts.min_examples}, 2+ sub-labels)")
+
+    order = np.random.default_rng(opts.seed).permutation(len(targets))
+    cut = int(len(order) * (1 - opts.holdout))
+    train, test = order[:cut], order[cut:]
+    report = evaluate(
+        fit(vectors[train], [targets[i] for i in train]),
+        vectors[test],
+        [targets[i] for i in test],
+        settings.SUBLABEL_CLASSIFIER_MIN_CONFIDENCE,
+    )
+
+    classifier = fit(vectors, targets)
+    path = model_path()
+    classifier.save(path)
+    report = {"trained_on": classifier.trained_on, "classes": len(classifier.classes), "holdout": report}
+    path.with_name("sublabel_classifier_report.json").write_text(json.dumps(report, indent=2))
+    logger.info("Saved %s", path)
+    print(json.dumps({k: v for k, v in report["holdout"].items() if k != "per_class"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Scoring weight tables (app/weights.py).
+
+    uv run python -m app.commands.weights list
+    uv run python -m app.commands.weights show v1
+    uv run python -m app.commands.weights export v1 --as v2
+
+`export` copies a table into SCORING_WEIGHTS_PATH under a new version, as the
+starting point for tuning. Edit the new file, check it with `show`, compare it
+with `app.commands.replay_scores --weights v2`, then roll it out by setting
+SCORING_WEIGHTS_VERSION.
+"""
+
+import argparse
+import json
+import sys
+
+from app.weights import WeightTable, active_weights, available_weights, load_weights, weights_dir
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=["list", "show", "export"])
+    parser.add_argument("version", nargs="?")
+    parser.add_argument("--as", dest="new_version", help="export: the new version's name")
+    opts = parser.parse_args()
+
+    if opts.action == "list":
+        active = active_weights().version
+        for version in available_weights():
+            print(f"{version}{'  (active)' if version == active else ''}")
+        return
+
+    try:
+        table = load_weights(opts.version or active_weights().version)
+        if opts.action == "show":
+            print(json.dumps({**table.to_dict(), "fingerprint": table.fingerprint}, indent=2))
+            return
+        if not opts.new_version:
+            sys.exit("export needs --as NEW_VERSION")
+        path = weights_dir() / f"{opts.new_version}.json"
+        if opts.new_version in available_weights():
+            sys.exit(f"{opts.new_version} already exists; published versions are never edited")
+        copy = WeightTable.from_dict({**table.to_dict(), "version": opts.new_version})
+    except ValueError as exc:
+        sys.exit(str(exc))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(copy.to_dict(), indent=2) + "\n")
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
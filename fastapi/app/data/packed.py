@@ -0,0 +1,195 @@
+"""
+Array-backed UserScores, for holding many users in memory (the in-memory score
+store, batch jobs).
+
+A UserScores pays for a dict per score map and, per history point, a
+LineChartPoint, a datetime and two floats. PackedUserScores keeps the label and
+sub-label scores in fixed-order float arrays (wire.LABEL_ORDER /
+wire.SUBLABEL_ORDER, NaN = no score) and the history as three columns: epoch
+microseconds, overall and delta, 24 bytes a point.
+
+`label_scores`, `sublabel_scores` and `line_chart_history` are live views with
+the dict / list interface of the UserScores fields, so the functions in
+app/scoring_update.py run on a PackedUserScores unchanged. History points are
+built on access: changing a field of a returned LineChartPoint does not change
+the stored history, so assign the item instead. Sub-label keys outside the
+taxonomy are dropped, as in the wire format.
+"""
+
+from __future__ import annotations
+
+import math
+from array import array
+from collections.abc import Iterable, Mapping, MutableMapping, MutableSequence
+from datetime import datetime
+from typing import Any, Iterator
+
+from app.constants import DEFAULT_SCORE
+from app.data import wire
+from app.data.user_score import LineChartPoint, UserScores
+
+_LABEL_INDEX = {label: i for i, label in enumerate(wire.LABEL_ORDER)}
+_SUBLABEL_KEYS = [member.value for member in wire.SUBLABEL_ORDER]
+_NAN = math.nan
+
+
+class _ScoreMap(MutableMapping):
+    """dict-like view over a fixed-order score array; NaN slots are absent keys."""
+
+    __slots__ = ("_values", "_keys", "_index")
+
+    def __init__(self, values: array, keys: list, index: dict) -> None:
+        self._values, self._keys, self._index = values, keys, index
+
+    def __getitem__(self, key: Any) -> float:
+        i = self._index.get(key)
+        if i is None or self._values[i] != self._values[i]:
+            raise KeyError(key)
+        return self._values[i]
+
+    def __setitem__(self, key: Any, score: float) -> None:
+        i = self._index.get(key)
+        if i is None:
+            raise KeyError(key)
+        self._values[i] = score
+
+    def __delitem__(self, key: Any) -> None:
+        self[key]  # KeyError when absent
+        self._values[self._index[key]] = _NAN
+
+    def __contains__(self, key: object) -> bool:
+        i = self._index.get(key)
+        return i is not None and self._values[i] == self._values[i]
+
+    def __iter__(self) -> Iterator:
+        return (key for key, score in zip(self._keys, self._values) if score == score)
+
+    def __len__(self) -> int:
+        return sum(1 for score in self._values if score == score)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class _History(MutableSequence):
+    """list-like view over the history columns; items are LineChartPoints built on access."""
+
+    __slots__ = ("_timestamps", "_overall", "_delta")
+
+    def __init__(self, timestamps: array, overall: array, delta: array) -> None:
+        self._timestamps, self._overall, self._delta = timestamps, overall, delta
+
+    def _point(self, i: int) -> LineChartPoint:
+        return LineChartPoint(wire._from_us(self._timestamps[i]), self._overall[i], self._delta[i])
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._point(j) for j in range(*i.indices(len(self._overall)))]
+        return self._point(i)
+
+    def __setitem__(self, i, point) -> None:
+        if isinstance(i, slice):
+            points = list(self)
+            points[i] = point
+            self.replace(points)
+            return
+        self._timestamps[i] = wire._to_us(point.timestamp)
+        self._overall[i] = point.overall_score
+        self._delta[i] = point.delta
+
+    def __delitem__(self, i) -> None:
+        del self._timestamps[i]
+        del self._overall[i]
+        del self._delta[i]
+
+    def __len__(self) -> int:
+        return len(self._overall)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (list, _History)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def insert(self, i: int, point: LineChartPoint) -> None:
+        self._timestamps.insert(i, wire._to_us(point.timestamp))
+        self._overall.insert(i, point.overall_score)
+        self._delta.insert(i, point.delta)
+
+    def append(self, point: LineChartPoint) -> None:
+        self._timestamps.append(wire._to_us(point.timestamp))
+        self._overall.append(point.overall_score)
+        self._delta.append(point.delta)
+
+    def replace(self, points: Iterable[LineChartPoint]) -> None:
+        points = list(points)
+        self._timestamps[:] = array("q", [wire._to_us(point.timestamp) for point in points])
+        self._overall[:] = array("d", [point.overall_score for point in points])
+        self._delta[:] = array("d", [point.delta for point in points])
+
+    def after(self, timestamp: datetime) -> list[int]:
+        """Indexes of the points later than `timestamp`, in list order, without building the points."""
+        cutoff = wire._to_us(timestamp)
+        return [i for i, ts in enumerate(self._timestamps) if ts > cutoff]
+
+
+class PackedUserScores:
+    __slots__ = ("_labels", "_sublabels", "_timestamps", "_overall", "_delta", "initial_report", "weights_version")
+
+    def __init__(
+        self,
+        label_scores: Mapping | None = None,
+        sublabel_scores: Mapping[str, float] | None = None,
+        line_chart_history: Iterable[LineChartPoint] = (),
+        initial_report: str | None = None,
+        weights_version: str | None = None,
+    ) -> None:
+        self._labels = array("d", [DEFAULT_SCORE] * len(wire.LABEL_ORDER))
+        self._sublabels = array("d", [_NAN] * len(wire.SUBLABEL_ORDER))
+        self._timestamps, self._overall, self._delta = array("q"), array("d"), array("d")
+        if label_scores is not None:
+            self.label_scores = label_scores
+        if sublabel_scores is not None:
+            self.sublabel_scores = sublabel_scores
+        self.line_chart_history = line_chart_history
+        self.initial_report = initial_report
+        self.weights_version = weights_version
+
+    @classmethod
+    def pack(cls, user: UserScores) -> PackedUserScores:
+        return cls(user.label_scores, user.sublabel_scores, user.line_chart_history, user.initial_report, user.weights_version)
+
+    def unpack(self) -> UserScores:
+        return UserScores(
+            label_scores=dict(self.label_scores),
+            sublabel_scores=dict(self.sublabel_scores),
+            line_chart_history=list(self.line_chart_history),
+            initial_report=self.initial_report,
+            weights_version=self.weights_version,
+        )
+
+    @property
+    def label_scores(self) -> _ScoreMap:
+        return _ScoreMap(self._labels, wire.LABEL_ORDER, _LABEL_INDEX)
+
+    @label_scores.setter
+    def label_scores(self, scores: Mapping) -> None:
+        self._labels[:] = array("d", [scores.get(label, _NAN) for label in wire.LABEL_ORDER])
+
+    @property
+    def sublabel_scores(self) -> _ScoreMap:
+        return _ScoreMap(self._sublabels, _SUBLABEL_KEYS, wire.SUBLABEL_INDEX)
+
+    @sublabel_scores.setter
+    def sublabel_scores(self, scores: Mapping[str, float]) -> None:
+        self._sublabels[:] = array("d", [scores.get(key, _NAN) for key in _SUBLABEL_KEYS])
+
+    @property
+    def line_chart_history(self) -> _History:
+        return _History(self._timestamps, self._overall, self._delta)
+
+    @line_chart_history.setter
+    def line_chart_history(self, points: Iterable[LineChartPoint]) -> None:
+        self.line_chart_history.replace(points)
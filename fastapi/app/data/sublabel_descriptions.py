@@ -0,0 +1,94 @@
+"""
+Short plain-language descriptions of every sub-label, used to match
+conversations against the taxonomy locally (app/services/sublabel_ranker.py).
+Each one names the pattern and its common synonyms, not phrases from
+particular conversations; bench/sublabel_recall.py measures recall on cases the
+descriptions were not written against.
+"""
+
+SUBLABEL_DESCRIPTIONS: dict[str, str] = {
+    # Emotional mastery
+    "emotional_awareness": "emotional awareness, unaware of own feelings, numb, can't name or identify emotions, confused about mood",
+    "anger_management": "anger, angry, rage, temper, furious, irritable, outbursts, yelling, losing control when upset",
+    "anxiety_and_worry": "anxiety, anxious, worry, worried, nervous, panic, fear, stress, dread, uneasy, tense",
+    "emotional_suppression": "suppress emotions, hide feelings, bottled up, numb out, mask, act fine, avoid showing emotion",
+    "jealousy_and_envy": "jealous, jealousy, envy, envious, resentment of others' success, comparison, possessive",
+    "emotional_dependency": "emotional dependency, need reassurance, rely on others for happiness, clingy, validation seeking",
+    "grief_and_loss_processing": "grief, loss, death, died, mourning, bereavement, missing someone, end of a relationship",
+    "frustration_tolerance": "frustrated, frustration, impatient, low tolerance, annoyed, fed up, give up easily after setbacks",
+    "shame_and_guilt_spirals": "shame, ashamed, guilt, guilty, self blame, embarrassed, regret, remorse",
+    "mood_volatility": "mood swings, moody, unstable mood, emotional highs and lows, rapid emotional changes",
+    "grudge_holding_and_unforgiveness": "grudge, unforgiving, can't forgive, resentment, resentful, bitterness, holding on to old hurt",
+    "impulsivity": "impulsive, impulsivity, rash, reckless, act without thinking, spontaneous choices, no self control",
+    # Cognitive clarity
+    "confirmation_bias": "confirmation bias, seek agreeing views, ignore contrary evidence, dismiss opposing opinions, closed minded",
+    "black_and_white_thinking": "black and white thinking, all or nothing, always or never, extremes, perfect or failure, rigid",
+    "catastrophizing": "catastrophizing, worst case, disaster, doom, expecting the worst, blowing things out of proportion",
+    "overthinking_and_rumination": "overthinking, rumination, dwelling, obsessing, repetitive thoughts, analysis loops",
+    "dunning_kruger_overconfidence": "overconfident, overestimate ability, know better than experts, refuse advice, arrogant",
+    "sunk_cost_fallacy": "sunk cost, invested effort, time or money already spent, reluctant to quit, escalating commitment",
+    "attribution_errors": "attribution error, blame character not circumstances, misjudge motives, assume people are lazy or bad",
+    "negativity_bias": "negativity, pessimism, focus on the bad, discount positives, dwell on criticism or failures",
+    "anchoring_bias": "anchoring, first impression, first number, initial information, fail to adjust estimates",
+    "self_serving_bias": "self serving, take credit for success, blame outside factors for failure, excuses",
+    "hindsight_bias": "hindsight, knew it all along, should have seen it coming, obvious afterwards",
+    "bandwagon_effect": "bandwagon, peer pressure, conformity, follow the crowd, trends, fit in with the group",
+    "projection": "projection, attribute own feelings or flaws to others, accuse others, assume others think alike",
+    "indecisiveness_and_decision_paralysis": "indecisive, decision paralysis, can't choose, too many options, hesitation, doubt choices",
+    # Social & relational
+    "empathy_deficit": "lack of empathy, insensitive, indifferent to others' feelings, dismissive, cold, uncaring",
+    "poor_communication": "poor communication, unclear, misunderstanding, miscommunication, vague, fail to express needs",
+    "active_listening_failure": "not listening, interrupting, distracted in conversation, ignoring what others say, talking over",
+    "conflict_avoidance": "conflict avoidance, avoid confrontation, avoid difficult conversations, silence to avoid tension",
+    "destructive_conflict": "destructive conflict, fights, arguments, screaming, insults, escalation, hostile disputes",
+    "boundary_violation": "boundary violation, invade privacy, snooping, pushy, disregard consent, ignore limits",
+    "inability_to_set_boundaries": "no boundaries, unable to refuse, overcommitting, taken advantage of, let others walk over me",
+    "people_pleasing": "people pleasing, seek approval, need to be liked, agree to everything, fear disappointing others",
+    "social_manipulation": "manipulation, manipulative, guilt tripping, gaslighting, exploit people, control others",
+    "passive_aggression": "passive aggressive, sarcasm, silent treatment, backhanded remarks, sulking, indirect hostility",
+    "isolation_and_withdrawal": "isolation, withdrawal, lonely, loneliness, avoid people, cut off friends, reclusive",
+    "codependency": "codependency, codependent, rescuing, enabling, losing self in a relationship, need to be needed",
+    "gossip_and_backbiting": "gossip, rumors, talk behind backs, badmouthing, backstabbing",
+    "bullying_and_intimidation": "bullying, bully, intimidation, threats, humiliation, picking on, dominating others",
+    "trust_issues_and_suspicion": "trust issues, suspicion, suspicious, distrust, paranoia, expect betrayal, checking up on people",
+    # Ethical & moral
+    "misogyny_gender_disrespect": "misogyny, sexism, sexist, gender stereotypes, disrespect toward women or men",
+    "racism_ethnic_prejudice": "racism, racist, ethnic prejudice, racial stereotypes, discrimination by race",
+    "homophobia_lgbtq_prejudice": "homophobia, homophobic, transphobia, lgbtq prejudice, gay, lesbian, trans, queer",
+    "religious_cultural_intolerance": "religious intolerance, cultural intolerance, mocking beliefs, faith, culture, prejudice",
+    "class_disability_prejudice": "classism, ableism, disability, poverty, looking down on others, snobbery",
+    "dishonesty_and_deception": "dishonesty, lying, lies, deception, deceit, cheating, hiding the truth, betraying trust",
+    "lack_of_accountability": "lack of accountability, avoid responsibility, deflect blame, deny mistakes, refuse to apologize",
+    "entitlement_and_selfishness": "entitled, entitlement, selfish, selfishness, expect special treatment, take without giving",
+    "cruelty_and_callousness": "cruelty, cruel, callous, harsh, intentionally hurtful, mean spirited, enjoy others' pain",
+    "hypocrisy": "hypocrisy, hypocrite, hypocritical, double standards, not practicing what one preaches",
+    # Physical & lifestyle
+    "physical_inactivity": "physical inactivity, sedentary, no exercise, lack of movement, skipping workouts, fitness",
+    "poor_nutrition": "poor nutrition, unhealthy eating, junk food, overeating, skipped meals, diet, sugar",
+    "sleep_neglect": "sleep, sleep deprivation, insomnia, staying up late, tired, exhausted, fatigue, poor rest",
+    "substance_misuse": "substance misuse, alcohol, drinking, drunk, drugs, smoking, vaping, addiction, hangover",
+    "screen_and_digital_addiction": "screen time, phone addiction, social media, scrolling, apps, gaming, streaming, online",
+    "procrastination": "procrastination, procrastinate, putting things off, delay, avoid starting tasks, last minute",
+    "poor_time_management": "time management, lateness, disorganized, missed deadlines, overbooked schedule, poor planning",
+    "financial_irresponsibility": "financial irresponsibility, overspending, debt, impulse purchases, no budget, money problems",
+    "hygiene_and_self_care_neglect": "hygiene, self care neglect, not showering, grooming, messy living space, neglecting basic needs",
+    "workaholism": "workaholism, overworking, long hours, burnout, can't stop working, work life imbalance",
+    "attention_and_focus_deficit": "attention, focus, concentration, distractible, adhd, mind wandering, forgetful",
+    "sexual_compulsivity": "sexual compulsivity, compulsive sex, pornography, hookups, uncontrolled sexual urges",
+    # Identity & growth
+    "low_self_confidence": "low self confidence, self doubt, insecure, unsure of abilities, shy, hesitant to speak up",
+    "low_self_worth": "low self worth, worthless, not good enough, self loathing, low self esteem, undeserving",
+    "impostor_syndrome": "impostor syndrome, feel like a fake, doubt achievements are earned, credit luck, fear of exposure",
+    "toxic_perfectionism": "perfectionism, perfectionist, unrealistic standards, intolerance of mistakes, overworking details",
+    "fear_of_failure": "fear of failure, afraid to fail, avoid challenges, scared to try, failure anxiety",
+    "fear_of_rejection": "fear of rejection, rejection, afraid of being turned down, abandonment, need acceptance",
+    "lack_of_purpose": "lack of purpose, meaningless, directionless, aimless, no goals, unsure what to do with life",
+    "victim_mentality": "victim mentality, blame the world, life is unfair, persecuted, powerless over circumstances",
+    "fixed_mindset": "fixed mindset, abilities can't change, not talented, avoid learning, give up on improving",
+    "learned_helplessness": "learned helplessness, helpless, hopeless, futile, stop trying, resigned",
+    "complacency": "complacency, complacent, comfort zone, stagnation, settling, lack of ambition",
+    "identity_fragility": "fragile identity, defensive, sensitive to criticism, unstable sense of self, easily shaken",
+    "inability_to_ask_for_help": "reluctance to ask for help, self reliance, pride, fear of being a burden, struggle alone",
+    "materialism_and_status_obsession": "materialism, status, luxury, brands, possessions, showing off, image, wealth",
+    "spiritual_existential_disconnection": "existential, spiritual disconnection, meaning of life, emptiness, lost faith",
+}
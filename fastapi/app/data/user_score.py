@@ -7,7 +7,7 @@ from app.constants import DEFAULT_SCORE
 from app.label import Label, SubLabelBase
 
 
-@dataclass
+@dataclass(slots=True)
 class AIAnalysisResult:
     """What the AI returns after analyzing a user's logged mistake or practice."""
 
@@ -18,7 +18,7 @@ class AIAnalysisResult:
     magnitude: float = 1.0  # 0.0 to 1.0 — how significant the event was.
 
 
-@dataclass
+@dataclass(slots=True)
 class LineChartPoint:
     """Single data point for the line chart. Positive delta = improving."""
 
@@ -27,7 +27,7 @@ class LineChartPoint:
     delta: float  # Change from previous overall score
 
 
-@dataclass
+@dataclass(slots=True)
 class UserScores:
     # Spider chart: 6 label scores (0-100)
     label_scores: dict[Label, float] = field(
@@ -39,3 +39,5 @@ class UserScores:
     line_chart_history: list[LineChartPoint] = field(default_factory=list)
 
     initial_report: str | None = None  # Qualitative summary from AI
+    # Version of the weight table (app/weights.py) that produced these scores; None = unknown
+    weights_version: str | None = None
@@ -0,0 +1,125 @@
+"""
+Compact wire representation of UserScores.
+
+Label and sub-label scores travel as fixed-order arrays (LABEL_ORDER /
+SUBLABEL_ORDER) instead of keyed dicts, and line_chart_history travels as
+columns that start at `history.offset`. A client that already holds the first
+N points only sends the last one and gets back only the points added after it.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Annotated
+
+import msgspec
+
+from app.data.user_score import LineChartPoint, UserScores
+from app.label import Label, SubLabelBase
+from app.scoring_update import LABEL_TO_SUBLABEL_ENUM
+
+LABEL_ORDER: list[Label] = list(Label)
+SUBLABEL_ORDER: list[SubLabelBase] = [
+    member for enum_class in LABEL_TO_SUBLABEL_ENUM.values() for member in enum_class
+]
+SUBLABEL_INDEX: dict[str, int] = {member.value: i for i, member in enumerate(SUBLABEL_ORDER)}
+
+Score = Annotated[float, msgspec.Meta(ge=0.0, le=100.0)]
+
+
+class CompactHistory(msgspec.Struct, forbid_unknown_fields=True):
+    offset: Annotated[int, msgspec.Meta(ge=0)] = 0  # index of the first point in these columns
+    timestamps_us: list[int] = []  # UTC epoch microseconds
+    overall: list[float] = []
+    delta: list[float] = []
+
+    def __post_init__(self) -> None:
+        if not (len(self.timestamps_us) == len(self.overall) == len(self.delta)):
+            raise ValueError("history columns must have equal length")
+
+
+class CompactUserScores(msgspec.Struct, forbid_unknown_fields=True, omit_defaults=True):
+    labels: Annotated[list[Score], msgspec.Meta(min_length=len(LABEL_ORDER), max_length=len(LABEL_ORDER))]
+    # One slot per SUBLABEL_ORDER entry; None = not assessed yet
+    sublabels: Annotated[
+        list[Score | None], msgspec.Meta(min_length=len(SUBLABEL_ORDER), max_length=len(SUBLABEL_ORDER))
+    ]
+    history: CompactHistory = msgspec.field(default_factory=CompactHistory)
+    initial_report: str | None = None
+    weights_version: str | None = None
+
+
+class CompactAnalysis(msgspec.Struct, forbid_unknown_fields=True):
+    sublabel: str
+    is_improvement: bool
+    magnitude: Annotated[float, msgspec.Meta(ge=0.0, le=1.0)] = 1.0
+
+
+class CompactUpdateRequest(msgspec.Struct, forbid_unknown_fields=True):
+    scores: CompactUserScores
+    analysis: CompactAnalysis
+
+
+def _to_us(timestamp: datetime) -> int:
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    delta = timestamp - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _from_us(micros: int) -> datetime:
+    seconds, micros = divmod(micros, 1_000_000)
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).replace(microsecond=micros)
+
+
+def to_compact(user: UserScores, offset: int = 0, since: int = 0) -> CompactUserScores:
+    """
+    Encode `user`. `offset` is the absolute index of user.line_chart_history[0];
+    only points from `since` onward (relative to the list) are included.
+    Sub-label keys outside the taxonomy are dropped — they never affect scoring.
+    """
+    sublabels: list[float | None] = [None] * len(SUBLABEL_ORDER)
+    for key, score in user.sublabel_scores.items():
+        index = SUBLABEL_INDEX.get(key)
+        if index is not None:
+            sublabels[index] = score
+
+    points = user.line_chart_history[since:]
+    return CompactUserScores(
+        labels=[user.label_scores.get(label, 0.0) for label in LABEL_ORDER],
+        sublabels=sublabels,
+        history=CompactHistory(
+            offset=offset + since,
+            timestamps_us=[_to_us(point.timestamp) for point in points],
+            overall=[point.overall_score for point in points],
+            delta=[point.delta for point in points],
+        ),
+        initial_report=user.initial_report,
+        weights_version=user.weights_version,
+    )
+
+
+def from_compact(compact: CompactUserScores) -> tuple[UserScores, int]:
+    """Decode into a UserScores holding only the transmitted history tail, plus that tail's offset."""
+    history = compact.history
+    return (
+        UserScores(
+            label_scores=dict(zip(LABEL_ORDER, compact.labels)),
+            sublabel_scores={
+                SUBLABEL_ORDER[i].value: score for i, score in enumerate(compact.sublabels) if score is not None
+            },
+            line_chart_history=[
+                LineChartPoint(timestamp=_from_us(ts), overall_score=overall, delta=delta)
+                for ts, overall, delta in zip(history.timestamps_us, history.overall, history.delta)
+            ],
+            initial_report=compact.initial_report,
+            weights_version=compact.weights_version,
+        ),
+        history.offset,
+    )
+
+
+json_encoder = msgspec.json.Encoder()
+update_request_decoder = msgspec.json.Decoder(CompactUpdateRequest)
+msgpack_encoder = msgspec.msgpack.Encoder()
+update_request_msgpack_decoder = msgspec.msgpack.Decoder(CompactUpdateRequest)
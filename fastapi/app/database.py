@@ -1,15 +1,74 @@
 from pathlib import Path
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from .settings import settings
 
 
-def build_db_url() -> str:
+def sqlite_path() -> Path:
+    return Path(__file__).resolve().parents[2] / settings.DB_DATABASE
+
+
+def build_db_url(read_only: bool = False, db_path: Path | None = None) -> str:
     """Build database URL from settings."""
     driver = settings.DB_CONNECTION
     if driver == "sqlite":
-        db_path = Path(__file__).resolve().parents[2] / settings.DB_DATABASE
+        db_path = db_path or sqlite_path()
+        if read_only:
+            return f"sqlite:///file:{db_path}?mode=ro&uri=true"
         return f"sqlite:///{db_path}"
     return f"{driver}+pymysql://{settings.DB_USERNAME}:{settings.DB_PASSWORD}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_DATABASE}"
 
 
-engine = create_engine(build_db_url(), pool_pre_ping=True)
+def _sqlite_pragmas(read_only: bool) -> list[str]:
+    """
+    Connect-time pragmas for the SQLite file shared with Laravel.
+    WAL lets readers run alongside a writer; busy_timeout makes a blocked
+    writer wait instead of failing with "database is locked".
+    """
+    pragmas = [
+        f"PRAGMA busy_timeout = {settings.DB_BUSY_TIMEOUT}",
+        f"PRAGMA cache_size = -{settings.DB_SQLITE_CACHE_KB}",
+        f"PRAGMA mmap_size = {settings.DB_SQLITE_MMAP_BYTES}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only = ON")
+    else:
+        # journal_mode is stored in the file, so it also applies to Laravel's connections
+        pragmas.append(f"PRAGMA journal_mode = {settings.DB_JOURNAL_MODE}")
+        pragmas.append(f"PRAGMA synchronous = {settings.DB_SYNCHRONOUS}")
+        pragmas.append("PRAGMA foreign_keys = ON")
+    return pragmas
+
+
+def _install_sqlite_pragmas(target: Engine, read_only: bool) -> None:
+    pragmas = _sqlite_pragmas(read_only)
+
+    @event.listens_for(target, "connect")
+    def _on_connect(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def build_engine(read_only: bool = False, db_path: Path | None = None) -> Engine:
+    """Engine with the tuned pragmas and pool size for its role (read-only or read-write)."""
+    if settings.DB_CONNECTION != "sqlite":
+        return create_engine(build_db_url(), pool_pre_ping=True)
+
+    pool_size = settings.DB_READ_POOL_SIZE if read_only else settings.DB_WRITE_POOL_SIZE
+    new_engine = create_engine(
+        build_db_url(read_only=read_only, db_path=db_path),
+        pool_size=pool_size,
+        max_overflow=pool_size,
+        pool_pre_ping=True,
+    )
+    _install_sqlite_pragmas(new_engine, read_only)
+    return new_engine
+
+
+# Writes go through `engine`; read-only work (e.g. /predict, history reads) through
+# `read_engine`, whose larger pool serves concurrent readers. For MySQL they are the same.
+engine = build_engine()
+read_engine = build_engine(read_only=True) if settings.DB_CONNECTION == "sqlite" else engine
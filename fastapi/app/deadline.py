@@ -0,0 +1,75 @@
+"""
+Per-request deadlines for upstream calls.
+
+The caller's timeout (Laravel sends it as `X-Request-Timeout`, in seconds)
+becomes an absolute deadline in a contextvar; upstream calls made while
+handling the request size their timeouts from what is left of it.
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.settings import settings
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None outside a request."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def bounded_timeout(timeout: Optional[float]) -> Optional[float]:
+    """`timeout` capped by the remaining request budget (never negative)."""
+    remaining = remaining_budget()
+    if remaining is None:
+        return timeout
+    remaining = max(remaining, 0.0)
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[None]:
+    """Run the block under a deadline `seconds` from now (for jobs and scripts)."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+class RequestDeadlineMiddleware:
+    """
+    Sets the deadline for each HTTP request: `X-Request-Timeout` if the client
+    sent one, else REQUEST_DEADLINE_S, minus DEADLINE_HEADROOM_S so a fallback
+    response can still reach the client in time.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        budget = settings.REQUEST_DEADLINE_S
+        for name, value in scope["headers"]:
+            if name == b"x-request-timeout":
+                try:
+                    budget = float(value)
+                except ValueError:
+                    pass
+                break
+
+        with deadline_scope(max(budget - settings.DEADLINE_HEADROOM_S, 0.0)):
+            await self.app(scope, receive, send)
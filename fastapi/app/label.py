@@ -142,3 +142,13 @@ class IdentityGrowth(SubLabelBase):
     @property
     def label(self) -> Label:
         return Label.IDENTITY_GROWTH
+
+
+LABEL_TO_SUBLABEL_ENUM: dict[Label, type[SubLabelBase]] = {
+    Label.EMOTIONAL_MASTERY: EmotionalMastery,
+    Label.COGNITIVE_CLARITY: CognitiveClarity,
+    Label.SOCIAL_RELATIONAL: SocialRelational,
+    Label.ETHICAL_MORAL: EthicalMoral,
+    Label.PHYSICAL_LIFESTYLE: PhysicalLifestyle,
+    Label.IDENTITY_GROWTH: IdentityGrowth,
+}
@@ -0,0 +1 @@
+# Data access on top of app/database.py
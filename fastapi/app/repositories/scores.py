@@ -0,0 +1,276 @@
+"""
+UserScores persistence on the Laravel-owned history tables.
+
+- user_score_history(user_id, recorded_at, overall_score, delta, weights_version):
+  one row per line_chart_history point. unique(user_id, recorded_at) serves range
+  reads. The newest row's weights_version is UserScores.weights_version.
+- user_label_history(user_id, label_key, recorded_at, score): one row per score
+  change. label_key holds both Label values and sub-label values; the current
+  score of a key is its latest row, found through the
+  (user_id, label_key, recorded_at) index.
+
+- user_score_versions(user_id, version): the version of a user's scores. Every
+  write through this repository bumps it in the same transaction, guarded by a
+  compare-and-swap on the expected version.
+
+Laravel writes the history tables too (FastApiController::persistLineChartHistory
+upserts the points of stateless scoring calls) without touching the version.
+Those writes neither cause a VersionConflict here nor count as a concurrent
+change: the next load simply includes them, and a replace() removes them along
+with everything else. Users whose rows predate user_score_versions load at
+version 0, and their first write inserts the counter.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterable
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from app.data.user_score import LineChartPoint, UserScores
+from app.database import engine as default_engine
+from app.database import read_engine as default_read_engine
+from app.label import Label
+
+# Laravel writes "Y-m-d H:i:s"; microseconds keep rapid updates unique and still sort correctly.
+_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+_LABEL_KEYS = {label.value: label for label in Label}
+
+
+def _format_ts(value: datetime) -> str:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime(_TIMESTAMP_FORMAT)
+
+
+def _parse_ts(value: str | datetime) -> datetime:
+    parsed = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def _now() -> str:
+    return _format_ts(datetime.now(timezone.utc))
+
+
+@dataclass
+class HistoryPage:
+    points: list[LineChartPoint]
+    next_after: datetime | None  # keyset cursor; None when there is nothing more
+
+
+class ScoreRepository:
+    def __init__(self, engine: Engine | None = None, read_engine: Engine | None = None) -> None:
+        self.engine = engine or default_engine
+        # Reads of committed state go through the read-only pool
+        self.read_engine = read_engine or (engine if engine is not None else default_read_engine)
+
+    # -- reads ---------------------------------------------------------------
+
+    def version(self, conn: Connection, user_id: int) -> int:
+        row = conn.execute(
+            text("SELECT version FROM user_score_versions WHERE user_id = :user_id"),
+            {"user_id": user_id},
+        ).scalar()
+        return int(row or 0)
+
+    def load(self, user_id: int, history_limit: int | None = None) -> tuple[UserScores, int] | None:
+        """
+        Current scores and version, or None if nothing is stored. Only the newest
+        `history_limit` points are loaded (all when None); scoring needs just one.
+        """
+        with self.read_engine.connect() as conn:
+            version = self.version(conn, user_id)
+            rows = conn.execute(
+                text(
+                    "SELECT h.label_key, h.score FROM user_label_history h "
+                    "WHERE h.user_id = :user_id AND h.recorded_at = ("
+                    "  SELECT MAX(l.recorded_at) FROM user_label_history l"
+                    "  WHERE l.user_id = h.user_id AND l.label_key = h.label_key)"
+                ),
+                {"user_id": user_id},
+            ).all()
+
+            history_sql = (
+                "SELECT recorded_at, overall_score, delta, weights_version FROM user_score_history "
+                "WHERE user_id = :user_id ORDER BY recorded_at DESC"
+            )
+            params: dict = {"user_id": user_id}
+            if history_limit is not None:
+                history_sql += " LIMIT :limit"
+                params["limit"] = history_limit
+            history = conn.execute(text(history_sql), params).all()
+        if version == 0 and not rows and not history:
+            return None
+
+        user = UserScores()
+        for key, score in rows:
+            if key in _LABEL_KEYS:
+                user.label_scores[_LABEL_KEYS[key]] = float(score)
+            else:
+                user.sublabel_scores[key] = float(score)
+        user.line_chart_history = [
+            LineChartPoint(timestamp=_parse_ts(ts), overall_score=float(overall), delta=float(delta))
+            for ts, overall, delta, _ in reversed(history)
+        ]
+        user.weights_version = history[0][3] if history else None
+        return user, version
+
+    def history_page(
+        self,
+        user_id: int,
+        after: datetime | None = None,
+        until: datetime | None = None,
+        limit: int = 100,
+    ) -> HistoryPage:
+        """Keyset-paged history in recorded_at order: pass the previous page's next_after to continue."""
+        sql = "SELECT recorded_at, overall_score, delta FROM user_score_history WHERE user_id = :user_id"
+        params: dict = {"user_id": user_id, "limit": limit + 1}
+        if after is not None:
+            sql += " AND recorded_at > :after"
+            params["after"] = _format_ts(after)
+        if until is not None:
+            sql += " AND recorded_at <= :until"
+            params["until"] = _format_ts(until)
+        sql += " ORDER BY recorded_at LIMIT :limit"
+
+        with self.read_engine.connect() as conn:
+            rows = conn.execute(text(sql), params).all()
+
+        points = [
+            LineChartPoint(timestamp=_parse_ts(ts), overall_score=float(overall), delta=float(delta))
+            for ts, overall, delta in rows[:limit]
+        ]
+        has_more = len(rows) > limit
+        return HistoryPage(points=points, next_after=points[-1].timestamp if has_more else None)
+
+    def label_history(
+        self, user_id: int, label_key: str, after: datetime | None = None, limit: int = 100
+    ) -> list[tuple[datetime, float]]:
+        sql = (
+            "SELECT recorded_at, score FROM user_label_history "
+            "WHERE user_id = :user_id AND label_key = :label_key"
+        )
+        params: dict = {"user_id": user_id, "label_key": label_key, "limit": limit}
+        if after is not None:
+            sql += " AND recorded_at > :after"
+            params["after"] = _format_ts(after)
+        sql += " ORDER BY recorded_at LIMIT :limit"
+        with self.read_engine.connect() as conn:
+            return [(_parse_ts(ts), float(score)) for ts, score in conn.execute(text(sql), params).all()]
+
+    # -- writes --------------------------------------------------------------
+
+    def _bump_version(self, conn: Connection, user_id: int, expected_version: int | None) -> int | None:
+        """
+        Advance the user's version inside the caller's transaction; the UPDATE also
+        takes the write lock that serializes concurrent writers. Returns the new
+        version, or None if expected_version no longer matches.
+        """
+        params = {"user_id": user_id, "now": _now(), "expected": expected_version}
+        if expected_version != 0:
+            sql = "UPDATE user_score_versions SET version = version + 1, updated_at = :now WHERE user_id = :user_id"
+            if expected_version is not None:
+                sql += " AND version = :expected"
+            if conn.execute(text(sql), params).rowcount == 1:
+                return self.version(conn, user_id)
+            if expected_version is not None:
+                return None
+        inserted = conn.execute(
+            text(
+                "INSERT INTO user_score_versions (user_id, version, created_at, updated_at) "
+                "SELECT :user_id, 1, :now, :now "
+                "WHERE NOT EXISTS (SELECT 1 FROM user_score_versions WHERE user_id = :user_id)"
+            ),
+            params,
+        ).rowcount
+        return 1 if inserted == 1 else None
+
+    def _insert_labels(self, conn: Connection, user_id: int, scores: Iterable[tuple[str, float]], recorded_at: str) -> None:
+        now = _now()
+        params = [
+            {"user_id": user_id, "label_key": key, "recorded_at": recorded_at, "score": score, "now": now}
+            for key, score in scores
+        ]
+        if params:
+            conn.execute(
+                text(
+                    "INSERT INTO user_label_history (user_id, label_key, recorded_at, score, created_at, updated_at) "
+                    "VALUES (:user_id, :label_key, :recorded_at, :score, :now, :now)"
+                ),
+                params,
+            )
+
+    def _insert_points(
+        self, conn: Connection, user_id: int, points: Iterable[LineChartPoint], weights_version: str | None
+    ) -> None:
+        now = _now()
+        params = [
+            {
+                "user_id": user_id,
+                "recorded_at": _format_ts(point.timestamp),
+                "overall_score": point.overall_score,
+                "delta": point.delta,
+                "weights_version": weights_version,
+                "now": now,
+            }
+            for point in points
+        ]
+        if params:
+            conn.execute(
+                text(
+                    "INSERT INTO user_score_history "
+                    "(user_id, recorded_at, overall_score, delta, weights_version, created_at, updated_at) "
+                    "VALUES (:user_id, :recorded_at, :overall_score, :delta, :weights_version, :now, :now)"
+                ),
+                params,
+            )
+
+    def replace(self, user_id: int, user: UserScores, expected_version: int | None = None) -> int | None:
+        """
+        Overwrite everything stored for the user with `user`.
+        Returns the new version, or None if expected_version did not match.
+        """
+        recorded_at = _now()
+        with self.engine.begin() as conn:
+            version = self._bump_version(conn, user_id, expected_version)
+            if version is None:
+                return None
+            conn.execute(text("DELETE FROM user_label_history WHERE user_id = :user_id"), {"user_id": user_id})
+            conn.execute(text("DELETE FROM user_score_history WHERE user_id = :user_id"), {"user_id": user_id})
+            self._insert_labels(
+                conn,
+                user_id,
+                [(label.value, score) for label, score in user.label_scores.items()]
+                + list(user.sublabel_scores.items()),
+                recorded_at,
+            )
+            self._insert_points(conn, user_id, user.line_chart_history, user.weights_version)
+            return version
+
+    def append_update(
+        self,
+        user_id: int,
+        expected_version: int,
+        point: LineChartPoint,
+        changed_scores: dict[str, float],
+        weights_version: str | None = None,
+    ) -> int | None:
+        """
+        Record one scoring step: the new history point plus the changed label rows,
+        if the user's version is still expected_version. The version bump is a
+        single conditional statement, so concurrent writers cannot both succeed.
+        Returns the new version, or None on conflict.
+        """
+        recorded_at = _format_ts(point.timestamp)
+        with self.engine.begin() as conn:
+            version = self._bump_version(conn, user_id, expected_version)
+            if version is None:
+                return None
+            self._insert_points(conn, user_id, [point], weights_version)
+            self._insert_labels(conn, user_id, changed_scores.items(), recorded_at)
+            return version
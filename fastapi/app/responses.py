@@ -0,0 +1,53 @@
+import json
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from .settings import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is a declared dependency
+    orjson = None
+
+_ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_UTC_Z
+    if orjson is not None
+    else 0
+)
+
+
+def _default(obj: Any) -> Any:
+    """Fallback for types orjson does not know natively (pydantic models, array-likes)."""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def fast_json_enabled() -> bool:
+    return orjson is not None and settings.FAST_JSON_RESPONSES
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson.
+
+    Dataclasses (UserScores, LineChartPoint), Enum keys (Label), datetimes and
+    NumPy arrays are serialized natively, so routes can return them directly and
+    skip FastAPI's jsonable_encoder pass. Falls back to the stdlib path when
+    orjson is missing or FAST_JSON_RESPONSES is off.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if fast_json_enabled():
+            return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+        return json.dumps(
+            jsonable_encoder(content),
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+            default=_default,
+        ).encode("utf-8")
@@ -4,6 +4,7 @@ from .questions import router as questions_router
 from .root import router as root_router
 from .scoring import router as scoring_router
 from .embeddings import router as embeddings_router
+from .jobs import router as jobs_router
 
-__all__ = ["diagnostic_router", "predict_router", "questions_router", "root_router", "scoring_router", "embeddings_router"]
+__all__ = ["diagnostic_router", "predict_router", "questions_router", "root_router", "scoring_router", "embeddings_router", "jobs_router"]
 
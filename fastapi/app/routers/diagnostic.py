@@ -1,4 +1,4 @@
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
@@ -7,6 +7,7 @@ from app.services.diagnostic import (
     analyze_conversation_and_score,
     generate_follow_up_questions,
 )
+from app.services.jobs import QueueFull, job_queue
 
 router = APIRouter(prefix="/diagnostic", tags=["diagnostic"])
 
@@ -34,6 +35,39 @@ class AnswerResponse(BaseModel):
     is_complete: bool
 
 
+class AsyncAnswerRequest(AnswerRequest):
+    priority: Literal["interactive", "batch"] = "interactive"
+    callback_url: Optional[str] = None
+
+
+class JobAccepted(BaseModel):
+    job_id: str
+    status: str
+    poll_url: str
+
+
+async def _analysis_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return await analyze_conversation_and_score(
+        payload["conversation_history"],
+        current_scores=payload.get("current_scores"),
+        event_context=payload.get("event_context"),
+    )
+
+
+job_queue.register("diagnostic_analysis", _analysis_job)
+
+
+def _conversation_with_answer(payload: AnswerRequest) -> List[Dict[str, str]]:
+    answer = payload.answer.strip()
+    if not answer:
+        raise HTTPException(status_code=400, detail="answer cannot be empty")
+
+    ai_question = payload.state.get("ai_question", "")
+    conversation_history = payload.state.get("conversation_history", [])
+    conversation_history.append({"question": ai_question, "answer": answer})
+    return conversation_history
+
+
 @router.post("/start", response_model=StartResponse)
 async def diagnostic_start(payload: StartRequest):
     """
@@ -75,16 +109,7 @@ async def diagnostic_answer(payload: AnswerRequest):
     existing profile, and the original reflection/event context, then returns
     the analysis with updated scores and summary.
     """
-    state = payload.state
-    answer = payload.answer.strip()
-
-    if not answer:
-        raise HTTPException(status_code=400, detail="answer cannot be empty")
-
-    ai_question = state.get("ai_question", "")
-    conversation_history = state.get("conversation_history", [])
-
-    conversation_history.append({"question": ai_question, "answer": answer})
+    conversation_history = _conversation_with_answer(payload)
 
     try:
         analysis = await analyze_conversation_and_score(
@@ -102,3 +127,29 @@ async def diagnostic_answer(payload: AnswerRequest):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+
+@router.post("/answer/async", response_model=JobAccepted, status_code=202)
+async def diagnostic_answer_async(payload: AsyncAnswerRequest):
+    """
+    Same analysis as /answer, run in the background. Returns a job id at once;
+    poll GET /jobs/{job_id} or pass callback_url to have the finished job POSTed back.
+    """
+    conversation_history = _conversation_with_answer(payload)
+    try:
+        job = await job_queue.submit(
+            "diagnostic_analysis",
+            {
+                "conversation_history": conversation_history,
+                "current_scores": payload.current_scores,
+                "event_context": payload.event_context,
+            },
+            priority=payload.priority,
+            callback_url=payload.callback_url,
+        )
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="Analysis queue is full", headers={"Retry-After": "5"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return JobAccepted(job_id=job.id, status=job.status, poll_url=f"/jobs/{job.id}")
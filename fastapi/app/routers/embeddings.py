@@ -1,18 +1,39 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+import asyncio
+import struct
+from typing import Iterator, Literal, Optional
 
-from app.services.ai_service import generate_embedding, generate_embeddings_batch
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from app.responses import FastJSONResponse
+from app.services.ai_service import generate_embedding, generate_embedding_deduped, generate_embeddings_batch
+from app.services.ann_index import DimensionMismatch, SearchFilter, ann_index
+from app.services.embedding_store import embedding_store
+from app.services.neighbor_lists import neighbor_lists
+from app.services.text_index import rrf, text_index
+from app.services.near_duplicates import cluster
+from app.settings import settings
 
 router = APIRouter(prefix="/embeddings", tags=["embeddings"])
 
 
 class EmbeddingRequest(BaseModel):
     text: str
+    # Stable id of the document being embedded (e.g. "event:42"); lets the "skip"
+    # dedupe policy recognise a re-embed of an essentially unchanged document
+    doc_id: Optional[str] = None
+
+
+class NearDuplicateInfo(BaseModel):
+    doc_id: Optional[str]
+    similarity: float
 
 
 class EmbeddingResponse(BaseModel):
-    embedding: list[float]
+    embedding: Optional[list[float]]
     dimensions: int
+    near_duplicate: Optional[NearDuplicateInfo] = None
 
 
 class BatchEmbeddingRequest(BaseModel):
@@ -25,24 +46,81 @@ class BatchEmbeddingResponse(BaseModel):
     dimensions: int
 
 
+class IndexEntryRequest(BaseModel):
+    user_id: int
+    is_public: bool = False
+    label: Optional[str] = None  # e.g. the reflection's identification tag
+    # The vector, the text (indexed for lexical search, and embedded when no vector is given), or both
+    embedding: Optional[list[float]] = None
+    text: Optional[str] = None
+
+
+class SearchRequest(BaseModel):
+    embedding: Optional[list[float]] = None
+    text: Optional[str] = None
+    # "vector" (ANN), "lexical" (BM25 over the text) or "hybrid" (both, fused by reciprocal rank)
+    mode: Literal["vector", "lexical", "hybrid"] = "vector"
+    k: int = Field(default=10, ge=1, le=100)
+    user_id: Optional[int] = None
+    exclude_user_id: Optional[int] = None
+    public_only: bool = False
+    label: Optional[str] = None
+    nprobe: Optional[int] = Field(default=None, ge=1)
+    exact: bool = False
+
+
+class SearchResult(BaseModel):
+    id: int
+    score: float
+
+
+class SearchResponse(BaseModel):
+    results: list[SearchResult]
+    count: int
+    mode: str  # the mode actually served; "hybrid" degrades to "lexical" without an embedding
+
+
+class DedupeItem(BaseModel):
+    id: str
+    text: str
+
+
+class DedupeRequest(BaseModel):
+    items: list[DedupeItem]
+    max_distance: Optional[float] = Field(default=None, ge=0, le=1)
+
+
+class DedupeResponse(BaseModel):
+    duplicate_of: dict[str, str]  # id -> id of the first item of its group, for duplicates only
+    groups: list[list[str]]
+    unique: int
+
+
 @router.post("/generate", response_model=EmbeddingResponse)
 async def create_embedding(request: EmbeddingRequest):
     """
     Generate a 768-dimensional embedding vector for the given text.
     Uses Google Gemini text-embedding-004 model.
+
+    Near-duplicates of already-embedded texts reuse their vector (see
+    EMBEDDING_DEDUPE_POLICY); `near_duplicate` then names the match. Under the
+    "skip" policy `embedding` is null when the match is an earlier version of
+    the same doc_id, meaning the caller's stored vector is still good.
     """
-    embedding = await generate_embedding(request.text)
-    
-    if embedding is None:
+    embedding, match = await generate_embedding_deduped(request.text, request.doc_id)
+
+    if embedding is None and match is None:
         raise HTTPException(
             status_code=503,
             detail="Embedding service unavailable. Please check Google API key configuration."
         )
     
-    return EmbeddingResponse(
-        embedding=embedding,
-        dimensions=len(embedding)
-    )
+    # Returned as a raw response: skips re-validating hundreds of floats through the model
+    return FastJSONResponse({
+        "embedding": embedding,
+        "dimensions": len(embedding) if embedding else 0,
+        "near_duplicate": {"doc_id": match.doc_id, "similarity": match.similarity} if match else None,
+    })
 
 
 @router.post("/generate-batch", response_model=BatchEmbeddingResponse)
@@ -65,8 +143,225 @@ async def create_embeddings_batch(request: BatchEmbeddingRequest):
             detail="Embedding service unavailable. Please check Google API key configuration."
         )
     
-    return BatchEmbeddingResponse(
-        embeddings=embeddings,
-        count=len(embeddings),
-        dimensions=len(embeddings[0]) if embeddings else 0
+    return FastJSONResponse({
+        "embeddings": embeddings,
+        "count": len(embeddings),
+        "dimensions": len(embeddings[0]) if embeddings else 0,
+    })
+
+
+@router.post("/dedupe", response_model=DedupeResponse)
+async def dedupe_texts(request: DedupeRequest):
+    """
+    Group near-duplicate texts (MinHash/LSH, no embedding calls) for bulk cleaning.
+    Items within `max_distance` Jaccard distance (default EMBEDDING_DEDUPE_MAX_DISTANCE)
+    of each other form a group, represented by its first item.
+    """
+    if len(request.items) > 10000:
+        raise HTTPException(status_code=400, detail="Maximum 10000 items per request")
+    texts = {item.id: item.text for item in request.items}
+    if len(texts) != len(request.items):
+        raise HTTPException(status_code=400, detail="Item ids must be unique")
+
+    max_distance = settings.EMBEDDING_DEDUPE_MAX_DISTANCE if request.max_distance is None else request.max_distance
+    representatives = await asyncio.to_thread(cluster, texts, max_distance)
+
+    groups: dict[str, list[str]] = {}
+    for item_id, representative in representatives.items():
+        groups.setdefault(representative, []).append(item_id)
+    return {
+        "duplicate_of": {item_id: rep for item_id, rep in representatives.items() if item_id != rep},
+        "groups": [members for members in groups.values() if len(members) > 1],
+        "unique": len(groups),
+    }
+
+
+async def _query_vector(embedding: Optional[list[float]], text: Optional[str]) -> list[float]:
+    if embedding is not None:
+        return embedding
+    if not text:
+        raise HTTPException(status_code=400, detail="Provide either embedding or text")
+    vector = await generate_embedding(text)
+    if vector is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Embedding service unavailable. Please check Google API key configuration."
+        )
+    return vector
+
+
+def _stored_dimensions() -> int:
+    """Dimensions of the vectors already indexed, or 0 while the stores are empty."""
+    return embedding_store.stats()["dimensions"] or ann_index.stats()["dimensions"]
+
+
+@router.put("/index/{event_id}")
+async def index_event(event_id: int, request: IndexEntryRequest, background_tasks: BackgroundTasks):
+    """
+    Store an event's vector (app/services/embedding_store.py) and add or replace
+    it in the cross-user ANN index (app/services/ann_index.py).
+    Training is scheduled in the background once the index has grown enough.
+    """
+    vector = request.embedding
+    if vector is None and request.text:
+        vector = await generate_embedding(request.text)
+    if vector is None and not request.text:
+        raise HTTPException(status_code=400, detail="Provide either embedding or text")
+    if vector is not None:
+        # Reject a bad vector before anything is written, so a 400 leaves no index half-updated
+        dimensions = await asyncio.to_thread(_stored_dimensions)
+        if dimensions and len(vector) != dimensions:
+            raise HTTPException(status_code=400, detail=f"Expected {dimensions} dimensions, got {len(vector)}")
+
+    if request.text:
+        await asyncio.to_thread(
+            text_index.upsert, event_id, request.text, request.user_id, request.is_public, request.label
+        )
+    if vector is None:
+        # Searchable lexically now; the vector follows on the next reindex
+        return {"id": event_id, "indexed": True, "vector": False}
+
+    try:
+        await asyncio.to_thread(embedding_store.put, event_id, vector)
+        await asyncio.to_thread(neighbor_lists.upsert, event_id, request.user_id, vector)
+        await asyncio.to_thread(
+            ann_index.upsert, event_id, vector, request.user_id, request.is_public, request.label
+        )
+    except (DimensionMismatch, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    stats = await asyncio.to_thread(ann_index.stats)
+    if stats["needs_training"]:
+        background_tasks.add_task(ann_index.train)
+    return {"id": event_id, "indexed": True, "vector": True}
+
+
+@router.delete("/index/{event_id}")
+async def remove_indexed_event(event_id: int):
+    removed = await asyncio.to_thread(neighbor_lists.delete, event_id)
+    removed = await asyncio.to_thread(embedding_store.delete, event_id) or removed
+    removed = await asyncio.to_thread(ann_index.delete, event_id) or removed
+    removed = await asyncio.to_thread(text_index.delete, event_id) or removed
+    return {"id": event_id, "removed": removed}
+
+
+@router.get("/index")
+async def index_stats():
+    return {
+        "vectors": await asyncio.to_thread(ann_index.stats),
+        "text": await asyncio.to_thread(text_index.stats),
+    }
+
+
+@router.post("/index/train")
+async def train_index():
+    """Rebuild the index's clustering and quantisation from the current rows."""
+    trained = await asyncio.to_thread(ann_index.train, True)
+    return {"trained": trained, **await asyncio.to_thread(ann_index.stats)}
+
+
+@router.post("/search", response_model=SearchResponse)
+async def search_index(request: SearchRequest):
+    """
+    Nearest indexed events, optionally filtered by user, visibility
+    (`public_only`, e.g. with `exclude_user_id` for community recommendations)
+    or label. `mode=lexical` ranks by BM25 over the indexed text and needs no
+    embedding; `mode=hybrid` fuses both rankings and falls back to lexical when
+    the text cannot be embedded.
+    """
+    where = SearchFilter(
+        user_id=request.user_id,
+        exclude_user_id=request.exclude_user_id,
+        public_only=request.public_only,
+        label=request.label,
     )
+    if request.mode != "vector" and not request.text:
+        raise HTTPException(status_code=400, detail=f"mode={request.mode} needs text")
+
+    if request.mode == "lexical":
+        ranked = await asyncio.to_thread(text_index.search, request.text, request.k, where)
+        return _search_response(ranked, "lexical")
+
+    if request.mode == "vector":
+        vector = await _query_vector(request.embedding, request.text)
+    else:
+        vector = request.embedding if request.embedding is not None else await generate_embedding(request.text)
+
+    # Each side contributes a deeper list than k, so fusion can promote items one side ranks low
+    depth = max(request.k, 50) if request.mode == "hybrid" else request.k
+    lexical = None
+    if request.mode == "hybrid":
+        lexical = await asyncio.to_thread(text_index.search, request.text, depth, where)
+        if vector is None:
+            return _search_response(lexical[: request.k], "lexical")
+    try:
+        neighbors = await asyncio.to_thread(ann_index.search, vector, depth, where, request.nprobe, request.exact)
+    except DimensionMismatch as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if lexical is None:
+        return _search_response([(n.id, n.score) for n in neighbors], "vector")
+    fused = rrf([[doc_id for doc_id, _ in lexical], [n.id for n in neighbors]])
+    return _search_response(fused[: request.k], "hybrid")
+
+
+def _search_response(ranked: list[tuple[int, float]], mode: str):
+    return FastJSONResponse({
+        "results": [{"id": doc_id, "score": score} for doc_id, score in ranked],
+        "count": len(ranked),
+        "mode": mode,
+    })
+
+
+@router.get("/events/{event_id}/neighbors", response_model=SearchResponse)
+async def event_neighbors(event_id: int, k: int = Query(5, ge=1, le=settings.NEIGHBOR_LIST_K)):
+    """
+    The same user's most similar events, precomputed when events are indexed
+    (app/services/neighbor_lists.py); at most NEIGHBOR_LIST_K.
+    """
+    neighbors = await asyncio.to_thread(neighbor_lists.get, event_id, k)
+    if neighbors is None:
+        raise HTTPException(status_code=404, detail="Event is not indexed")
+    return _search_response(neighbors, "vector")
+
+
+@router.get("/events/{event_id}/similar", response_model=SearchResponse)
+async def similar_events(
+    event_id: int,
+    user_id: int,
+    k: int = Query(5, ge=1, le=100),
+    scope: Literal["user", "community"] = "user",
+):
+    """
+    Events most similar to a stored one: the same user's (`scope=user`) or other
+    users' public ones (`scope=community`). The event's vector is read from the
+    embedding store, so nothing is re-embedded or parsed.
+    """
+    vector = await asyncio.to_thread(embedding_store.get, event_id)
+    if vector is None:
+        raise HTTPException(status_code=404, detail="Event is not indexed")
+    if scope == "user":
+        where = SearchFilter(user_id=user_id)
+    else:
+        where = SearchFilter(exclude_user_id=user_id, public_only=True)
+    neighbors = await asyncio.to_thread(ann_index.search, vector, min(k, 100) + 1, where)
+    return _search_response([(n.id, n.score) for n in neighbors if n.id != event_id][:k], "vector")
+
+
+@router.get("/export")
+async def export_embeddings():
+    """
+    Every stored vector as a binary stream: a header of b"EMB1", uint64 count and
+    uint32 dimensions, then chunks of uint32 n, n int64 ids and n*dim float32
+    values (all little-endian). Vectors are streamed from the memory map.
+    """
+    # The header count and the chunks come from the same snapshot
+    count, dimensions, chunks = await asyncio.to_thread(embedding_store.export)
+
+    def body() -> Iterator[bytes]:
+        yield b"EMB1" + struct.pack("<QI", count, dimensions)
+        for ids, vectors in chunks:
+            yield struct.pack("<I", len(ids)) + ids.astype("<i8").tobytes()
+            yield memoryview(vectors.astype("<f4", copy=False)).cast("B")
+
+    return StreamingResponse(body(), media_type="application/octet-stream")
@@ -0,0 +1,30 @@
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from app.services.jobs import job_queue
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+class JobStatus(BaseModel):
+    id: str
+    kind: str
+    priority: str
+    status: str
+    callback_url: Optional[str]
+    result: Optional[Dict[str, Any]]
+    error: Optional[str]
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+
+
+@router.get("/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """Status of a background job; `result` is set once status is "succeeded"."""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.public()
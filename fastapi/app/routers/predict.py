@@ -2,7 +2,7 @@ from fastapi import APIRouter
 from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 
-from ..database import engine
+from ..database import read_engine
 from ..models import PredictRequest, PredictResponse
 
 router = APIRouter()
@@ -14,7 +14,7 @@ def predict(req: PredictRequest):
     user_count = None
 
     try:
-        with engine.connect() as conn:
+        with read_engine.connect() as conn:
             conn.execute(text("SELECT 1"))
             try:
                 result = conn.execute(text("SELECT COUNT(*) FROM users"))
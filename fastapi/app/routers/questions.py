@@ -1,5 +1,8 @@
-from fastapi import APIRouter
+from functools import lru_cache
+
+from fastapi import APIRouter, Response
 from ..questions import QUIZ_QUESTIONS
+from ..responses import FastJSONResponse
 
 router = APIRouter()
 
@@ -19,6 +22,12 @@ def _serialize_question(question):
     }
 
 
+@lru_cache(maxsize=1)
+def _questions_body() -> bytes:
+    # The quiz is static: render it once per worker
+    return FastJSONResponse({"questions": [_serialize_question(question) for question in QUIZ_QUESTIONS]}).body
+
+
 @router.get("/questions")
 def questions():
-    return {"questions": [_serialize_question(question) for question in QUIZ_QUESTIONS]}
+    return Response(content=_questions_body(), media_type="application/json")
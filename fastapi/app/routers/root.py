@@ -1,4 +1,9 @@
+import os
+
 from fastapi import APIRouter
+from ..services import quiz_reports
+from ..services.resilience import upstream_status
+from ..services.shared_cache import shared_cache
 from ..settings import settings
 
 router = APIRouter()
@@ -11,5 +16,8 @@ def root():
         "db": {
             "connection": settings.DB_CONNECTION,
             "database": settings.DB_DATABASE
-        }
+        },
+        "upstreams": upstream_status(),
+        "cache": {"pid": os.getpid(), **shared_cache.snapshot()},
+        "quiz_reports": quiz_reports.snapshot(),
     }
@@ -1,25 +1,51 @@
-from typing import Any, Dict, List
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, HTTPException
+import msgspec
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from pydantic import BaseModel, Field
 
+from app.data import wire
 from app.data.user_score import AIAnalysisResult, LineChartPoint, UserScores
 from app.label import Label, SubLabelBase
 from app.questions import QUIZ_QUESTIONS
+from app.responses import FastJSONResponse
 from app.scoring_update import (
     LABEL_TO_SUBLABEL_ENUM,
+    QuizScoreTable,
     initialize_from_quiz,
+    initialize_many_from_quiz,
     process_ai_analysis,
 )
+from app.services import ai_service
+from app.services.embedding_store import embedding_store
+from app.services.percentiles import cohort_sketches
+from app.services.score_simulation import PracticePlan, simulate
+from app.services.score_store import UnknownUser, VersionConflict, score_store
+from app.services.sublabel_classifier import classify_event
+from app.settings import settings
+from app.weights import active_weights, available_weights
 
 router = APIRouter(prefix="/scoring", tags=["scoring"])
 
+# Built once at import: the answer -> score lookup for bulk quiz scoring
+QUIZ_SCORE_TABLE = QuizScoreTable(QUIZ_QUESTIONS)
+
 
 class QuizSubmission(BaseModel):
     # Mapping of question_id (str) -> answer index (int)
     answers: Dict[str, int]
 
 
+class BulkQuizSubmission(BaseModel):
+    submissions: List[QuizSubmission] = Field(max_length=10000)
+
+
+class BulkQuizResponse(BaseModel):
+    results: List[UserScores]
+
+
 class UpdateScoreRequest(BaseModel):
     user_scores: UserScores
     ai_sublabel_value: str
@@ -27,6 +53,66 @@ class UpdateScoreRequest(BaseModel):
     ai_magnitude: float
 
 
+class StatefulUpdateRequest(BaseModel):
+    version: int
+    ai_sublabel_value: str
+    ai_is_improvement: bool
+    ai_magnitude: float
+
+
+class ClassifyRequest(BaseModel):
+    text: Optional[str] = None
+    embedding: Optional[List[float]] = None
+    event_id: Optional[int] = None  # use the vector stored for this event
+
+
+class ClassifyResponse(BaseModel):
+    sublabel: str
+    is_improvement: bool
+    magnitude: float
+    confidence: float
+    source: str
+
+
+class PracticeRate(BaseModel):
+    sublabel: str
+    per_week: float = Field(ge=0, le=50)  # expected logged events per week
+    improvement_probability: float = Field(ge=0, le=1)
+    magnitude: float = Field(default=0.5, ge=0, le=1)
+
+
+class SimulateRequest(BaseModel):
+    user_scores: UserScores
+    plan: List[PracticeRate] = Field(min_length=1)
+    weeks: int = Field(default=4, ge=1, le=52)
+    trajectories: int = Field(default=2000, ge=100, le=settings.SIMULATION_MAX_TRAJECTORIES)
+    seed: Optional[int] = None
+
+
+class PercentileRequest(BaseModel):
+    # Label or sub-label value -> score (0-100)
+    scores: Dict[str, float]
+
+
+class ScorePatch(BaseModel):
+    user_id: int
+    version: int
+    sublabel_scores: Dict[str, float]
+    label_scores: Dict[str, float]
+    point: LineChartPoint
+
+
+class HistoryPageResponse(BaseModel):
+    points: List[LineChartPoint]
+    next_after: datetime | None
+
+
+class StoredScoresResponse(BaseModel):
+    user_id: int
+    version: int
+    user_scores: UserScores
+
+
 def _find_sublabel_enum_member(value: str) -> SubLabelBase:
     """
     Given a string value (e.g., 'emotional_awareness'), search through all
@@ -39,6 +125,19 @@ def _find_sublabel_enum_member(value: str) -> SubLabelBase:
     raise ValueError(f"Unknown sub-label value: {value}")
 
 
+# The cohort sketches take one observation per user state change, recorded here
+# rather than in the (pure) scoring functions; the flush runs in a background task.
+def _observe_quiz(user: UserScores) -> None:
+    cohort_sketches.observe({label.value: score for label, score in user.label_scores.items()})
+
+
+def _observe_update(user: UserScores, sublabel: SubLabelBase) -> None:
+    cohort_sketches.observe({
+        sublabel.value: user.sublabel_scores[sublabel.value],
+        sublabel.label.value: user.label_scores[sublabel.label],
+    })
+
+
 @router.post("/init-quiz", response_model=UserScores)
 def init_quiz_scores(payload: QuizSubmission):
     """
@@ -51,11 +150,40 @@ def init_quiz_scores(payload: QuizSubmission):
         updated_user = initialize_from_quiz(
             user=user, questions=QUIZ_QUESTIONS, answers=payload.answers
         )
-        return updated_user
+        _observe_quiz(updated_user)
+        return FastJSONResponse(updated_user)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/quiz-report")
+async def quiz_report(payload: QuizSubmission):
+    """
+    The onboarding "Mindset Analysis" for a set of quiz answers. Users whose answers
+    (or score profile, per QUIZ_REPORT_CACHE) match an earlier user's share that report.
+    """
+    try:
+        report = await ai_service.generate_quiz_analysis(QUIZ_QUESTIONS, payload.answers)
+    except (IndexError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"report": report}
+
+
+@router.post("/init-quiz/bulk", response_model=BulkQuizResponse)
+def init_quiz_scores_bulk(payload: BulkQuizSubmission):
+    """
+    /init-quiz for many users in one call (e.g. partner imports). Results are in
+    submission order and identical to scoring each submission on its own.
+    """
+    try:
+        results = initialize_many_from_quiz(QUIZ_SCORE_TABLE, [submission.answers for submission in payload.submissions])
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    for user in results:
+        _observe_quiz(user)
+    return FastJSONResponse({"results": results})
+
+
 @router.post("/update-scores", response_model=UserScores)
 def update_scores_from_ai(payload: UpdateScoreRequest):
     """
@@ -74,9 +202,215 @@ def update_scores_from_ai(payload: UpdateScoreRequest):
 
         # 3. Process the update
         updated_user = process_ai_analysis(payload.user_scores, analysis)
+        _observe_update(updated_user, sublabel_enum)
 
-        return updated_user
+        return FastJSONResponse(updated_user)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Invalid sub-label: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/update-scores/compact")
+async def update_scores_compact(request: Request):
+    """
+    Same update as /update-scores over the compact wire format (app/data/wire.py).
+
+    Send the scores with only the history tail you need (at least the last point)
+    and get back only the points appended after it. The body is JSON, or msgpack
+    when Content-Type is application/msgpack; the response uses the same encoding.
+    """
+    use_msgpack = request.headers.get("content-type", "").startswith("application/msgpack")
+    decoder = wire.update_request_msgpack_decoder if use_msgpack else wire.update_request_decoder
+    try:
+        payload = decoder.decode(await request.body())
+    except (msgspec.ValidationError, msgspec.DecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    index = wire.SUBLABEL_INDEX.get(payload.analysis.sublabel)
+    if index is None:
+        raise HTTPException(status_code=400, detail=f"Invalid sub-label: Unknown sub-label value: {payload.analysis.sublabel}")
+
+    analysis = AIAnalysisResult(
+        sublabel=wire.SUBLABEL_ORDER[index],
+        is_improvement=payload.analysis.is_improvement,
+        magnitude=payload.analysis.magnitude,
+    )
+    user, offset = wire.from_compact(payload.scores)
+    known = len(user.line_chart_history)
+    updated_user = process_ai_analysis(user, analysis)
+    _observe_update(updated_user, analysis.sublabel)
+    compact = wire.to_compact(updated_user, offset=offset, since=known)
+
+    if use_msgpack:
+        return Response(content=wire.msgpack_encoder.encode(compact), media_type="application/msgpack")
+    return Response(content=wire.json_encoder.encode(compact), media_type="application/json")
+
+
+@router.post("/simulate")
+def simulate_scores(payload: SimulateRequest):
+    """
+    Project the scores under a practice plan: per sub-label event rates and
+    improvement probabilities, simulated as many random trajectories
+    (app/services/score_simulation.py). Returns p10-p90 bands of the overall
+    score per week and of the final label and planned sub-label scores.
+    """
+    try:
+        plan = [
+            PracticePlan(
+                sublabel=_find_sublabel_enum_member(item.sublabel),
+                per_week=item.per_week,
+                improvement_probability=item.improvement_probability,
+                magnitude=item.magnitude,
+            )
+            for item in payload.plan
+        ]
+        return simulate(payload.user_scores, plan, payload.weeks, payload.trajectories, seed=payload.seed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/percentiles")
+def score_percentiles(payload: PercentileRequest):
+    """
+    Where each score sits among everyone's, as a 0-100 percentile. Answered from
+    the cohort sketches (app/services/percentiles.py); keys nobody has a score
+    for yet come back as null.
+    """
+    return cohort_sketches.percentiles(payload.scores)
+
+
+@router.get("/percentiles")
+def cohort_quantiles():
+    """Per-key observation count and p10/p25/p50/p75/p90 of the cohort sketches."""
+    return cohort_sketches.summary()
+
+
+@router.get("/weights")
+def scoring_weights():
+    """The weight table live scoring uses (SCORING_WEIGHTS_VERSION) and the versions on disk."""
+    weights = active_weights()
+    return {"active": weights.to_dict(), "fingerprint": weights.fingerprint, "available": available_weights()}
+
+
+# ---------------------------------------------------------------------------
+# Stateful mode: the service holds each user's canonical scores
+# ---------------------------------------------------------------------------
+
+def _conflict(e: VersionConflict) -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail={"message": str(e), "current_version": e.current},
+    )
+
+
+@router.get("/users/{user_id}", response_model=StoredScoresResponse)
+def get_user_scores(user_id: int):
+    """Full canonical state, for a client that needs to resync after a 409."""
+    stored = score_store.get(user_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"No scores stored for user {user_id}")
+    return FastJSONResponse({"user_id": user_id, "version": stored.version, "user_scores": stored.user})
+
+
+@router.get("/users/{user_id}/history", response_model=HistoryPageResponse)
+def get_user_history(user_id: int, after: datetime | None = None, limit: int = Query(100, ge=1, le=1000)):
+    """Keyset-paged line chart history; pass `next_after` back as `after` for the next page."""
+    try:
+        points, next_after = score_store.history_page(user_id, after=after, limit=limit)
+    except UnknownUser:
+        raise HTTPException(status_code=404, detail=f"No scores stored for user {user_id}")
+    return FastJSONResponse({"points": points, "next_after": next_after})
+
+
+@router.get("/users/{user_id}/percentiles")
+def get_user_percentiles(user_id: int):
+    """/percentiles for every label and assessed sub-label of the stored scores."""
+    stored = score_store.get(user_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"No scores stored for user {user_id}")
+    scores = {label.value: score for label, score in stored.user.label_scores.items()}
+    scores.update(stored.user.sublabel_scores)
+    return cohort_sketches.percentiles(scores)
+
+
+@router.put("/users/{user_id}", response_model=StoredScoresResponse)
+def put_user_scores(user_id: int, user_scores: UserScores, expected_version: int | None = None):
+    """Seed or replace a user's canonical scores (e.g. migrating an existing user)."""
+    try:
+        version = score_store.put(user_id, user_scores, expected_version)
+    except VersionConflict as e:
+        raise _conflict(e)
+    except UnknownUser:
+        raise HTTPException(status_code=404, detail=f"Unknown user {user_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse({"user_id": user_id, "version": version, "user_scores": user_scores})
+
+
+@router.post("/users/{user_id}/init-quiz", response_model=StoredScoresResponse)
+def init_user_quiz_scores(user_id: int, payload: QuizSubmission, expected_version: int | None = None):
+    """Like /init-quiz, but the result becomes the user's canonical state."""
+    try:
+        user = initialize_from_quiz(user=UserScores(), questions=QUIZ_QUESTIONS, answers=payload.answers)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        version = score_store.put(user_id, user, expected_version, origin="quiz")
+    except VersionConflict as e:
+        raise _conflict(e)
+    except UnknownUser:
+        raise HTTPException(status_code=404, detail=f"Unknown user {user_id}")
+    _observe_quiz(user)
+    return FastJSONResponse({"user_id": user_id, "version": version, "user_scores": user})
+
+
+@router.post("/users/{user_id}/update", response_model=ScorePatch)
+def update_user_scores(user_id: int, payload: StatefulUpdateRequest):
+    """
+    Apply an AI analysis to the stored scores. Only the changed sub-label,
+    label and the new history point come back. A stale `version` gets a 409
+    carrying the current version.
+    """
+    try:
+        sublabel_enum = _find_sublabel_enum_member(payload.ai_sublabel_value)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid sub-label: {str(e)}")
+
+    analysis = AIAnalysisResult(
+        sublabel=sublabel_enum,
+        is_improvement=payload.ai_is_improvement,
+        magnitude=payload.ai_magnitude,
+    )
+    try:
+        patch = score_store.apply(user_id, payload.version, analysis)
+    except UnknownUser:
+        raise HTTPException(status_code=404, detail=f"No scores stored for user {user_id}")
+    except VersionConflict as e:
+        raise _conflict(e)
+    cohort_sketches.observe({**patch["sublabel_scores"], **patch["label_scores"]})
+    return FastJSONResponse(patch)
+
+
+@router.post("/classify", response_model=ClassifyResponse)
+async def classify(payload: ClassifyRequest):
+    """
+    The AIAnalysisResult fields for an event, ready for /update-scores. The
+    local classifier answers when it is confident; otherwise the text goes to
+    the LLM (`source` says which).
+    """
+    vector = payload.embedding
+    if vector is None and payload.event_id is not None:
+        vector = await asyncio.to_thread(embedding_store.get, payload.event_id)
+    if vector is None and payload.text:
+        vector = await ai_service.generate_embedding(payload.text)
+    if vector is None and not payload.text:
+        raise HTTPException(status_code=400, detail="Provide text, an embedding or an indexed event_id")
+
+    try:
+        prediction = await classify_event(payload.text, vector)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if prediction is None:
+        raise HTTPException(status_code=503, detail="No trained classifier and the LLM is unavailable")
+    return prediction.public()
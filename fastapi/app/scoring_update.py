@@ -2,40 +2,18 @@ from __future__ import annotations
 
 from datetime import datetime, timezone
 
-from app.constants import (
-    BASE_PENALTY,
-    BASE_REWARD,
-    DEFAULT_SCORE,
-    MAX_SCORE,
-    MIN_SCORE,
-    SEVERITY_MULTIPLIER,
-)
+import numpy as np
+
+from app.constants import DEFAULT_SCORE, MAX_SCORE, MIN_SCORE
 from app.data.quiz import QuizQuestion, QuizQuestionType
 from app.data.user_score import AIAnalysisResult, LineChartPoint, UserScores
-from app.label import (
-    CognitiveClarity,
-    EmotionalMastery,
-    EthicalMoral,
-    IdentityGrowth,
-    Label,
-    PhysicalLifestyle,
-    SocialRelational,
-    SubLabelBase,
-)
+from app.label import LABEL_TO_SUBLABEL_ENUM, Label, SubLabelBase
+from app.weights import WeightTable, active_weights
 # from app.services.ai_service import (
 #     generate_quiz_analysis as generate_quiz_analysis_ai_service,
 # )
 # from app.services.ai_service import llm as LLM_ai_service
 
-LABEL_TO_SUBLABEL_ENUM: dict[Label, type[SubLabelBase]] = {
-    Label.EMOTIONAL_MASTERY: EmotionalMastery,
-    Label.COGNITIVE_CLARITY: CognitiveClarity,
-    Label.SOCIAL_RELATIONAL: SocialRelational,
-    Label.ETHICAL_MORAL: EthicalMoral,
-    Label.PHYSICAL_LIFESTYLE: PhysicalLifestyle,
-    Label.IDENTITY_GROWTH: IdentityGrowth,
-}
-
 
 def _clamp(value: float) -> float:
     return max(MIN_SCORE, min(MAX_SCORE, value))
@@ -48,24 +26,26 @@ def _get_sublabel_score(user: UserScores, sublabel: SubLabelBase) -> float:
     return user.label_scores.get(sublabel.label, DEFAULT_SCORE)
 
 
-def _compute_overall_score(user: UserScores) -> float:
+def _compute_overall_score(user: UserScores, weights: WeightTable) -> float:
     """
     Formula: Sumation(score_i x severity_i) / Sumation(severity_i)
     """
     weighted_sum = 0.0
     total_weight = 0.0
+    severity = weights.severity
 
     for label, enum_class in LABEL_TO_SUBLABEL_ENUM.items():
         for member in enum_class:
             score = _get_sublabel_score(user, member)
-            weight = member.severity
+            weight = severity[member.value]
             weighted_sum += score * weight
             total_weight += weight
 
     return round(weighted_sum / total_weight, 2) if total_weight > 0 else DEFAULT_SCORE
 
 
-def initialize_from_quiz(user: UserScores,questions: list[QuizQuestion],answers: dict[str, int]) -> UserScores:
+def quiz_label_scores(questions: list[QuizQuestion], answers: dict[str, int]) -> dict[Label, float]:
+    """Per-label quiz scores (0-100): the mean of the label's answered questions, DEFAULT_SCORE if none."""
     label_buckets: dict[Label, list[float]] = {label: [] for label in Label}
 
     for question in questions:
@@ -86,13 +66,20 @@ def initialize_from_quiz(user: UserScores,questions: list[QuizQuestion],answers:
 
         label_buckets[question.label].append(score)
 
-    for label, scores in label_buckets.items():
-        if scores:
-            user.label_scores[label] = round(sum(scores) / len(scores), 1)
-        else:
-            user.label_scores[label] = DEFAULT_SCORE
+    return {
+        label: round(sum(scores) / len(scores), 1) if scores else DEFAULT_SCORE
+        for label, scores in label_buckets.items()
+    }
+
 
-    initial_overall_score = _compute_overall_score(user)
+def initialize_from_quiz(
+    user: UserScores, questions: list[QuizQuestion], answers: dict[str, int], weights: WeightTable | None = None
+) -> UserScores:
+    weights = weights or active_weights()
+    user.label_scores.update(quiz_label_scores(questions, answers))
+
+    initial_overall_score = _compute_overall_score(user, weights)
+    user.weights_version = weights.version
 
     user.line_chart_history.append(
         LineChartPoint(
@@ -103,18 +90,126 @@ def initialize_from_quiz(user: UserScores,questions: list[QuizQuestion],answers:
     )
     return user
 
-def update_sublabel_from_ai( user: UserScores, analysis: AIAnalysisResult) -> UserScores:
+
+_UNANSWERED = np.iinfo(np.int64).min
+
+
+class QuizScoreTable:
+    """
+    Per-question answer -> score lookup for scoring many quizzes at once. Rows
+    cover every scenario option and answers 1-5 of the scale questions; any other
+    answer is NaN and sends that quiz through initialize_from_quiz instead.
+    """
+
+    def __init__(self, questions: list[QuizQuestion]) -> None:
+        self.questions = questions
+        self.column = {question.question_id: i for i, question in enumerate(questions)}
+        self.labels = list(Label)
+        self.label_keys = [label.value for label in self.labels]
+        label_index = {label: i for i, label in enumerate(self.labels)}
+        self.label_of = np.array([label_index[question.label] for question in questions], dtype=np.intp)
+
+        width = max([6] + [len(question.options or ()) for question in questions])
+        self.scores = np.full((len(questions), width), np.nan)
+        for i, question in enumerate(questions):
+            if question.question_type == QuizQuestionType.SCENARIO:
+                self.scores[i, : len(question.options)] = [score for _, score in question.options]
+            else:
+                for answer_value in range(1, 6):
+                    if question.inverted:
+                        self.scores[i, answer_value] = (5 - answer_value) / 4 * 100
+                    else:
+                        self.scores[i, answer_value] = (answer_value - 1) / 4 * 100
+
+        # Every sub-label's label column, in the order _compute_overall_score visits them
+        self.sublabels = [
+            (label_index[label], member.value)
+            for label, enum_class in LABEL_TO_SUBLABEL_ENUM.items()
+            for member in enum_class
+        ]
+
+
+def initialize_many_from_quiz(
+    table: QuizScoreTable, submissions: list[dict[str, int]], weights: WeightTable | None = None
+) -> list[UserScores]:
+    """
+    initialize_from_quiz for many users: one answer matrix, one gather, per-label
+    sums over the question columns. The sums run in question order and the
+    rounding uses round(), so every score equals the one-at-a-time result.
+    """
+    weights = weights or active_weights()
+    n, width = len(submissions), table.scores.shape[1]
+    answers = np.array(
+        [[submission.get(question_id, _UNANSWERED) for question_id in table.column] for submission in submissions],
+        dtype=np.int64,
+    ).reshape(n, len(table.questions))
+    answered = answers != _UNANSWERED
+
+    in_table = (answers >= 0) & (answers < width)
+    scores = table.scores[np.arange(len(table.questions)), np.where(in_table, answers, 0)]
+    fallback = (answered & (~in_table | np.isnan(scores))).any(axis=1)
+
+    sums = np.zeros((n, len(table.labels)))
+    counts = np.zeros((n, len(table.labels)), dtype=np.int64)
+    for column, label in enumerate(table.label_of):
+        sums[:, label] += np.where(answered[:, column], scores[:, column], 0.0)
+        counts[:, label] += answered[:, column]
+    means = sums / np.maximum(counts, 1)
+    label_values = [
+        [round(mean, 1) if count else DEFAULT_SCORE for mean, count in zip(mean_row, count_row)]
+        for mean_row, count_row in zip(means.tolist(), counts.tolist())
+    ]
+
+    # Overall score, accumulated over the sub-labels in the same order as _compute_overall_score
+    rounded = np.array(label_values, dtype=float).reshape(n, len(table.labels))
+    weighted_sum = np.zeros(n)
+    total_weight = 0.0
+    for label, key in table.sublabels:
+        weight = weights.severity[key]
+        weighted_sum += rounded[:, label] * weight
+        total_weight += weight
+    overall = (weighted_sum / total_weight).tolist() if total_weight > 0 else [DEFAULT_SCORE] * n
+
+    timestamp = datetime.now(timezone.utc)
+    results: list[UserScores] = []
+    for row in range(n):
+        if fallback[row]:
+            results.append(initialize_from_quiz(UserScores(), table.questions, submissions[row], weights))
+            continue
+        user = UserScores(label_scores=dict(zip(table.labels, label_values[row])), weights_version=weights.version)
+        user.line_chart_history.append(
+            LineChartPoint(
+                timestamp=timestamp,
+                overall_score=round(overall[row], 2) if total_weight > 0 else DEFAULT_SCORE,
+                delta=0.0,
+            )
+        )
+        results.append(user)
+    return results
+
+
+def update_sublabel_from_ai(
+    user: UserScores,
+    analysis: AIAnalysisResult,
+    timestamp: datetime | None = None,
+    weights: WeightTable | None = None,
+) -> UserScores:
+    """
+    `timestamp` dates the new history point; replays pass the original one, live
+    updates use now. `weights` defaults to the active table.
+    """
+    weights = weights or active_weights()
     sublabel = analysis.sublabel
     current = _get_sublabel_score(user, sublabel)
-    severity = sublabel.severity
+    severity = weights.severity[sublabel.value]
 
     if analysis.is_improvement:
         # Reward: base + severity bonus, scaled by magnitude
-        change = (BASE_REWARD + severity * SEVERITY_MULTIPLIER) * analysis.magnitude
+        change = (weights.base_reward + severity * weights.severity_multiplier) * analysis.magnitude
         new_score = _clamp(current + change)
     else:
         # Penalty: base + severity bonus, scaled by magnitude
-        change = (BASE_PENALTY + severity * SEVERITY_MULTIPLIER) * analysis.magnitude
+        change = (weights.base_penalty + severity * weights.severity_multiplier) * analysis.magnitude
         new_score = _clamp(current - change)
 
     user.sublabel_scores[sublabel.value] = round(new_score, 2)
@@ -125,12 +220,13 @@ def update_sublabel_from_ai( user: UserScores, analysis: AIAnalysisResult) -> Us
         if user.line_chart_history
         else DEFAULT_SCORE
     )
-    new_overall = _compute_overall_score(user)
+    new_overall = _compute_overall_score(user, weights)
     delta = round(new_overall - previous_overall, 2)
+    user.weights_version = weights.version
 
     user.line_chart_history.append(
         LineChartPoint(
-            timestamp=datetime.now(timezone.utc),
+            timestamp=timestamp or datetime.now(timezone.utc),
             overall_score=new_overall,
             delta=delta,
         )
@@ -139,15 +235,16 @@ def update_sublabel_from_ai( user: UserScores, analysis: AIAnalysisResult) -> Us
     return user
 
 
-def update_label_from_ai( user: UserScores, label: Label) -> UserScores:
+def update_label_from_ai( user: UserScores, label: Label, weights: WeightTable | None = None) -> UserScores:
     enum_class = LABEL_TO_SUBLABEL_ENUM[label]
+    severity = (weights or active_weights()).severity
 
     weighted_sum = 0.0
     total_weight = 0.0
 
     for member in enum_class:
         score = _get_sublabel_score(user, member)
-        weight = member.severity
+        weight = severity[member.value]
         weighted_sum += score * weight
         total_weight += weight
 
@@ -157,12 +254,13 @@ def update_label_from_ai( user: UserScores, label: Label) -> UserScores:
     return user
 
 
-def process_ai_analysis( user: UserScores, analysis: AIAnalysisResult) -> UserScores:
+def process_ai_analysis( user: UserScores, analysis: AIAnalysisResult, weights: WeightTable | None = None) -> UserScores:
     """
     Use this instead of calling update_sublabel_from_ai + update_label_from_ai separately.
     """
-    user = update_sublabel_from_ai(user, analysis)
-    user = update_label_from_ai(user, analysis.sublabel.label)
+    weights = weights or active_weights()
+    user = update_sublabel_from_ai(user, analysis, weights=weights)
+    user = update_label_from_ai(user, analysis.sublabel.label, weights)
     return user
 
 
@@ -1,3 +1,5 @@
+import asyncio
+import hashlib
 import os
 from pathlib import Path
 from enum import Enum
@@ -7,28 +9,43 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 
 from app.data.quiz import QuizQuestion
+from app.services.fanout import fan_out
+from app.services.gemini_stub import StubEmbeddings, get_stub_llm, stub_enabled
+from app.services import quiz_reports
+from app.services.near_duplicates import NearDuplicate, near_duplicate_index
+from app.services.resilience import gemini_chat, gemini_embeddings
+from app.services.shared_cache import shared_cache
+from app.settings import settings
 
 load_dotenv(Path(__file__).resolve().parents[3] / ".env")
 
+CHAT_MODEL = "gemini-2.5-flash"
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+
 
 def get_llm():
+    if stub_enabled():
+        return get_stub_llm()
     api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
     if not api_key:
         return None
     return ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
+        model=CHAT_MODEL,
         temperature=0.7,
         api_key=api_key,
+        max_retries=1,  # retries are handled by app/services/resilience.py
     )
 
 
 def get_embeddings():
     """Get Google Gemini embeddings model"""
+    if stub_enabled():
+        return StubEmbeddings()
     api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
     if not api_key:
         return None
     return GoogleGenerativeAIEmbeddings(
-        model="models/gemini-embedding-001",
+        model=EMBEDDING_MODEL,
         api_key=api_key,
     )
 
@@ -83,19 +100,45 @@ async def generate_quiz_analysis(
         )
 
     chain = prompt | llm
-    try:
-        response = await chain.ainvoke({"transcript": transcript})
-        return response.content
-    except Exception as e:
-        print(f"Gemini API Error: {e}")
+    generated = False
+
+    async def generate() -> str | None:
+        nonlocal generated
+        generated = True
+        try:
+            response = await gemini_chat.call(lambda: chain.ainvoke({"transcript": transcript}))
+            return response.content
+        except Exception as e:
+            print(f"Gemini API Error: {e}")
+            return None
+
+    # Users with the same answers (or profile) share one report; see app/services/quiz_reports.py
+    key = quiz_reports.report_key(questions, answers, "stub" if stub_enabled() else CHAT_MODEL)
+    if key is None:
+        report = await generate()
+    else:
+        report = await shared_cache.get_or_compute(quiz_reports.NAMESPACE, key, generate)
+        quiz_reports.record(hit=not generated)
+    if report is None:
         return (
             "Your personalized analysis is being prepared. Please check back shortly."
         )
+    return report
+
+
+def _embedding_model_name() -> str:
+    return "stub" if stub_enabled() else EMBEDDING_MODEL
+
+
+def _embedding_cache_key(text: str) -> str:
+    # Vectors depend on the model, so it is part of the key; stub vectors never mix with real ones
+    return hashlib.sha256(f"{_embedding_model_name()}\0{text}".encode()).hexdigest()
 
 
 async def generate_embedding(text: str) -> list[float] | None:
     """
     Generate a 768-dimensional embedding vector for the given text using Google Gemini.
+    Vectors are cached in the shared cache (app/services/shared_cache.py).
 
     Args:
         text: The text to embed
@@ -107,18 +150,60 @@ async def generate_embedding(text: str) -> list[float] | None:
     if embeddings_model is None:
         return None
 
-    try:
-        # LangChain's embed_query returns a list of floats
-        vector = await embeddings_model.aembed_query(text)
-        return vector
-    except Exception as e:
-        print(f"Embedding generation error: {e}")
-        return None
+    async def embed() -> list[float] | None:
+        try:
+            # LangChain's embed_query returns a list of floats
+            vector = await gemini_embeddings.call(lambda: embeddings_model.aembed_query(text), hedge=True)
+            return vector
+        except Exception as e:
+            print(f"Embedding generation error: {e}")
+            return None
+
+    return await shared_cache.get_or_compute("embedding", _embedding_cache_key(text), embed)
+
+
+async def generate_embedding_deduped(
+    text: str, doc_id: str | None = None
+) -> tuple[list[float] | None, NearDuplicate | None]:
+    """
+    Like generate_embedding, but first looks for an already-embedded text within
+    EMBEDDING_DEDUPE_MAX_DISTANCE (app/services/near_duplicates.py) and, per
+    EMBEDDING_DEDUPE_POLICY, reuses its vector instead of calling the model.
+
+    Returns:
+        (vector, near_duplicate). The vector is None when the model is
+        unavailable, or under the "skip" policy when the near-duplicate is an
+        earlier version of the same doc_id (the caller keeps the vector it has).
+    """
+    policy = settings.EMBEDDING_DEDUPE_POLICY
+    key = _embedding_cache_key(text)
+    if policy == "off" or await shared_cache.aget("embedding", key) is not None:
+        return await generate_embedding(text), None
+
+    model = _embedding_model_name()
+    signature = near_duplicate_index.signature(text)
+    # The index is a SQLite file shared by all workers; keep its queries off the event loop
+    match = await asyncio.to_thread(
+        near_duplicate_index.find, model, signature, settings.EMBEDDING_DEDUPE_MAX_DISTANCE
+    )
+    if match is not None:
+        if policy == "skip" and doc_id is not None and match.doc_id == doc_id:
+            return None, match
+        return match.vector, match
+
+    vector = await generate_embedding(text)
+    if vector is not None:
+        await asyncio.to_thread(near_duplicate_index.add, model, key, signature, vector, doc_id)
+    return vector, None
 
 
 async def generate_embeddings_batch(texts: list[str]) -> list[list[float]] | None:
     """
     Generate embeddings for multiple texts in a batch.
+    Only texts missing from the shared cache are sent upstream, and unless
+    EMBEDDING_DEDUPE_POLICY is "off" near-duplicates of already-embedded texts
+    reuse their vectors; batches larger than EMBEDDING_BATCH_CHUNK are split and
+    the chunks are embedded concurrently.
 
     Args:
         texts: List of texts to embed
@@ -130,12 +215,62 @@ async def generate_embeddings_batch(texts: list[str]) -> list[list[float]] | Non
     if embeddings_model is None:
         return None
 
-    try:
-        vectors = await embeddings_model.aembed_documents(texts)
-        return vectors
-    except Exception as e:
-        print(f"Batch embedding generation error: {e}")
+    keys = [_embedding_cache_key(text) for text in texts]
+    vectors_by_key = await shared_cache.aget_many("embedding", keys)
+    missing = list({key: text for key, text in zip(keys, texts) if key not in vectors_by_key}.items())
+
+    model = _embedding_model_name()
+    signatures = {}
+    if missing and settings.EMBEDDING_DEDUPE_POLICY != "off":
+        signatures = {key: near_duplicate_index.signature(text) for key, text in missing}
+
+        def find_all() -> dict:
+            return {
+                key: near_duplicate_index.find(model, signature, settings.EMBEDDING_DEDUPE_MAX_DISTANCE)
+                for key, signature in signatures.items()
+            }
+
+        matches = await asyncio.to_thread(find_all)
+        vectors_by_key.update({key: match.vector for key, match in matches.items() if match is not None})
+        missing = [(key, text) for key, text in missing if matches[key] is None]
+
+    if missing:
+        fresh = await _embed_documents(embeddings_model, [text for _, text in missing])
+        if fresh is None:
+            return None
+        new_vectors = {key: vector for (key, _), vector in zip(missing, fresh)}
+        await shared_cache.aset_many("embedding", new_vectors)
+        vectors_by_key.update(new_vectors)
+
+        def index_new() -> None:
+            for key, vector in new_vectors.items():
+                if key in signatures:
+                    near_duplicate_index.add(model, key, signatures[key], vector)
+
+        await asyncio.to_thread(index_new)
+    return [vectors_by_key[key] for key in keys]
+
+
+async def _embed_documents(embeddings_model, texts: list[str]) -> list[list[float]] | None:
+    chunk = settings.EMBEDDING_BATCH_CHUNK
+    if len(texts) <= chunk:
+        try:
+            vectors = await gemini_embeddings.call(lambda: embeddings_model.aembed_documents(texts), hedge=True)
+            return vectors
+        except Exception as e:
+            print(f"Batch embedding generation error: {e}")
+            return None
+
+    outcome = await fan_out({
+        str(start): gemini_embeddings.call(
+            lambda batch=texts[start : start + chunk]: embeddings_model.aembed_documents(batch), hedge=True
+        )
+        for start in range(0, len(texts), chunk)
+    })
+    if not outcome.complete:
+        print(f"Batch embedding generation error: {next(iter(outcome.errors.values()))!r}")
         return None
+    return [vector for start in range(0, len(texts), chunk) for vector in outcome.results[str(start)]]
 
 
 class Label(Enum):
@@ -0,0 +1,522 @@
+"""
+Approximate nearest-neighbour index over reflection embeddings, across users.
+
+An IVF-PQ index in NumPy: vectors are normalised (inner product = cosine),
+assigned to one of ANN_NLIST coarse k-means lists, and their residuals
+product-quantised into ANN_PQ_SUBSPACES one-byte codes. A query scans only the
+ANN_NPROBE closest lists with PQ lookup tables and re-ranks the best
+k * ANN_RERANK candidates exactly.
+
+Rows carry user id, visibility and label, so searches can be filtered. When a
+filter matches at most ANN_EXACT_MAX rows, or before the index has been trained
+(ANN_TRAIN_MIN rows), the search is exact over the matching rows.
+
+All arrays are memory-mapped files in a data directory under
+storage/app/fastapi/ann/, named by `meta.json`. Inserts append past the
+published row count, deletes leave tombstones, and `meta.json` is replaced
+last, so a crash mid-write leaves the previous state readable. A replaced row
+is retired only after the new one is published; if a crash falls in between,
+the newer row wins on the next load. Compaction (once tombstones are a quarter
+of the rows) and training never touch the published files: they write a new
+data directory and switch to it by replacing `meta.json`. Writers take a file
+lock, and every worker reloads when it sees a newer generation.
+
+`python -m bench.ann_recall` measures recall against exact search.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from app.settings import settings
+from app.storage import storage_dir
+
+logger = logging.getLogger(__name__)
+
+ROW_DTYPE = np.dtype(
+    [("id", "<i8"), ("user_id", "<i8"), ("label", "<i4"), ("list", "<i4"), ("public", "?"), ("live", "?")]
+)
+_MIN_CAPACITY = 1024
+_KMEANS_ITERATIONS = 12
+_TRAIN_SAMPLE = 20000
+_COMPACT_RATIO = 0.25
+_COLUMN_FILES = ("rows.bin", "vectors.f32", "codes.u8", "model.npz")
+
+
+class DimensionMismatch(ValueError):
+    pass
+
+
+@dataclass
+class SearchFilter:
+    user_id: Optional[int] = None
+    exclude_user_id: Optional[int] = None
+    public_only: bool = False
+    label: Optional[str] = None
+
+
+@dataclass
+class Neighbor:
+    id: int
+    score: float
+
+
+class _Column:
+    """A growable array in a memory-mapped file; `width` columns per row."""
+
+    def __init__(self, path: Path, dtype, width: int = 0) -> None:
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.width = width
+        self.array: Optional[np.memmap] = None
+
+    @property
+    def _row_bytes(self) -> int:
+        return self.dtype.itemsize * max(self.width, 1)
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self.array is None else self.array.shape[0]
+
+    def open(self, create: bool = True) -> None:
+        """Map the file; with create=False a missing file raises FileNotFoundError instead of being created."""
+        if not create and not self.path.exists():
+            raise FileNotFoundError(self.path)
+        if not self.path.exists() or self.path.stat().st_size < _MIN_CAPACITY * self._row_bytes:
+            self._resize(_MIN_CAPACITY)
+        capacity = self.path.stat().st_size // self._row_bytes
+        shape = (capacity, self.width) if self.width else (capacity,)
+        self.array = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=shape)
+
+    def reserve(self, rows: int) -> None:
+        if rows > self.capacity:
+            self.close()
+            self._resize(max(rows, self.capacity * 2, _MIN_CAPACITY))
+            self.open()
+
+    def _resize(self, rows: int) -> None:
+        with open(self.path, "ab") as f:
+            f.truncate(rows * self._row_bytes)
+
+    def flush(self) -> None:
+        if self.array is not None:
+            self.array.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self.array = None
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int = _KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means on squared L2 distance; empty clusters are re-seeded from random points."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    data_sq = np.einsum("ij,ij->i", data, data)
+    for _ in range(iterations):
+        distances = data_sq[:, None] - 2 * data @ centroids.T + np.einsum("ij,ij->i", centroids, centroids)[None, :]
+        assignment = distances.argmin(axis=1)
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, data)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        centroids[empty] = data[rng.choice(len(data), size=int(empty.sum()), replace=False)]
+    return centroids
+
+
+def _subspaces(dim: int) -> int:
+    """The largest sub-vector count <= ANN_PQ_SUBSPACES that divides `dim`."""
+    m = min(settings.ANN_PQ_SUBSPACES, dim)
+    while dim % m:
+        m -= 1
+    return m
+
+
+class AnnIndex:
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self._path = path
+        self._lock = threading.RLock()
+        self._generation = -1
+        self.meta: Dict = {}
+        self.rows = self.vectors = self.codes = None
+        self.centroids: Optional[np.ndarray] = None
+        self.codebooks: Optional[np.ndarray] = None
+        self.row_of: Dict[int, int] = {}
+        self.lists: List[np.ndarray] = []
+        # Live rows superseded by a newer row of the same id (a crash before the old row was retired)
+        self._shadowed = np.empty(0, dtype=np.int64)
+
+    @property
+    def path(self) -> Path:
+        if self._path is None:
+            self._path = storage_dir() / "ann"
+        self._path.mkdir(parents=True, exist_ok=True)
+        return self._path
+
+    # -- state on disk ------------------------------------------------------
+
+    def _read_meta(self) -> Dict:
+        try:
+            return json.loads((self.path / "meta.json").read_text())
+        except FileNotFoundError:
+            return {"generation": 0, "count": 0, "dim": 0, "labels": [], "trained": False, "subspaces": 0}
+
+    def _write_meta(self) -> None:
+        self.meta["generation"] += 1
+        tmp = self.path / "meta.json.tmp"
+        tmp.write_text(json.dumps(self.meta))
+        os.replace(tmp, self.path / "meta.json")
+        self._generation = self.meta["generation"]
+
+    def _data_dir(self, meta: Optional[Dict] = None) -> Path:
+        # Indexes that were never compacted or trained keep their files at the top level
+        return self.path / (meta or self.meta).get("data", ".")
+
+    def _refresh(self) -> None:
+        """Reload if another worker (or process) has written since we last looked."""
+        for _ in range(3):
+            meta = self._read_meta()
+            if meta["generation"] == self._generation:
+                return
+            try:
+                self._load(meta)
+                return
+            except FileNotFoundError:
+                # A compaction or training switched data directories and removed ours; read meta.json again
+                continue
+        raise RuntimeError("ANN index keeps changing under the reader")
+
+    def _load(self, meta: Dict) -> None:
+        directory = self._data_dir(meta)
+        create = meta["generation"] == 0
+        rows_column = _Column(directory / "rows.bin", ROW_DTYPE)
+        rows_column.open(create)
+        vectors = codes = centroids = codebooks = None
+        if meta["dim"]:
+            vectors = _Column(directory / "vectors.f32", np.float32, meta["dim"])
+            vectors.open(create)
+        if meta["trained"]:
+            codes = _Column(directory / "codes.u8", np.uint8, meta["subspaces"])
+            codes.open(create=False)
+            with np.load(directory / "model.npz") as model:
+                centroids, codebooks = model["centroids"], model["codebooks"]
+
+        self.meta = meta
+        self.rows, self.vectors, self.codes = rows_column, vectors, codes
+        self.centroids, self.codebooks = centroids, codebooks
+        rows = self.rows.array[: meta["count"]]
+        live = np.flatnonzero(rows["live"])
+        self.row_of = dict(zip(rows["id"][live].tolist(), live.tolist()))
+        self._shadowed = np.empty(0, dtype=np.int64)
+        if len(self.row_of) < len(live):
+            newest = np.sort(np.fromiter(self.row_of.values(), dtype=np.int64, count=len(self.row_of)))
+            self._shadowed = np.setdiff1d(live, newest)
+            live = newest
+        self.lists = []
+        if meta["trained"]:
+            order = live[np.argsort(rows["list"][live], kind="stable")]
+            bounds = np.searchsorted(rows["list"][order], np.arange(len(self.centroids) + 1))
+            self.lists = [order[bounds[i] : bounds[i + 1]] for i in range(len(self.centroids))]
+        self._generation = meta["generation"]
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        with self._lock, open(self.path / "lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                if len(self._shadowed):
+                    self.rows.array["live"][self._shadowed] = False
+                    self.rows.flush()
+                    self._shadowed = np.empty(0, dtype=np.int64)
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _label_code(self, label: Optional[str], create: bool) -> int:
+        if label is None:
+            return -1
+        labels = self.meta["labels"]
+        if label not in labels:
+            if not create:
+                return -2  # matches nothing
+            labels.append(label)
+        return labels.index(label)
+
+    # -- writes -------------------------------------------------------------
+
+    def upsert(
+        self,
+        item_id: int,
+        vector: Sequence[float],
+        user_id: int,
+        public: bool = False,
+        label: Optional[str] = None,
+    ) -> None:
+        self.upsert_many([(item_id, vector, user_id, public, label)])
+
+    def upsert_many(self, items: Sequence[tuple]) -> None:
+        """Insert or replace (id, vector, user_id, public, label) rows; one write for the whole batch."""
+        if not items:
+            return
+        vectors = _normalize([item[1] for item in items])
+        with self._writing():
+            if not self.meta["dim"]:
+                self.meta["dim"] = vectors.shape[1]
+                self.vectors = _Column(self._data_dir() / "vectors.f32", np.float32, vectors.shape[1])
+                self.vectors.open()
+            if vectors.shape[1] != self.meta["dim"]:
+                raise DimensionMismatch(f"Expected {self.meta['dim']} dimensions, got {vectors.shape[1]}")
+
+            start = self.meta["count"]
+            end = start + len(items)
+            for column in (self.rows, self.vectors, self.codes):
+                if column is not None:
+                    column.reserve(end)
+            replaced = []
+            for offset, (item_id, _, user_id, public, label) in enumerate(items):
+                old = self.row_of.pop(item_id, None)
+                if old is not None and old < start:
+                    replaced.append(old)
+                self.rows.array[start + offset] = (
+                    item_id, user_id, self._label_code(label, create=True), -1, bool(public), True
+                )
+                self.row_of[item_id] = start + offset
+            self.vectors.array[start:end] = vectors
+            if self.meta["trained"]:
+                list_ids, codes = self._encode(vectors)
+                self.rows.array["list"][start:end] = list_ids
+                self.codes.array[start:end] = codes
+                for list_id in np.unique(list_ids):
+                    self.lists[list_id] = np.append(self.lists[list_id], start + np.flatnonzero(list_ids == list_id))
+            # A row replaced twice within the batch leaves its earlier copy dead
+            for offset, (item_id, *_) in enumerate(items):
+                if self.row_of[item_id] != start + offset:
+                    self.rows.array["live"][start + offset] = False
+            for column in (self.rows, self.vectors, self.codes):
+                if column is not None:
+                    column.flush()
+            self.meta["count"] = end
+            self._write_meta()
+            # Only now that the new rows are published: a crash before this line keeps both copies
+            if replaced:
+                self.rows.array["live"][replaced] = False
+                self.rows.flush()
+
+    def delete(self, item_id: int) -> bool:
+        with self._writing():
+            row = self.row_of.pop(item_id, None)
+            if row is None:
+                return False
+            self.rows.array["live"][row] = False
+            self.rows.flush()
+            if self.meta["count"] >= _MIN_CAPACITY and len(self.row_of) < (1 - _COMPACT_RATIO) * self.meta["count"]:
+                self._compact()
+            else:
+                self._write_meta()
+            return True
+
+    def _compact(self) -> None:
+        """Publish the live rows, contiguously, in a new data directory (under the write lock)."""
+        live = np.flatnonzero(self.rows.array[: self.meta["count"]]["live"])
+        self._rewrite(live)
+        logger.info("Compacted ANN index to %d rows", len(live))
+
+    def _rewrite(self, keep: np.ndarray, model: Optional[tuple] = None) -> None:
+        """
+        Copy rows `keep` into a new data directory, re-encoded with `model`
+        ((centroids, codebooks)) when given, then switch meta.json to it and
+        remove the old files. Until the switch, readers see the old directory.
+        """
+        old_directory = self._data_dir()
+        name = f"data-{self.meta['generation'] + 1}"
+        directory = self.path / name
+        shutil.rmtree(directory, ignore_errors=True)  # leftovers of an interrupted rewrite
+        directory.mkdir()
+
+        centroids, codebooks = model if model is not None else (self.centroids, self.codebooks)
+        trained = centroids is not None
+        subspaces = codebooks.shape[0] if trained else 0
+        rows = _Column(directory / "rows.bin", ROW_DTYPE)
+        vectors = _Column(directory / "vectors.f32", np.float32, self.meta["dim"])
+        codes = _Column(directory / "codes.u8", np.uint8, subspaces) if trained else None
+        for column in (rows, vectors, codes):
+            if column is not None:
+                column.reserve(len(keep))
+        for start in range(0, len(keep), 4096):
+            batch = keep[start : start + 4096]
+            end = start + len(batch)
+            rows.array[start:end] = self.rows.array[batch]
+            vectors.array[start:end] = self.vectors.array[batch]
+            if model is not None:
+                list_ids, batch_codes = self._encode(np.asarray(vectors.array[start:end]), centroids, codebooks)
+                rows.array["list"][start:end] = list_ids
+                codes.array[start:end] = batch_codes
+            elif trained:
+                codes.array[start:end] = self.codes.array[batch]
+        for column in (rows, vectors, codes):
+            if column is not None:
+                column.close()
+        if trained:
+            np.savez(directory / "model.npz", centroids=centroids, codebooks=codebooks)
+
+        self.meta.update(count=len(keep), data=name, trained=trained, subspaces=subspaces)
+        self._write_meta()
+        # Workers still mapping the old files keep reading them until they see the new meta.json
+        if old_directory == self.path:
+            for file_name in _COLUMN_FILES:
+                (self.path / file_name).unlink(missing_ok=True)
+        else:
+            shutil.rmtree(old_directory, ignore_errors=True)
+        self._generation = -1  # row numbers changed; rebuild the in-memory maps
+
+    def train(self, force: bool = False) -> bool:
+        """
+        Build coarse centroids and PQ codebooks from the live rows and re-encode
+        them. Without `force`, only when `needs_training` (another worker may
+        have trained while this one waited for the lock).
+        """
+        with self._writing():
+            if not force and not self._needs_training():
+                return False
+            live = np.flatnonzero(self.rows.array[: self.meta["count"]]["live"])
+            if len(live) < max(settings.ANN_TRAIN_MIN, 256):
+                return False
+            dim = self.meta["dim"]
+            m = _subspaces(dim)
+            rng = np.random.default_rng(0)
+            sample = np.asarray(self.vectors.array[rng.choice(live, size=min(len(live), _TRAIN_SAMPLE), replace=False)])
+            nlist = max(1, min(settings.ANN_NLIST, len(sample) // 39))
+            centroids = kmeans(sample, nlist)
+            residuals = (sample - centroids[self._assign(sample, centroids)]).reshape(len(sample), m, dim // m)
+            codebooks = np.stack([kmeans(residuals[:, j, :], 256, seed=j) for j in range(m)])
+            # Training also drops tombstones: only the live rows are copied
+            self.meta["trained_rows"] = len(live)
+            self._rewrite(live, model=(centroids, codebooks))
+            return True
+
+    def _assign(self, vectors: np.ndarray, centroids: Optional[np.ndarray] = None) -> np.ndarray:
+        return (vectors @ (self.centroids if centroids is None else centroids).T).argmax(axis=1)
+
+    def _encode(self, vectors: np.ndarray, centroids: Optional[np.ndarray] = None, codebooks: Optional[np.ndarray] = None):
+        centroids = self.centroids if centroids is None else centroids
+        codebooks = self.codebooks if codebooks is None else codebooks
+        list_ids = self._assign(vectors, centroids)
+        m, _, sub_dim = codebooks.shape
+        residuals = (vectors - centroids[list_ids]).reshape(len(vectors), m, sub_dim)
+        # ||r - c||^2 without the ||r||^2 term, which does not change the argmin
+        distances = np.einsum("jcd,jcd->jc", codebooks, codebooks)[None] - 2 * np.einsum(
+            "njd,jcd->njc", residuals, codebooks
+        )
+        return list_ids.astype(np.int32), distances.argmin(axis=-1).astype(np.uint8)
+
+    # -- reads --------------------------------------------------------------
+
+    def _mask(self, rows: np.ndarray, where: SearchFilter) -> np.ndarray:
+        mask = rows["live"].copy()
+        mask[self._shadowed] = False
+        if where.user_id is not None:
+            mask &= rows["user_id"] == where.user_id
+        if where.exclude_user_id is not None:
+            mask &= rows["user_id"] != where.exclude_user_id
+        if where.public_only:
+            mask &= rows["public"]
+        if where.label is not None:
+            mask &= rows["label"] == self._label_code(where.label, create=False)
+        return mask
+
+    def search(
+        self,
+        query: Sequence[float],
+        k: int = 10,
+        where: Optional[SearchFilter] = None,
+        nprobe: Optional[int] = None,
+        exact: bool = False,
+    ) -> List[Neighbor]:
+        query = _normalize(query)
+        with self._lock:
+            self._refresh()
+            count = self.meta["count"]
+            if not count:
+                return []
+            if len(query) != self.meta["dim"]:
+                raise DimensionMismatch(f"Expected {self.meta['dim']} dimensions, got {len(query)}")
+            rows = self.rows.array[:count]
+            mask = self._mask(rows, where or SearchFilter())
+            matching = int(mask.sum())
+            if exact or not self.meta["trained"] or matching <= settings.ANN_EXACT_MAX:
+                if matching * 4 > count:
+                    # Broad filter: one matrix-vector product over the mapped rows beats gathering them
+                    candidates = np.flatnonzero(mask)
+                    scores = (self.vectors.array[:count] @ query)[candidates]
+                else:
+                    candidates = np.flatnonzero(mask)
+                    scores = np.asarray(self.vectors.array[candidates]) @ query
+            else:
+                candidates = self._ivf_candidates(query, mask, k, nprobe or settings.ANN_NPROBE)
+                scores = np.asarray(self.vectors.array[candidates]) @ query
+            if not len(candidates):
+                return []
+            top = np.argsort(-scores)[:k]
+            return [Neighbor(int(rows["id"][candidates[i]]), float(scores[i])) for i in top]
+
+    def _ivf_candidates(self, query: np.ndarray, mask: np.ndarray, k: int, nprobe: int) -> np.ndarray:
+        """Rows from the closest lists, best k * ANN_RERANK by PQ score; probes more lists if the filter leaves too few."""
+        coarse = self.centroids @ query
+        order = np.argsort(-coarse)
+        m, _, sub_dim = self.codebooks.shape
+        table = np.einsum("jcd,jd->jc", self.codebooks, query.reshape(m, sub_dim))
+        wanted = k * settings.ANN_RERANK
+
+        nprobe = min(nprobe, len(order))
+        while True:
+            probed = order[:nprobe]
+            rows = np.concatenate([self.lists[i] for i in probed]) if nprobe else np.empty(0, dtype=np.int64)
+            rows = rows[mask[rows]]
+            if len(rows) >= wanted or nprobe == len(order):
+                break
+            nprobe = min(len(order), nprobe * 2)
+
+        if len(rows) <= wanted:
+            return rows
+        codes = np.asarray(self.codes.array[rows])
+        approx = coarse[self.rows.array["list"][rows]] + table[np.arange(m), codes].sum(axis=1)
+        return rows[np.argpartition(-approx, wanted - 1)[:wanted]]
+
+    def _needs_training(self) -> bool:
+        rows = len(self.row_of)
+        if self.meta["trained"]:
+            return rows >= 4 * self.meta["trained_rows"]
+        return rows >= settings.ANN_TRAIN_MIN
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._refresh()
+            return {
+                "rows": len(self.row_of),
+                "tombstones": self.meta["count"] - len(self.row_of),
+                "dimensions": self.meta["dim"],
+                "trained": self.meta["trained"],
+                "lists": len(self.lists),
+                "needs_training": self._needs_training(),
+            }
+
+
+ann_index = AnnIndex()
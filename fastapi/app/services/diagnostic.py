@@ -1,4 +1,5 @@
 import json
+import logging
 import os
 from datetime import datetime, timezone
 from pathlib import Path
@@ -19,9 +20,22 @@ from app.label import (
     SocialRelational,
     SubLabelBase,
 )
+from app.services.gemini_stub import get_stub_llm, stub_enabled
+from app.services.prompt_budget import (
+    BudgetReport,
+    compact_sublabel_table,
+    estimate_tokens,
+    fit_transcript,
+    truncate_to_tokens,
+)
+from app.services.resilience import gemini_chat
+from app.services.sublabel_ranker import ALL_SUBLABELS, select_sublabels
+from app.settings import settings
 
 load_dotenv(Path(__file__).resolve().parents[3] / ".env")
 
+logger = logging.getLogger(__name__)
+
 LABEL_TO_SUBLABEL_ENUM = {
     Label.EMOTIONAL_MASTERY: EmotionalMastery,
     Label.COGNITIVE_CLARITY: CognitiveClarity,
@@ -33,6 +47,8 @@ LABEL_TO_SUBLABEL_ENUM = {
 
 
 def get_llm():
+    if stub_enabled():
+        return get_stub_llm()
     api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
     if not api_key:
         return None
@@ -40,6 +56,7 @@ def get_llm():
         model="gemini-2.5-flash",
         temperature=0.7,
         api_key=api_key,
+        max_retries=1,  # retries are handled by app/services/resilience.py
     )
 
 
@@ -65,7 +82,7 @@ async def generate_primary_question() -> str:
 
     chain = prompt | llm
     try:
-        response = await chain.ainvoke({})
+        response = await gemini_chat.call(lambda: chain.ainvoke({}))
         return response.content.strip()
     except Exception as e:
         print(f"Gemini API Error: {e}")
@@ -204,7 +221,7 @@ async def generate_follow_up_questions(
 
     chain = prompt | llm
     try:
-        response = await chain.ainvoke(
+        response = await gemini_chat.call(lambda: chain.ainvoke(
             {
                 "primary_question": primary_question,
                 "primary_answer": primary_answer,
@@ -212,7 +229,7 @@ async def generate_follow_up_questions(
                 "scores_context": scores_context,
                 "event_context_str": event_context_str,
             }
-        )
+        ))
 
         content = response.content.strip()
         # Clean markdown if present
@@ -234,51 +251,7 @@ async def generate_follow_up_questions(
         ]
 
 
-async def analyze_conversation_and_score(
-    conversation_history: List[Dict[str, str]],
-    current_scores: Optional[Dict[str, float]] = None,
-    event_context: Optional[Dict[str, Any]] = None,
-) -> Dict[str, Any]:
-    """
-    Analyze the complete conversation and generate:
-    1. Scores for each label (0-100)
-    2. Scores for relevant sublabels (0-100)
-    3. A comprehensive summary
-    current_scores provides the user's existing profile as a baseline.
-    event_context provides the full reflection/event the user is consulting about.
-    """
-    llm = get_llm()
-    if llm is None:
-        return {
-            "error": "AI analysis unavailable. Please configure GOOGLE_API_KEY or GEMINI_API_KEY."
-        }
-
-    # Build conversation transcript
-    transcript = ""
-    for i, msg in enumerate(conversation_history, 1):
-        transcript += f"Q{i}: {msg['question']}\nA{i}: {msg['answer']}\n\n"
-
-    # Get all possible sublabels for reference
-    all_sublabels = {}
-    for label, enum_class in LABEL_TO_SUBLABEL_ENUM.items():
-        for member in enum_class:
-            all_sublabels[member.value] = {
-                "parent_label": label.value,
-                "severity": member.severity,
-            }
-
-    scores_context = _build_scores_context_str(current_scores)
-    if scores_context:
-        scores_context += (
-            "\nIMPORTANT: Use these previous scores as a baseline. Your new scores should reflect "
-            "how this conversation changes or confirms the user's profile. If the conversation "
-            "reveals growth in an area, the score should increase. If it reveals new struggles, "
-            "the score should decrease. For areas not discussed, keep scores close to the baseline.\n"
-        )
-
-    event_context_str = _build_event_context_str(event_context)
-
-    prompt = ChatPromptTemplate.from_template("""
+ANALYSIS_PROMPT_TEMPLATE = """
         You are an expert psychologist analyzing a diagnostic conversation.
 
         {event_context_str}
@@ -297,7 +270,7 @@ async def analyze_conversation_and_score(
         - physical_lifestyle: Health habits, time management, self-care
         - identity_growth: Self-worth, purpose, mindset, personal development
 
-        Available Sublabels:
+        Available Sublabels (one line per label: parent_label: sublabel(severity), ...):
         {sublabels}
 
         TASK:
@@ -360,18 +333,106 @@ async def analyze_conversation_and_score(
         3. Be specific in the summary - reference actual things from the reflection and conversation
         4. Include sublabel_scores only for areas clearly revealed
         5. Return ONLY valid JSON, no markdown, no code blocks, no extra text
-    """)
+    """
+
+_ANALYSIS_TEMPLATE_TOKENS = estimate_tokens(ANALYSIS_PROMPT_TEMPLATE)
+
+# Size of the indented JSON sublabel dump the analyzer prompt used to carry, for savings logs
+_BASELINE_SUBLABEL_TOKENS = estimate_tokens(json.dumps(
+    {
+        member.value: {"parent_label": label.value, "severity": member.severity}
+        for label, enum_class in LABEL_TO_SUBLABEL_ENUM.items()
+        for member in enum_class
+    },
+    indent=2,
+))
+
+
+async def analyze_conversation_and_score(
+    conversation_history: List[Dict[str, str]],
+    current_scores: Optional[Dict[str, float]] = None,
+    event_context: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Analyze the complete conversation and generate:
+    1. Scores for each label (0-100)
+    2. Scores for relevant sublabels (0-100)
+    3. A comprehensive summary
+    current_scores provides the user's existing profile as a baseline.
+    event_context provides the full reflection/event the user is consulting about.
+    """
+    llm = get_llm()
+    if llm is None:
+        return {
+            "error": "AI analysis unavailable. Please configure GOOGLE_API_KEY or GEMINI_API_KEY."
+        }
+
+    scores_context = _build_scores_context_str(current_scores)
+    if scores_context:
+        scores_context += (
+            "\nIMPORTANT: Use these previous scores as a baseline. Your new scores should reflect "
+            "how this conversation changes or confirms the user's profile. If the conversation "
+            "reveals growth in an area, the score should increase. If it reveals new struggles, "
+            "the score should decrease. For areas not discussed, keep scores close to the baseline.\n"
+        )
+
+    # Fit the prompt into the token budget: pre-ranked sublabels in a compact
+    # table, capped event context, and whatever is left for the transcript.
+    full_event_context_str = _build_event_context_str(event_context)
+    event_context_str = truncate_to_tokens(full_event_context_str, settings.DIAGNOSTIC_EVENT_CONTEXT_TOKENS)
+    candidates = await select_sublabels(
+        full_event_context_str + "\n" + "\n".join(msg["answer"] for msg in conversation_history)
+    )
+    sublabels = compact_sublabel_table(candidates)
+    fixed_tokens = (
+        _ANALYSIS_TEMPLATE_TOKENS
+        + estimate_tokens(sublabels)
+        + estimate_tokens(scores_context)
+        + estimate_tokens(event_context_str)
+    )
+    transcript = fit_transcript(
+        conversation_history,
+        max(settings.DIAGNOSTIC_PROMPT_TOKEN_BUDGET - fixed_tokens, settings.DIAGNOSTIC_MIN_TRANSCRIPT_TOKENS),
+    )
+
+    report = BudgetReport(
+        baseline_tokens=(
+            _ANALYSIS_TEMPLATE_TOKENS
+            + _BASELINE_SUBLABEL_TOKENS
+            + estimate_tokens(scores_context)
+            + estimate_tokens(full_event_context_str)
+            + estimate_tokens("".join(
+                f"Q{i}: {msg['question']}\nA{i}: {msg['answer']}\n\n"
+                for i, msg in enumerate(conversation_history, 1)
+            ))
+        ),
+        prompt_tokens=fixed_tokens + estimate_tokens(transcript),
+        budget=settings.DIAGNOSTIC_PROMPT_TOKEN_BUDGET,
+    )
+    logger.info(
+        "analyze_conversation_and_score prompt: ~%d tokens (unbudgeted ~%d, saved ~%d, budget %d, turns %d, "
+        "sublabels %d/%d)",
+        report.prompt_tokens,
+        report.baseline_tokens,
+        report.saved_tokens,
+        report.budget,
+        len(conversation_history),
+        len(candidates),
+        len(ALL_SUBLABELS),
+    )
+
+    prompt = ChatPromptTemplate.from_template(ANALYSIS_PROMPT_TEMPLATE)
 
     chain = prompt | llm
     try:
-        response = await chain.ainvoke(
+        response = await gemini_chat.call(lambda: chain.ainvoke(
             {
                 "transcript": transcript,
-                "sublabels": json.dumps(all_sublabels, indent=2),
+                "sublabels": sublabels,
                 "scores_context": scores_context,
                 "event_context_str": event_context_str,
             }
-        )
+        ))
 
         content = response.content.strip()
         # Clean markdown if present
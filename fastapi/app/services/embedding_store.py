@@ -0,0 +1,296 @@
+"""
+Binary store of event embeddings, read through a memory map.
+
+Layout under storage/app/fastapi/embeddings/:
+
+    CURRENT            name of the live generation directory
+    <gen>/meta.json    {"dim": 768}
+    <gen>/vectors.f32  append-only float32 rows
+    <gen>/index.log    append-only (id, row) records; row -1 deletes the id
+
+Writes append the vector and fsync it before appending (and fsyncing) the
+index record that points at it, so after a crash every record refers to a
+complete vector; a torn trailing record is ignored. Replacing an id appends a
+new row. `compact()` copies the live rows into a new generation and switches
+CURRENT with an atomic rename.
+
+Readers map vectors.f32 read-only: `get` returns a view into the mapping (no
+parse, no copy) and only the pages actually touched are read from disk.
+Workers pick up each other's appends by reading the index log's new tail and
+reload entirely when CURRENT changes.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.settings import settings
+from app.storage import storage_dir
+
+logger = logging.getLogger(__name__)
+
+RECORD_DTYPE = np.dtype([("id", "<i8"), ("row", "<i8")])
+_COMPACT_RATIO = 0.25
+_COMPACT_MIN_ROWS = 1024
+
+
+class EmbeddingStore:
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self._path = path
+        self._lock = threading.RLock()
+        self.generation: Optional[str] = None
+        self.dim = 0
+        self.row_of: Dict[int, int] = {}
+        self._log_offset = 0
+        self._rows_written = 0
+        self._vectors: Optional[np.memmap] = None
+
+    @property
+    def path(self) -> Path:
+        if self._path is None:
+            self._path = storage_dir() / "embeddings"
+        self._path.mkdir(parents=True, exist_ok=True)
+        return self._path
+
+    def _gen_dir(self, generation: Optional[str] = None) -> Path:
+        return self.path / (generation or self.generation)
+
+    # -- loading ------------------------------------------------------------
+
+    def _current(self) -> Optional[str]:
+        try:
+            return (self.path / "CURRENT").read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _refresh(self) -> None:
+        """Catch up with appends and compactions made by other workers."""
+        for _ in range(3):
+            try:
+                self._catch_up()
+                return
+            except FileNotFoundError:
+                # Another worker compacted and removed the generation between our reads of
+                # CURRENT and its files; CURRENT already names the new one
+                self.generation = None
+        raise RuntimeError("Embedding store generation keeps changing under the reader")
+
+    def _catch_up(self) -> None:
+        generation = self._current()
+        if generation != self.generation:
+            self.generation = generation
+            self.row_of, self._log_offset, self._rows_written, self._vectors = {}, 0, 0, None
+            self.dim = json.loads((self._gen_dir() / "meta.json").read_text())["dim"] if generation else 0
+        if generation is None:
+            return
+
+        log = self._gen_dir() / "index.log"
+        size = log.stat().st_size
+        complete = size - size % RECORD_DTYPE.itemsize  # a torn trailing record is not ours to read
+        if complete > self._log_offset:
+            records = np.fromfile(log, dtype=RECORD_DTYPE, offset=self._log_offset,
+                                  count=(complete - self._log_offset) // RECORD_DTYPE.itemsize)
+            for item_id, row in zip(records["id"].tolist(), records["row"].tolist()):
+                if row < 0:
+                    self.row_of.pop(item_id, None)
+                else:
+                    self.row_of[item_id] = row
+                    self._rows_written = max(self._rows_written, row + 1)
+            self._log_offset = complete
+        self._matrix()  # map now, while the generation's files are known to exist
+
+    def _matrix(self) -> np.ndarray:
+        """The mapped vectors, remapped when other writes have outgrown the current mapping."""
+        if self._vectors is None or self._vectors.shape[0] < self._rows_written:
+            if self._rows_written == 0:
+                return np.empty((0, self.dim), dtype=np.float32)
+            self._vectors = np.memmap(
+                self._gen_dir() / "vectors.f32", dtype=np.float32, mode="r", shape=(self._rows_written, self.dim)
+            )
+        return self._vectors
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        with self._lock, open(self.path / "lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _create_generation(self, dim: int) -> str:
+        generation = str(int(self.generation or 0) + 1)
+        directory = self._gen_dir(generation)
+        shutil.rmtree(directory, ignore_errors=True)  # leftovers of an interrupted compaction
+        directory.mkdir()
+        (directory / "meta.json").write_text(json.dumps({"dim": dim}))
+        (directory / "vectors.f32").touch()
+        (directory / "index.log").touch()
+        return generation
+
+    def _switch(self, generation: str) -> None:
+        tmp = self.path / "CURRENT.tmp"
+        tmp.write_text(generation)
+        _fsync_path(tmp)
+        os.replace(tmp, self.path / "CURRENT")
+        _fsync_path(self.path)
+
+    # -- writes -------------------------------------------------------------
+
+    def put(self, item_id: int, vector: Sequence[float]) -> None:
+        self.put_many([(item_id, vector)])
+
+    def put_many(self, items: Sequence[Tuple[int, Sequence[float]]]) -> None:
+        if not items:
+            return
+        vectors = np.asarray([vector for _, vector in items], dtype=np.float32)
+        with self._writing():
+            if self.generation is None:
+                self._switch(self._create_generation(vectors.shape[1]))
+                self._refresh()
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim} dimensions, got {vectors.shape[1]}")
+
+            directory = self._gen_dir()
+            with open(directory / "vectors.f32", "ab") as f:
+                # Rows are numbered by file position, so orphaned rows from a crash are skipped over
+                start = f.tell() // (4 * self.dim)
+                if f.tell() % (4 * self.dim):
+                    f.truncate(start * 4 * self.dim)
+                    f.seek(0, os.SEEK_END)
+                f.write(vectors.tobytes())
+                self._sync(f)
+            records = np.empty(len(items), dtype=RECORD_DTYPE)
+            records["id"] = [item_id for item_id, _ in items]
+            records["row"] = np.arange(start, start + len(items))
+            self._append_records(records)
+            self._refresh()
+
+    def delete(self, item_id: int) -> bool:
+        with self._writing():
+            if item_id not in self.row_of:
+                return False
+            self._append_records(np.array([(item_id, -1)], dtype=RECORD_DTYPE))
+            self._refresh()
+            if self._rows_written >= _COMPACT_MIN_ROWS and len(self.row_of) < (1 - _COMPACT_RATIO) * self._rows_written:
+                self._compact()
+            return True
+
+    def _append_records(self, records: np.ndarray) -> None:
+        with open(self._gen_dir() / "index.log", "ab") as f:
+            size = f.tell()
+            if size % RECORD_DTYPE.itemsize:
+                f.truncate(size - size % RECORD_DTYPE.itemsize)  # drop a torn record from a crash
+                f.seek(0, os.SEEK_END)
+            f.write(records.tobytes())
+            self._sync(f)
+
+    @staticmethod
+    def _sync(f) -> None:
+        f.flush()
+        if settings.EMBEDDING_STORE_FSYNC:
+            os.fsync(f.fileno())
+
+    def compact(self) -> Dict:
+        with self._writing():
+            if self.generation is not None:
+                self._compact()
+            return self.stats()
+
+    def _compact(self) -> None:
+        """Copy live rows, in id order, into a new generation (under the write lock)."""
+        old = self.generation
+        ids = sorted(self.row_of)
+        generation = self._create_generation(self.dim)
+        directory = self._gen_dir(generation)
+        matrix = self._matrix()
+        with open(directory / "vectors.f32", "ab") as f:
+            for start in range(0, len(ids), 4096):
+                f.write(np.ascontiguousarray(matrix[[self.row_of[i] for i in ids[start : start + 4096]]]).tobytes())
+            self._sync(f)
+        records = np.empty(len(ids), dtype=RECORD_DTYPE)
+        records["id"], records["row"] = ids, np.arange(len(ids))
+        with open(directory / "index.log", "ab") as f:
+            f.write(records.tobytes())
+            self._sync(f)
+        self._switch(generation)
+        self._refresh()
+        # Other workers may still map the old files; unlinking keeps their mappings valid
+        shutil.rmtree(self._gen_dir(old), ignore_errors=True)
+        logger.info("Compacted embedding store to %d rows (generation %s)", len(ids), generation)
+
+    # -- reads --------------------------------------------------------------
+
+    def get(self, item_id: int) -> Optional[np.ndarray]:
+        """A read-only view of the stored vector, or None."""
+        with self._lock:
+            self._refresh()
+            row = self.row_of.get(item_id)
+            return None if row is None else self._matrix()[row]
+
+    def get_many(self, ids: Sequence[int]) -> Tuple[List[int], np.ndarray]:
+        """(found ids, their vectors as one array)."""
+        with self._lock:
+            self._refresh()
+            found = [item_id for item_id in ids if item_id in self.row_of]
+            return found, self._matrix()[[self.row_of[item_id] for item_id in found]]
+
+    def export(self, chunk_rows: int = 4096) -> Tuple[int, int, Iterator[Tuple[np.ndarray, np.ndarray]]]:
+        """
+        (count, dimensions, chunks) of one snapshot: the chunks are (ids, vectors)
+        of every live row at the time of the call, in row order, so `count`
+        matches what they yield whatever is written meanwhile.
+        """
+        with self._lock:
+            self._refresh()
+            rows_by_id = sorted(self.row_of.items(), key=lambda item: item[1])
+            matrix = self._matrix()
+            return len(rows_by_id), self.dim, self._export_chunks(rows_by_id, matrix, chunk_rows)
+
+    @staticmethod
+    def _export_chunks(
+        rows_by_id: List[Tuple[int, int]], matrix: np.ndarray, chunk_rows: int
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        for start in range(0, len(rows_by_id), chunk_rows):
+            chunk = rows_by_id[start : start + chunk_rows]
+            ids = np.array([item_id for item_id, _ in chunk], dtype=np.int64)
+            rows = np.array([row for _, row in chunk], dtype=np.int64)
+            if rows[-1] - rows[0] == len(rows) - 1:
+                yield ids, matrix[rows[0] : rows[-1] + 1]  # contiguous: a view, nothing copied
+            else:
+                yield ids, matrix[rows]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._refresh()
+            return {
+                "generation": self.generation,
+                "vectors": len(self.row_of),
+                "rows": self._rows_written,
+                "dimensions": self.dim,
+                "bytes": self._rows_written * self.dim * 4,
+            }
+
+
+def _fsync_path(path: Path) -> None:
+    if not settings.EMBEDDING_STORE_FSYNC:
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+embedding_store = EmbeddingStore()
@@ -0,0 +1,88 @@
+"""
+Run independent upstream (Gemini) calls concurrently.
+
+Every task holds one slot of a process-wide budget (LLM_MAX_CONCURRENCY) while
+it runs, so fanning out cannot multiply the load on the upstream beyond that
+limit. Each task has its own timeout, and failures are collected per task
+instead of cancelling the siblings: callers get whatever finished.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Dict, Mapping, Optional
+from weakref import WeakKeyDictionary
+
+from app.deadline import bounded_timeout
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# asyncio primitives belong to one event loop; keep one budget per loop
+_slots: "WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = WeakKeyDictionary()
+# Set while the current task (or a task it spawned) holds a slot, so nested
+# fan-outs run inside their parent's slot instead of deadlocking on the budget
+_holding_slot: ContextVar[bool] = ContextVar("holding_llm_slot", default=False)
+
+
+@asynccontextmanager
+async def llm_slot() -> AsyncIterator[None]:
+    """Hold one slot of the global upstream concurrency budget."""
+    if _holding_slot.get():
+        yield
+        return
+    loop = asyncio.get_running_loop()
+    semaphore = _slots.get(loop)
+    if semaphore is None:
+        semaphore = _slots[loop] = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+    async with semaphore:
+        token = _holding_slot.set(True)
+        try:
+            yield
+        finally:
+            _holding_slot.reset(token)
+
+
+@dataclass
+class FanOutResult:
+    results: Dict[str, Any] = field(default_factory=dict)
+    errors: Dict[str, BaseException] = field(default_factory=dict)
+
+    @property
+    def complete(self) -> bool:
+        return not self.errors
+
+
+async def _run(call: Awaitable[Any], timeout: Optional[float]) -> Any:
+    async with llm_slot():
+        return await asyncio.wait_for(call, timeout)
+
+
+async def fan_out(calls: Mapping[str, Awaitable[Any]], timeout: Optional[float] = None) -> FanOutResult:
+    """
+    Await all `calls` concurrently. A task that raises or exceeds `timeout`
+    seconds (default FANOUT_TASK_TIMEOUT_S, capped by the request deadline)
+    lands in `errors`; the others still complete.
+    """
+    timeout = bounded_timeout(settings.FANOUT_TASK_TIMEOUT_S if timeout is None else timeout)
+    names = list(calls)
+    outcomes = await asyncio.gather(
+        *(_run(calls[name], timeout) for name in names),
+        return_exceptions=True,
+    )
+
+    result = FanOutResult()
+    for name, outcome in zip(names, outcomes):
+        if isinstance(outcome, BaseException):
+            if isinstance(outcome, asyncio.TimeoutError):
+                logger.warning("fan_out task %r timed out after %.1fs", name, timeout)
+            else:
+                logger.warning("fan_out task %r failed: %r", name, outcome)
+            result.errors[name] = outcome
+        else:
+            result.results[name] = outcome
+    return result
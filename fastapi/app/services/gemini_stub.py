@@ -0,0 +1,99 @@
+"""
+Offline stand-ins for the Gemini chat and embedding models.
+
+Enabled by setting GEMINI_STUB=1. Used by the load-test harness (bench/loadtest.py)
+so capacity numbers reflect our own service rather than the upstream API.
+GEMINI_STUB_LATENCY_MS adds an artificial per-call delay to mimic upstream latency.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from app.label import Label
+
+EMBEDDING_DIMENSIONS = 768
+
+
+def stub_enabled() -> bool:
+    return os.getenv("GEMINI_STUB", "").lower() in ("1", "true", "yes")
+
+
+def _latency_seconds() -> float:
+    return float(os.getenv("GEMINI_STUB_LATENCY_MS", "0")) / 1000.0
+
+
+def _stub_reply(prompt_text: str) -> str:
+    """Pick a canned reply with the shape the calling prompt asks for."""
+    if "JSON array of strings" in prompt_text:
+        return json.dumps([
+            "What usually happens right before you notice this pattern?",
+            "How did the people involved react?",
+            "What would you like to do differently next time?",
+        ])
+    if "EXACT structure" in prompt_text:
+        return json.dumps({
+            "label_scores": {label.value: 62.0 for label in Label},
+            "sublabel_scores": {"anxiety_and_worry": 48.0, "procrastination": 41.0},
+            "summary": {
+                "overall_assessment": "Stub assessment.",
+                "key_insights": ["Stub insight."],
+                "primary_concerns": ["Stub concern."],
+                "strengths_identified": ["Stub strength."],
+                "recommended_focus": "Stub focus.",
+            },
+            "overall_score": 58.5,
+        })
+    if "event classification" in prompt_text:
+        return json.dumps({"sublabel": "anxiety_and_worry", "is_improvement": False, "magnitude": 0.6})
+    if "Mindset Analysis" in prompt_text:
+        return json.dumps({
+            "core_profile": "Stub profile.",
+            "primary_strength": "Stub strength.",
+            "growth_edge": "Stub growth edge.",
+            "first_step": "Stub first step.",
+        })
+    return "What is the main challenge or problem you're currently facing in your life?"
+
+
+async def _ainvoke(prompt_value) -> AIMessage:
+    delay = _latency_seconds()
+    if delay:
+        await asyncio.sleep(delay)
+    text = prompt_value.to_string() if hasattr(prompt_value, "to_string") else str(prompt_value)
+    return AIMessage(content=_stub_reply(text))
+
+
+def get_stub_llm() -> RunnableLambda:
+    """Chat model replacement; composes with prompts like the real model (`prompt | llm`)."""
+    return RunnableLambda(_ainvoke)
+
+
+def _vector_for(text: str) -> list[float]:
+    """Deterministic unit vector derived from the text, so equal texts embed equally."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    vector = [rng.gauss(0.0, 1.0) for _ in range(EMBEDDING_DIMENSIONS)]
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector]
+
+
+class StubEmbeddings:
+    """Mirrors the async surface of GoogleGenerativeAIEmbeddings that we use."""
+
+    async def aembed_query(self, text: str) -> list[float]:
+        delay = _latency_seconds()
+        if delay:
+            await asyncio.sleep(delay)
+        return _vector_for(text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        delay = _latency_seconds()
+        if delay:
+            await asyncio.sleep(delay)
+        return [_vector_for(text) for text in texts]
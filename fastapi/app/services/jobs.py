@@ -0,0 +1,359 @@
+"""
+In-process background jobs for long analyses.
+
+`POST /diagnostic/answer/async` enqueues a job and returns its id at once, so
+the caller (a PHP-FPM worker) is not held for the whole LLM call. A fixed pool
+of JOB_WORKERS asyncio tasks drains a priority queue (interactive before
+batch); results are fetched with `GET /jobs/{id}` or POSTed to the job's
+callback_url. Callbacks are signed with JOB_CALLBACK_SECRET and only go to the
+origins in JOB_CALLBACK_ALLOWED_ORIGINS (by default Laravel's APP_URL).
+
+With JOB_QUEUE_PERSIST the queue is mirrored to a SQLite file in the storage
+directory: unfinished jobs left by a stopped process are re-queued on the next
+start, and any worker process can answer polls for any job.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.deadline import deadline_scope
+from app.settings import settings
+from app.storage import storage_dir
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+# Batch jobs are refused once the queue is this full, keeping room for interactive ones
+_BATCH_DEPTH_SHARE = 0.75
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    kind: str
+    payload: Dict[str, Any]
+    priority: str = "interactive"
+    callback_url: Optional[str] = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"  # queued -> running -> succeeded | failed
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def public(self) -> Dict[str, Any]:
+        """What pollers and callbacks see (no request payload)."""
+        data = asdict(self)
+        del data["payload"]
+        return data
+
+
+class SqliteJobStore:
+    """Job rows in a SQLite file shared by all worker processes on the host."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with closing(self._connect()) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    priority TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    callback_url TEXT,
+                    result TEXT,
+                    error TEXT,
+                    owner_pid INTEGER,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=settings.DB_BUSY_TIMEOUT / 1000, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def save(self, job: Job) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO jobs
+                    (id, kind, priority, status, payload, callback_url, result, error, owner_pid,
+                     created_at, started_at, finished_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    job.id, job.kind, job.priority, job.status, json.dumps(job.payload), job.callback_url,
+                    json.dumps(job.result) if job.result is not None else None, job.error, os.getpid(),
+                    job.created_at, job.started_at, job.finished_at,
+                ),
+            )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with closing(self._connect()) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._from_row(row) if row else None
+
+    def claim_orphans(self) -> List[Job]:
+        """Take over unfinished jobs whose owning process is gone and mark them queued again."""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+            orphans = [row for row in rows if not _pid_alive(row["owner_pid"])]
+            conn.executemany(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, owner_pid = ? WHERE id = ?",
+                [(os.getpid(), row["id"]) for row in orphans],
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        jobs = [self._from_row(row) for row in orphans]
+        for job in jobs:
+            job.status, job.started_at = "queued", None
+        return jobs
+
+    def prune(self, finished_before: float) -> None:
+        """Delete jobs that finished before `finished_before`, payload and result included."""
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (finished_before,))
+
+    @staticmethod
+    def _from_row(row: sqlite3.Row) -> Job:
+        return Job(
+            kind=row["kind"],
+            payload=json.loads(row["payload"]),
+            priority=row["priority"],
+            callback_url=row["callback_url"],
+            id=row["id"],
+            status=row["status"],
+            result=json.loads(row["result"]) if row["result"] else None,
+            error=row["error"],
+            created_at=row["created_at"],
+            started_at=row["started_at"],
+            finished_at=row["finished_at"],
+        )
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return False  # a previous incarnation of this process id; nothing of ours is running yet
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+class JobQueue:
+    def __init__(self, workers: int, max_depth: int, store: Optional[SqliteJobStore] = None) -> None:
+        self.workers = workers
+        self.max_depth = max_depth
+        self.store = store
+        self.handlers: Dict[str, Handler] = {}
+        self.jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._seq = itertools.count()
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self.handlers[kind] = handler
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self) -> None:
+        self._queue = asyncio.PriorityQueue()
+        if self.store is not None:
+            for job in await asyncio.to_thread(self.store.claim_orphans):
+                logger.info("Re-queued job %s left unfinished by a stopped worker", job.id)
+                self._enqueue(job)
+        self._tasks = [asyncio.create_task(self._worker(), name=f"job-worker-{i}") for i in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Stop the workers. Unfinished persisted jobs are picked up by the next process."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        priority: str = "interactive",
+        callback_url: Optional[str] = None,
+    ) -> Job:
+        if self._queue is None:
+            raise RuntimeError("Job queue is not running")
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        if callback_url is not None:
+            check_callback_url(callback_url)
+        limit = self.max_depth if priority == "interactive" else int(self.max_depth * _BATCH_DEPTH_SHARE)
+        if self.depth >= limit:
+            raise QueueFull(f"{self.depth} jobs queued")
+
+        await self._prune()
+        job = Job(kind=kind, payload=payload, priority=priority, callback_url=callback_url)
+        await self._persist(job)
+        self._enqueue(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        if job is None and self.store is not None:
+            # Submitted to another worker process, or before a restart
+            job = await asyncio.to_thread(self.store.get, job_id)
+        if job is not None and job.finished and job.finished_at < time.time() - settings.JOB_RESULT_TTL_S:
+            return None  # expired; the next prune deletes it
+        return job
+
+    def _enqueue(self, job: Job) -> None:
+        self.jobs[job.id] = job
+        self._queue.put_nowait((PRIORITIES[job.priority], next(self._seq), job.id))
+
+    async def _persist(self, job: Job) -> None:
+        if self.store is not None:
+            await asyncio.to_thread(self.store.save, job)
+
+    async def _prune(self) -> None:
+        """Drop jobs finished more than JOB_RESULT_TTL_S ago, from memory and from the store."""
+        cutoff = time.time() - settings.JOB_RESULT_TTL_S
+        for job_id in [job.id for job in self.jobs.values() if job.finished and job.finished_at < cutoff]:
+            del self.jobs[job_id]
+        if self.store is not None:
+            await asyncio.to_thread(self.store.prune, cutoff)
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            if job is None:
+                continue
+            try:
+                await self._run(job)
+            except Exception:
+                logger.exception("Job %s bookkeeping failed", job.id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        job.status, job.started_at = "running", time.time()
+        await self._persist(job)
+        try:
+            with deadline_scope(settings.JOB_TIMEOUT_S):
+                result = await asyncio.wait_for(self.handlers[job.kind](job.payload), settings.JOB_TIMEOUT_S)
+            if "error" in result:
+                job.status, job.error = "failed", str(result["error"])
+            else:
+                job.status, job.result = "succeeded", result
+        except asyncio.TimeoutError:
+            job.status, job.error = "failed", f"Timed out after {settings.JOB_TIMEOUT_S:.0f}s"
+        except Exception as e:
+            job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+        job.finished_at = time.time()
+        await self._persist(job)
+        if job.callback_url:
+            await _deliver_callback(job)
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url.strip())
+    port = parts.port or {"http": 80, "https": 443}.get(parts.scheme)
+    return f"{parts.scheme}://{(parts.hostname or '').lower()}:{port}"
+
+
+def allowed_callback_origins() -> set[str]:
+    configured = settings.JOB_CALLBACK_ALLOWED_ORIGINS or settings.APP_URL
+    return {_origin(item) for item in configured.split(",") if item.strip()}
+
+
+def check_callback_url(url: str) -> None:
+    """Raise ValueError unless callbacks are signed and `url` is on an allowed origin."""
+    if not settings.JOB_CALLBACK_SECRET:
+        raise ValueError("callback_url is disabled: JOB_CALLBACK_SECRET is not set")
+    try:
+        origin = _origin(url)
+    except ValueError:
+        raise ValueError("callback_url is not a valid URL")
+    if urlsplit(url).scheme not in ("http", "https") or origin not in allowed_callback_origins():
+        raise ValueError("callback_url is not on an allowed origin (JOB_CALLBACK_ALLOWED_ORIGINS)")
+
+
+async def _deliver_callback(job: Job) -> None:
+    try:
+        # Settings may have changed since a persisted job was submitted
+        check_callback_url(job.callback_url)
+    except ValueError as e:
+        logger.warning("Not delivering callback for job %s: %s", job.id, e)
+        return
+    body = json.dumps(job.public()).encode()
+    digest = hmac.new(settings.JOB_CALLBACK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    headers = {"Content-Type": "application/json", "X-Signature": f"sha256={digest}"}
+
+    async with httpx.AsyncClient(timeout=settings.JOB_CALLBACK_TIMEOUT_S) as client:
+        for attempt in range(3):
+            try:
+                response = await client.post(job.callback_url, content=body, headers=headers)
+                if response.status_code < 500:
+                    return
+            except httpx.HTTPError as e:
+                logger.warning("Callback for job %s failed: %r", job.id, e)
+            await asyncio.sleep(0.5 * 2**attempt)
+    logger.error("Giving up on callback for job %s to %s", job.id, job.callback_url)
+
+
+def _build_queue() -> JobQueue:
+    store = SqliteJobStore(str(storage_dir() / "jobs.sqlite")) if settings.JOB_QUEUE_PERSIST else None
+    return JobQueue(settings.JOB_WORKERS, settings.JOB_QUEUE_MAX_DEPTH, store)
+
+
+job_queue = _build_queue()
@@ -0,0 +1,223 @@
+"""
+Near-duplicate detection for texts sent to the embedding model.
+
+Texts are reduced to word-shingle MinHash signatures (EMBEDDING_DEDUPE_PERMUTATIONS
+hash functions). An LSH index over signature bands (kept in a SQLite file in
+the storage directory, shared by all workers) finds earlier texts whose
+estimated Jaccard similarity is within EMBEDDING_DEDUPE_MAX_DISTANCE, without
+any upstream call. Their stored vectors can then be reused.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.settings import settings
+from app.storage import storage_dir
+
+_WORD = re.compile(r"\w+")
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def shingles(text: str, size: int = 3) -> List[str]:
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i : i + size]) for i in range(len(words) - size + 1)]
+
+
+class MinHasher:
+    def __init__(self, permutations: int, seed: int = 1) -> None:
+        rng = np.random.default_rng(seed)
+        # a, b < 2^32 and 32-bit shingle hashes keep a*h + b inside uint64
+        self.a = rng.integers(1, 1 << 32, size=permutations, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=permutations, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), "little") for s in set(shingles(text))],
+            dtype=np.uint64,
+        )
+        if hashes.size == 0:
+            return np.full(self.a.size, _MAX_HASH, dtype=np.uint32)
+        permuted = (np.outer(hashes, self.a) + self.b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+def similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """Estimated Jaccard similarity: the share of agreeing MinHash values."""
+    return float(np.count_nonzero(sig_a == sig_b)) / sig_a.size
+
+
+def band_keys(signature: np.ndarray, bands: int) -> List[bytes]:
+    rows = signature.size // bands
+    return [
+        hashlib.blake2b(signature[i * rows : (i + 1) * rows].tobytes(), digest_size=8).digest() for i in range(bands)
+    ]
+
+
+@dataclass
+class NearDuplicate:
+    text_key: str
+    doc_id: Optional[str]
+    similarity: float
+    vector: List[float]
+
+
+class NearDuplicateIndex:
+    """Signatures and float32 vectors of embedded texts, with LSH band buckets for lookup."""
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self._path = path
+        self.hasher = MinHasher(settings.EMBEDDING_DEDUPE_PERMUTATIONS)
+        self.bands = settings.EMBEDDING_DEDUPE_BANDS
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            path = self._path or storage_dir() / "near_duplicates.sqlite"
+            conn = sqlite3.connect(path, timeout=settings.DB_BUSY_TIMEOUT / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS texts (
+                    text_key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    doc_id TEXT,
+                    signature BLOB NOT NULL,
+                    vector BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS texts_doc_id ON texts (doc_id)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS lsh_buckets (
+                    band INTEGER NOT NULL,
+                    bucket BLOB NOT NULL,
+                    text_key TEXT NOT NULL,
+                    PRIMARY KEY (band, bucket, text_key)
+                ) WITHOUT ROWID
+                """
+            )
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def signature(self, text: str) -> np.ndarray:
+        return self.hasher.signature(text)
+
+    def find(self, model: str, signature: np.ndarray, max_distance: float) -> Optional[NearDuplicate]:
+        """The most similar text embedded by `model` within max_distance (Jaccard), if any."""
+        conn = self._conn()
+        keys = band_keys(signature, self.bands)
+        candidates = conn.execute(
+            "SELECT DISTINCT text_key FROM lsh_buckets WHERE "
+            + " OR ".join("(band = ? AND bucket = ?)" for _ in keys),
+            [value for band, key in enumerate(keys) for value in (band, key)],
+        ).fetchall()
+        if not candidates:
+            return None
+
+        best: Optional[Tuple[float, tuple]] = None
+        rows = conn.execute(
+            "SELECT text_key, doc_id, signature, vector FROM texts"
+            f" WHERE model = ? AND text_key IN ({','.join('?' * len(candidates))})",
+            [model, *(row[0] for row in candidates)],
+        ).fetchall()
+        for row in rows:
+            score = similarity(signature, np.frombuffer(row[2], dtype=np.uint32))
+            if best is None or score > best[0]:
+                best = (score, row)
+        if best is None or 1 - best[0] > max_distance:
+            return None
+        score, (text_key, doc_id, _, vector) = best
+        return NearDuplicate(text_key, doc_id, score, np.frombuffer(vector, dtype=np.float32).tolist())
+
+    def add(
+        self,
+        model: str,
+        text_key: str,
+        signature: np.ndarray,
+        vector: Sequence[float],
+        doc_id: Optional[str] = None,
+    ) -> None:
+        """Index an embedded text. With doc_id, earlier versions of that document are replaced."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            stale = [text_key]
+            if doc_id is not None:
+                stale += [
+                    row[0]
+                    for row in conn.execute("SELECT text_key FROM texts WHERE model = ? AND doc_id = ?", (model, doc_id))
+                ]
+            conn.executemany("DELETE FROM lsh_buckets WHERE text_key = ?", [(key,) for key in stale])
+            conn.executemany("DELETE FROM texts WHERE text_key = ?", [(key,) for key in stale])
+            conn.execute(
+                "INSERT INTO texts (text_key, model, doc_id, signature, vector, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    text_key, model, doc_id, signature.tobytes(),
+                    np.asarray(vector, dtype=np.float32).tobytes(), time.time(),
+                ),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO lsh_buckets (band, bucket, text_key) VALUES (?, ?, ?)",
+                [(band, key, text_key) for band, key in enumerate(band_keys(signature, self.bands))],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+
+def cluster(texts: Dict[str, str], max_distance: float) -> Dict[str, str]:
+    """
+    Group near-duplicates among `texts` (id -> text) with an in-memory LSH.
+    Returns id -> representative id (the first id of its group, in input order).
+    """
+    hasher = MinHasher(settings.EMBEDDING_DEDUPE_PERMUTATIONS)
+    bands = settings.EMBEDDING_DEDUPE_BANDS
+    ids = list(texts)
+    signatures = {item_id: hasher.signature(texts[item_id]) for item_id in ids}
+    parent = {item_id: item_id for item_id in ids}
+
+    def root(item_id: str) -> str:
+        while parent[item_id] != item_id:
+            parent[item_id] = parent[parent[item_id]]
+            item_id = parent[item_id]
+        return item_id
+
+    buckets: Dict[Tuple[int, bytes], List[str]] = {}
+    for item_id in ids:
+        for band, key in enumerate(band_keys(signatures[item_id], bands)):
+            buckets.setdefault((band, key), []).append(item_id)
+
+    order = {item_id: i for i, item_id in enumerate(ids)}
+    for members in buckets.values():
+        for i, first in enumerate(members):
+            for second in members[i + 1 :]:
+                a, b = root(first), root(second)
+                if a == b or 1 - similarity(signatures[first], signatures[second]) > max_distance:
+                    continue
+                if order[a] > order[b]:
+                    a, b = b, a
+                parent[b] = a
+    return {item_id: root(item_id) for item_id in ids}
+
+
+near_duplicate_index = NearDuplicateIndex()
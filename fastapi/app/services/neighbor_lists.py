@@ -0,0 +1,181 @@
+"""
+Materialised "similar reflections": the top NEIGHBOR_LIST_K most similar
+events of the same user, kept per event in a SQLite file in the storage
+directory.
+
+Writes do the work so reads are a single indexed lookup:
+- a new or changed vector is scored once against the user's matrix (read from
+  the embedding store, app/services/embedding_store.py); that gives its own
+  list, and it is inserted into every other list whose current k-th score it
+  beats
+- removing an event (or the old version of a changed one) only recomputes the
+  lists that contained it
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.embedding_store import EmbeddingStore, embedding_store
+from app.settings import settings
+from app.storage import storage_dir
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=-1, keepdims=True), 1e-12)
+
+
+class NeighborLists:
+    def __init__(self, store: EmbeddingStore, path: Optional[Path] = None, k: Optional[int] = None) -> None:
+        self.store = store
+        self.k = k or settings.NEIGHBOR_LIST_K
+        self._path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            path = self._path or storage_dir() / "neighbors.sqlite"
+            conn = sqlite3.connect(path, timeout=settings.DB_BUSY_TIMEOUT / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS members (event_id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS members_user ON members (user_id)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS neighbors (
+                    event_id INTEGER NOT NULL,
+                    neighbor_id INTEGER NOT NULL,
+                    score REAL NOT NULL,
+                    PRIMARY KEY (event_id, neighbor_id)
+                ) WITHOUT ROWID
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS neighbors_reverse ON neighbors (neighbor_id)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _user_matrix(self, conn: sqlite3.Connection, user_id: int, exclude: int) -> Tuple[List[int], np.ndarray]:
+        ids = [
+            event_id
+            for (event_id,) in conn.execute(
+                "SELECT event_id FROM members WHERE user_id = ? AND event_id != ?", (user_id, exclude)
+            )
+        ]
+        found, vectors = self.store.get_many(ids)
+        return found, _normalize(vectors) if len(found) else np.empty((0, self.store.dim), dtype=np.float32)
+
+    def _top_k(self, scores: np.ndarray, ids: Sequence[int]) -> List[Tuple[int, float]]:
+        if len(ids) > self.k:
+            top = np.argpartition(-scores, self.k - 1)[: self.k]
+        else:
+            top = np.arange(len(ids))
+        return [(ids[i], float(scores[i])) for i in top]
+
+    def _repair(self, conn: sqlite3.Connection, event_ids: Sequence[int], user_id: int, exclude: int = -1) -> None:
+        """Recompute the lists of `event_ids` from scratch (without `exclude`): one matrix product for all."""
+        if not event_ids:
+            return
+        ids, matrix = self._user_matrix(conn, user_id, exclude)
+        position = {event_id: i for i, event_id in enumerate(ids)}
+        targets = [event_id for event_id in event_ids if event_id in position]
+        conn.executemany("DELETE FROM neighbors WHERE event_id = ?", [(event_id,) for event_id in event_ids])
+        if not targets:
+            return
+        scores = matrix[[position[event_id] for event_id in targets]] @ matrix.T
+        rows = []
+        for row, event_id in enumerate(targets):
+            candidates = [i for i in range(len(ids)) if i != position[event_id]]
+            rows += [(event_id, ids[i], score) for i, score in self._top_k(scores[row, candidates], candidates)]
+        conn.executemany("INSERT INTO neighbors (event_id, neighbor_id, score) VALUES (?, ?, ?)", rows)
+
+    def _detach(self, conn: sqlite3.Connection, event_id: int) -> Tuple[Optional[int], List[int]]:
+        """Drop an event's list and its appearances elsewhere; returns (its user, lists needing repair)."""
+        member = conn.execute("SELECT user_id FROM members WHERE event_id = ?", (event_id,)).fetchone()
+        affected = [
+            row[0] for row in conn.execute("SELECT event_id FROM neighbors WHERE neighbor_id = ?", (event_id,))
+        ]
+        conn.execute("DELETE FROM neighbors WHERE event_id = ? OR neighbor_id = ?", (event_id, event_id))
+        return (member[0] if member else None), affected
+
+    def upsert(self, event_id: int, user_id: int, vector: Sequence[float]) -> None:
+        query = _normalize(vector)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            previous_user, affected = self._detach(conn, event_id)
+            if previous_user is not None:
+                # The store already holds the new vector; the insert below re-enters it where it belongs
+                self._repair(conn, affected, previous_user, exclude=event_id)
+            conn.execute(
+                "INSERT OR REPLACE INTO members (event_id, user_id) VALUES (?, ?)", (event_id, user_id)
+            )
+
+            ids, matrix = self._user_matrix(conn, user_id, exclude=event_id)
+            if ids:
+                scores = matrix @ query
+                own = self._top_k(scores, ids)
+                rows = [(event_id, neighbor_id, score) for neighbor_id, score in own]
+
+                # Enter every list whose k-th best it beats, then trim those lists back to k
+                kth = dict.fromkeys(ids, -np.inf)
+                for list_id, size, lowest in conn.execute(
+                    f"SELECT event_id, COUNT(*), MIN(score) FROM neighbors"
+                    f" WHERE event_id IN ({','.join('?' * len(ids))}) GROUP BY event_id",
+                    ids,
+                ):
+                    if size >= self.k:
+                        kth[list_id] = lowest
+                thresholds = np.array([kth[i] for i in ids])
+                entered = np.flatnonzero(scores > thresholds)
+                rows += [(ids[i], event_id, float(scores[i])) for i in entered]
+                conn.executemany("INSERT INTO neighbors (event_id, neighbor_id, score) VALUES (?, ?, ?)", rows)
+                full = [ids[i] for i in entered if np.isfinite(thresholds[i])]
+                conn.executemany(
+                    """
+                    DELETE FROM neighbors WHERE event_id = ?1 AND neighbor_id = (
+                        SELECT neighbor_id FROM neighbors WHERE event_id = ?1 ORDER BY score LIMIT 1
+                    )
+                    """,
+                    [(list_id,) for list_id in full],
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, event_id: int) -> bool:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            user_id, affected = self._detach(conn, event_id)
+            conn.execute("DELETE FROM members WHERE event_id = ?", (event_id,))
+            if user_id is not None:
+                self._repair(conn, affected, user_id)
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return user_id is not None
+
+    def get(self, event_id: int, k: Optional[int] = None) -> Optional[List[Tuple[int, float]]]:
+        """The materialised list, best first; None if the event is not tracked."""
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM members WHERE event_id = ?", (event_id,)).fetchone() is None:
+            return None
+        return conn.execute(
+            "SELECT neighbor_id, score FROM neighbors WHERE event_id = ? ORDER BY score DESC LIMIT ?",
+            (event_id, min(k or self.k, self.k)),
+        ).fetchall()
+
+
+neighbor_lists = NeighborLists(embedding_store)
@@ -0,0 +1,274 @@
+"""
+Cohort percentiles of label and sub-label scores from streaming quantile
+sketches, so "where do I stand" never scans other users' scores.
+
+One t-digest (merging variant, k1 scale function) per Label value and per
+sub-label value. The scoring routes (app/routers/scoring.py) feed the scores of
+every user state change into this worker's in-memory delta sketches; the
+scoring functions themselves stay pure. A background task (`start`) merges the
+deltas into the shared sketches in a SQLite file in the storage directory every
+PERCENTILE_FLUSH_SECONDS, in a thread (one transaction, so workers never lose
+each other's updates), and the worker reloads the merged state.
+
+A digest is a few hundred centroids whatever the number of users, so a
+percentile lookup costs the same for ten users as for ten million. The sketches
+summarise score observations: a user who logs often contributes more samples.
+`python -m app.commands.percentiles rebuild` resets them to exactly one
+(current) score per user and key.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from app.settings import settings
+from app.storage import storage_dir
+
+logger = logging.getLogger(__name__)
+
+class TDigest:
+    __slots__ = ("compression", "means", "weights", "min", "max", "_buffer")
+
+    def __init__(self, compression: Optional[float] = None) -> None:
+        self.compression = compression or settings.PERCENTILE_COMPRESSION
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer: List[Tuple[float, float]] = []
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum()) + sum(w for _, w in self._buffer)
+
+    def add(self, value: float, weight: float = 1.0) -> None:
+        self._buffer.append((value, weight))
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._buffer) >= 5 * self.compression:
+            self.compress()
+
+    def merge(self, other: "TDigest") -> None:
+        other.compress()
+        self._buffer.extend(zip(other.means.tolist(), other.weights.tolist()))
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.compress()
+
+    def _k(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _q_limit(self, q: float) -> float:
+        """Largest quantile the current centroid may reach: one unit of k beyond where it starts."""
+        k = self._k(q) + 1
+        return 1.0 if k >= self.compression / 4 else (math.sin(2 * math.pi * k / self.compression) + 1) / 2
+
+    def compress(self) -> None:
+        if not self._buffer:
+            return
+        values = np.array(self._buffer)
+        self._buffer = []
+        means = np.concatenate([self.means, values[:, 0]])
+        weights = np.concatenate([self.weights, values[:, 1]])
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order].tolist(), weights[order].tolist()
+        total = sum(weights)
+
+        merged_means, merged_weights = [means[0]], [weights[0]]
+        before = 0.0
+        limit = self._q_limit(0.0)
+        for mean, weight in zip(means[1:], weights[1:]):
+            current = merged_weights[-1]
+            if (before + current + weight) / total <= limit:
+                merged_weights[-1] = current + weight
+                merged_means[-1] += (mean - merged_means[-1]) * weight / (current + weight)
+            else:
+                before += current
+                limit = self._q_limit(before / total)
+                merged_means.append(mean)
+                merged_weights.append(weight)
+        self.means, self.weights = np.array(merged_means), np.array(merged_weights)
+
+    def cdf(self, value: float) -> float:
+        """Share of the observations below `value`, counting ties as half."""
+        self.compress()
+        if not len(self.means):
+            return math.nan
+        if value < self.min:
+            return 0.0
+        if value > self.max:
+            return 1.0
+        means, index = np.unique(self.means, return_inverse=True)
+        weights = np.bincount(index, weights=self.weights)
+        total = weights.sum()
+        centers = np.cumsum(weights) - weights / 2  # observations at or below each centroid's mean
+        xs, ys = means, centers
+        if self.min < means[0]:
+            xs, ys = np.concatenate([[self.min], xs]), np.concatenate([[0.0], ys])
+        if self.max > means[-1]:
+            xs, ys = np.concatenate([xs, [self.max]]), np.concatenate([ys, [total]])
+        return float(np.interp(value, xs, ys) / total)
+
+    def quantile(self, q: float) -> float:
+        self.compress()
+        if not len(self.means):
+            return math.nan
+        centers = np.cumsum(self.weights) - self.weights / 2
+        xs = np.concatenate([[0.0], centers, [self.weights.sum()]])
+        ys = np.concatenate([[self.min], self.means, [self.max]])
+        return float(np.interp(q * self.weights.sum(), xs, ys))
+
+    def to_bytes(self) -> bytes:
+        self.compress()
+        return np.concatenate([[self.min, self.max], self.means, self.weights]).astype("<f8").tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, compression: Optional[float] = None) -> "TDigest":
+        digest = cls(compression)
+        values = np.frombuffer(data, dtype="<f8")
+        digest.min, digest.max = float(values[0]), float(values[1])
+        digest.means, digest.weights = np.split(values[2:].copy(), 2)
+        return digest
+
+
+class CohortSketches:
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self._path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending: Dict[str, TDigest] = {}
+        self._merged: Dict[str, TDigest] = {}
+        self._last_flush = time.monotonic()
+        self._last_load = -math.inf
+        self._flusher: Optional[asyncio.Task] = None
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            path = self._path or storage_dir() / "percentiles.sqlite"
+            conn = sqlite3.connect(path, timeout=settings.DB_BUSY_TIMEOUT / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sketches (
+                    key TEXT PRIMARY KEY,
+                    digest BLOB NOT NULL,
+                    count REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def observe(self, scores: Mapping[str, float]) -> None:
+        """Record newly produced scores, keyed by Label or sub-label value. Memory only; `flush` writes."""
+        if not settings.PERCENTILE_SKETCHES:
+            return
+        with self._lock:
+            for key, score in scores.items():
+                digest = self._pending.get(key)
+                if digest is None:
+                    digest = self._pending[key] = TDigest()
+                digest.add(float(score))
+
+    async def start(self) -> None:
+        """Flush every PERCENTILE_FLUSH_SECONDS in a thread until `stop`."""
+        self._flusher = asyncio.create_task(self._flush_periodically(), name="percentile-flush")
+
+    async def stop(self) -> None:
+        """Stop the flusher and write what is still pending."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await asyncio.to_thread(self.flush)
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(settings.PERCENTILE_FLUSH_SECONDS)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.warning("Flushing percentile sketches failed: %r", e)
+
+    def flush(self) -> None:
+        """Merge this worker's pending observations into the shared sketches."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if pending:
+            self._write(pending, replace=False)
+
+    def replace_all(self, digests: Mapping[str, TDigest]) -> None:
+        """Swap every shared sketch for `digests` (used by the rebuild command)."""
+        self._write(digests, replace=True)
+
+    def _write(self, digests: Mapping[str, TDigest], replace: bool) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if replace:
+                conn.execute("DELETE FROM sketches")
+            for key, digest in digests.items():
+                row = None if replace else conn.execute("SELECT digest FROM sketches WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    stored = TDigest.from_bytes(row[0])
+                    stored.merge(digest)
+                    digest = stored
+                conn.execute(
+                    "INSERT OR REPLACE INTO sketches (key, digest, count, updated_at) VALUES (?, ?, ?, ?)",
+                    (key, digest.to_bytes(), digest.count, time.time()),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        self._last_load = -math.inf
+
+    def _sketches(self) -> Dict[str, TDigest]:
+        """The shared sketches, re-read at most every PERCENTILE_FLUSH_SECONDS."""
+        if time.monotonic() - self._last_flush >= settings.PERCENTILE_FLUSH_SECONDS:
+            self.flush()
+        if time.monotonic() - self._last_load >= settings.PERCENTILE_FLUSH_SECONDS:
+            rows = self._conn().execute("SELECT key, digest FROM sketches").fetchall()
+            self._merged = {key: TDigest.from_bytes(blob) for key, blob in rows}
+            self._last_load = time.monotonic()
+        return self._merged
+
+    def percentiles(self, scores: Mapping[str, float]) -> Dict[str, Optional[Dict[str, float]]]:
+        """{key: {"percentile": 0-100, "cohort": observations}} per score; None for unknown keys."""
+        sketches = self._sketches()
+        result: Dict[str, Optional[Dict[str, float]]] = {}
+        for key, score in scores.items():
+            digest = sketches.get(key)
+            if digest is None:
+                result[key] = None
+            else:
+                result[key] = {"percentile": round(100 * digest.cdf(float(score)), 1), "cohort": int(digest.count)}
+        return result
+
+    def summary(self, quantiles: Iterable[float] = (0.1, 0.25, 0.5, 0.75, 0.9)) -> Dict[str, Dict]:
+        quantiles = list(quantiles)
+        return {
+            key: {
+                "count": int(digest.count),
+                "quantiles": {f"p{round(q * 100)}": round(digest.quantile(q), 2) for q in quantiles},
+            }
+            for key, digest in sorted(self._sketches().items())
+        }
+
+
+cohort_sketches = CohortSketches()
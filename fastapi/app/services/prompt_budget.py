@@ -0,0 +1,104 @@
+"""
+Prompt-size budgeting for the diagnostic analyzer.
+
+Token counts are a local estimate (no network, no tokenizer download): text is
+split into words and punctuation, and each word costs ~1 token per 4 characters,
+which tracks Gemini/SentencePiece counts closely enough for budgeting.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+
+from app.label import Label, SubLabelBase
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    return sum(max(1, math.ceil(len(m.group()) / 4)) for m in _TOKEN_PATTERN.finditer(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = " …") -> str:
+    """Cut `text` at the last word boundary that keeps it within max_tokens."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    limit = max_tokens - estimate_tokens(marker)
+    if limit <= 0:
+        return ""
+    used = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        used += max(1, math.ceil(len(match.group()) / 4))
+        if used > limit:
+            return text[: match.start()].rstrip() + marker
+    return text
+
+
+def compact_sublabel_table(sublabels: Iterable[SubLabelBase]) -> str:
+    """
+    One line per parent label: `label: sublabel(severity), ...`.
+    Replaces the indented JSON dump, which spends most of its tokens on
+    repeated keys, quotes and whitespace.
+    """
+    grouped: Dict[Label, List[str]] = {}
+    for member in sublabels:
+        grouped.setdefault(member.label, []).append(f"{member.value}({member.severity})")
+    return "\n".join(f"{label.value}: {', '.join(names)}" for label, names in grouped.items())
+
+
+def _first_sentence(text: str, max_tokens: int = 40) -> str:
+    return truncate_to_tokens(_SENTENCE_END.split(text.strip(), maxsplit=1)[0], max_tokens)
+
+
+def _render_turn(index: int, turn: Dict[str, str]) -> str:
+    return f"Q{index}: {turn['question']}\nA{index}: {turn['answer']}\n\n"
+
+
+def fit_transcript(conversation_history: List[Dict[str, str]], max_tokens: int) -> str:
+    """
+    Render the conversation within max_tokens. The first turn (the user's own
+    framing) and the most recent turns are kept verbatim; turns in between are
+    reduced to the first sentence of each answer. Whatever still does not fit
+    is truncated.
+    """
+    turns = [_render_turn(i, turn) for i, turn in enumerate(conversation_history, 1)]
+    full = "".join(turns)
+    if estimate_tokens(full) <= max_tokens or len(turns) <= 2:
+        return truncate_to_tokens(full, max_tokens)
+
+    head = turns[0]
+    remaining = max_tokens - estimate_tokens(head)
+    tail: List[str] = []
+    for turn in reversed(turns[1:]):
+        cost = estimate_tokens(turn)
+        # Leave room for at least a short summary line of what was dropped
+        if cost > remaining - 40:
+            break
+        tail.insert(0, turn)
+        remaining -= cost
+
+    dropped = conversation_history[1 : len(turns) - len(tail)]
+    summary = ""
+    if dropped:
+        first_dropped = 2
+        notes = "; ".join(
+            f"A{first_dropped + i}: {_first_sentence(turn['answer'])}" for i, turn in enumerate(dropped)
+        )
+        summary = truncate_to_tokens(f"[Earlier answers, summarized] {notes}", max(remaining, 0)) + "\n\n"
+
+    return truncate_to_tokens(head + summary + "".join(tail), max_tokens)
+
+
+@dataclass
+class BudgetReport:
+    baseline_tokens: int
+    prompt_tokens: int
+    budget: int
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.baseline_tokens - self.prompt_tokens
@@ -0,0 +1,63 @@
+"""
+Cache keys and hit metrics for onboarding quiz reports (generate_quiz_analysis
+in app/services/ai_service.py).
+
+The quiz bank is fixed and answers cluster, so many users get a report that was
+already written for someone else. QUIZ_REPORT_CACHE picks what counts as "the
+same" user:
+
+- "answers": the same answer to every question (skipped ones included)
+- "profile": the same per-label quiz scores after bucketing them
+  QUIZ_REPORT_PROFILE_TOLERANCE points wide, so near-identical profiles share
+  a report
+- "off": every user gets a fresh report
+
+Reports live in the shared cache (app/services/shared_cache.py): a per-worker
+LRU in front of the SQLite file all workers share. The cache also makes sure
+only one worker generates any given report.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from app.data.quiz import QuizQuestion
+from app.scoring_update import quiz_label_scores
+from app.settings import settings
+
+NAMESPACE = "quiz_report"
+
+stats: Counter = Counter()
+
+
+def report_key(questions: list[QuizQuestion], answers: dict[str, int], model: str) -> Optional[str]:
+    """The cache key for this submission under QUIZ_REPORT_CACHE; None when caching is off."""
+    mode = settings.QUIZ_REPORT_CACHE
+    if mode == "answers":
+        canonical = ",".join(f"{q.question_id}={answers.get(q.question_id, '')}" for q in questions)
+    elif mode == "profile":
+        width = settings.QUIZ_REPORT_PROFILE_TOLERANCE
+        scores = quiz_label_scores(questions, answers)
+        canonical = ",".join(f"{label.value}={math.floor(score / width)}" for label, score in scores.items())
+        canonical += f"@{width}"
+    else:
+        return None
+    # Reports depend on the model, so stub reports never reach real users
+    digest = hashlib.sha256(f"{model}\0{canonical}".encode()).hexdigest()
+    return f"{mode}:{digest}"
+
+
+def record(hit: bool) -> None:
+    stats["hits" if hit else "misses"] += 1
+
+
+def snapshot() -> Dict[str, Any]:
+    lookups = stats["hits"] + stats["misses"]
+    return {
+        "mode": settings.QUIZ_REPORT_CACHE,
+        **stats,
+        "hit_rate": round(stats["hits"] / lookups, 4) if lookups else None,
+    }
@@ -0,0 +1,228 @@
+"""
+Timeouts, retries, hedging and circuit breaking around Gemini calls.
+
+Every call goes through an `Upstream`:
+- each attempt is bounded by UPSTREAM_TIMEOUT_S and the request deadline (app/deadline.py)
+- failed attempts are retried with full-jitter backoff, while a retry budget
+  keeps retries under RETRY_BUDGET_RATIO of call volume
+- idempotent calls (embeddings) can be hedged: a second request is sent once
+  the first has run longer than the observed p95, and the first answer wins
+- after BREAKER_FAILURE_THRESHOLD consecutive failures the circuit opens and
+  calls fail immediately with CircuitOpen for BREAKER_RESET_S, then a single
+  probe decides whether to close it again
+
+Callers keep their existing `except Exception` fallbacks; an open circuit or an
+exhausted deadline simply reaches them without waiting on the upstream.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from app.deadline import bounded_timeout
+from app.services.fanout import llm_slot
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class UpstreamUnavailable(Exception):
+    pass
+
+
+class CircuitOpen(UpstreamUnavailable):
+    def __init__(self, name: str) -> None:
+        super().__init__(f"{name} circuit is open")
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    def __init__(self, name: str) -> None:
+        super().__init__(f"No request budget left for {name}")
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_after: float) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_after:
+            # Let exactly one probe through; its outcome closes or re-opens the circuit
+            self.state = "half_open"
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            logger.info("%s circuit closed", self.name)
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+            logger.warning("%s circuit opened after %d failures", self.name, self.failures)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def abandon_probe(self) -> None:
+        """A probe was cancelled without an outcome; let the next caller probe instead."""
+        if self.state == "half_open":
+            self.state = "open"
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures}
+
+
+class RetryBudget:
+    """Each call deposits `ratio` tokens and each retry or hedge spends one."""
+
+    def __init__(self, ratio: float, initial: float = 10.0, cap: float = 100.0) -> None:
+        self.ratio = ratio
+        self.tokens = initial
+        self.cap = cap
+
+    def record_call(self) -> None:
+        self.tokens = min(self.cap, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200, min_samples: int = 20) -> None:
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Upstream:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.breaker = CircuitBreaker(name, settings.BREAKER_FAILURE_THRESHOLD, settings.BREAKER_RESET_S)
+        self.retry_budget = RetryBudget(settings.RETRY_BUDGET_RATIO)
+        self.latency = LatencyTracker()
+
+    def _attempt_timeout(self) -> float:
+        timeout = bounded_timeout(settings.UPSTREAM_TIMEOUT_S)
+        if timeout <= 0:
+            self.breaker.abandon_probe()
+            raise DeadlineExceeded(self.name)
+        return timeout
+
+    async def call(self, factory: Callable[[], Awaitable[T]], hedge: bool = False) -> T:
+        """
+        Run `factory()` with retries. `factory` must build a fresh awaitable on
+        each invocation; pass hedge=True only for idempotent calls.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpen(self.name)
+        self.retry_budget.record_call()
+
+        attempt = 0
+        while True:
+            timeout = self._attempt_timeout()
+            started = time.monotonic()
+            try:
+                async with llm_slot():
+                    if hedge:
+                        result = await self._hedged(factory, timeout)
+                    else:
+                        result = await asyncio.wait_for(factory(), timeout)
+            except asyncio.CancelledError:
+                self.breaker.abandon_probe()
+                raise
+            except asyncio.TimeoutError:
+                if timeout < settings.UPSTREAM_TIMEOUT_S:
+                    # Cut short by the caller's deadline, not an upstream failure
+                    self.breaker.abandon_probe()
+                    raise DeadlineExceeded(self.name)
+                exc: Exception = asyncio.TimeoutError()
+                if not self._should_retry(attempt):
+                    raise
+            except Exception as error:
+                exc = error
+                if not self._should_retry(attempt):
+                    raise
+            else:
+                self.latency.observe(time.monotonic() - started)
+                self.breaker.record_success()
+                return result
+
+            # Full jitter: uniform over [0, base * 2^attempt], capped
+            delay = random.uniform(0, min(settings.RETRY_MAX_DELAY_S, settings.RETRY_BASE_DELAY_S * 2**attempt))
+            if bounded_timeout(delay) < delay:
+                raise exc
+            logger.info("%s attempt %d failed (%r), retrying in %.2fs", self.name, attempt + 1, exc, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _should_retry(self, attempt: int) -> bool:
+        """Record the failed attempt; True if another one is allowed."""
+        self.breaker.record_failure()
+        return (
+            attempt < settings.UPSTREAM_MAX_RETRIES
+            and self.breaker.state == "closed"
+            and self.retry_budget.try_spend()
+        )
+
+    async def _hedged(self, factory: Callable[[], Awaitable[T]], timeout: float) -> T:
+        hedge_after = self.latency.quantile(settings.HEDGE_QUANTILE)
+        if hedge_after is None or hedge_after >= timeout:
+            return await asyncio.wait_for(factory(), timeout)
+
+        give_up_at = time.monotonic() + timeout
+        first = asyncio.ensure_future(factory())
+        done, _ = await asyncio.wait({first}, timeout=hedge_after)
+        if done or not self.retry_budget.try_spend():
+            return await asyncio.wait_for(first, give_up_at - time.monotonic())
+
+        pending = {first, asyncio.ensure_future(factory())}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=give_up_at - time.monotonic(), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+gemini_chat = Upstream("gemini-chat")
+gemini_embeddings = Upstream("gemini-embeddings")
+
+
+def upstream_status() -> Dict[str, Dict[str, Any]]:
+    return {upstream.name: upstream.breaker.snapshot() for upstream in (gemini_chat, gemini_embeddings)}
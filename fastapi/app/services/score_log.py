@@ -0,0 +1,252 @@
+"""
+Append-only log of everything applied to the stateful scores (app/services/score_store.py),
+in a SQLite file in the storage directory.
+
+- events: one row per store version. `analysis` rows hold the AIAnalysisResult
+  and the timestamp of the history point it produced. `quiz` and `put` rows
+  hold the complete state the user was reset to (compact wire format,
+  app/data/wire.py). `replay` rows only mark a replay's write-back; its state
+  goes to snapshots. Rows are keyed by (user_id, version), so the order is the
+  store's commit order even when workers append out of order.
+- snapshots: every SCORE_LOG_SNAPSHOT_EVERY analyses, the user's current
+  state including the full line chart history, tagged with the fingerprint of
+  the weight table that produced it.
+
+`rebuild` restores a user's current state from the newest snapshot (or reset)
+plus the analyses after it, rather than replaying the whole log. Replays with
+other constants (app/services/score_replay.py) start from the last reset and
+ignore snapshots.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import msgspec
+
+from app.data import wire
+from app.data.user_score import AIAnalysisResult, UserScores
+from app.scoring_update import update_label_from_ai, update_sublabel_from_ai
+from app.settings import settings
+from app.storage import storage_dir
+from app.weights import active_weights
+
+_state_decoder = msgspec.msgpack.Decoder(wire.CompactUserScores)
+
+
+@dataclass
+class ScoreEvent:
+    user_id: int
+    version: int
+    kind: str  # "analysis", "quiz", "put" or "replay"
+    recorded_at: int  # UTC epoch microseconds
+    sublabel: Optional[str] = None
+    is_improvement: Optional[bool] = None
+    magnitude: Optional[float] = None
+    state: Optional[bytes] = None  # quiz / put: the full state
+
+    def user(self) -> UserScores:
+        return wire.from_compact(_state_decoder.decode(self.state))[0]
+
+
+def _encode_state(user: UserScores) -> bytes:
+    return wire.msgpack_encoder.encode(wire.to_compact(user))
+
+
+class ScoreLog:
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self._path = path
+        self._local = threading.local()
+
+    @property
+    def path(self) -> Path:
+        return self._path or storage_dir() / "score_log.sqlite"
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=settings.DB_BUSY_TIMEOUT / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS events (
+                    user_id INTEGER NOT NULL,
+                    version INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    recorded_at INTEGER NOT NULL,
+                    sublabel TEXT,
+                    is_improvement INTEGER,
+                    magnitude REAL,
+                    state BLOB,
+                    PRIMARY KEY (user_id, version)
+                ) WITHOUT ROWID
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    user_id INTEGER NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    state BLOB NOT NULL,
+                    PRIMARY KEY (user_id, fingerprint)
+                ) WITHOUT ROWID
+                """
+            )
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    # -- writes -------------------------------------------------------------
+
+    def append_analysis(
+        self, user_id: int, version: int, analysis: AIAnalysisResult, user: UserScores
+    ) -> None:
+        """Log an applied analysis; `user` is the state it produced (its last point dates the event)."""
+        recorded_at = wire._to_us(user.line_chart_history[-1].timestamp)
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO events (user_id, version, kind, recorded_at, sublabel, is_improvement, magnitude)"
+            " VALUES (?, ?, 'analysis', ?, ?, ?, ?)",
+            (user_id, version, recorded_at, analysis.sublabel.value, int(analysis.is_improvement), analysis.magnitude),
+        )
+        fingerprint = active_weights().fingerprint
+        since = conn.execute(
+            "SELECT COUNT(*) FROM events WHERE user_id = ? AND version > COALESCE("
+            "  (SELECT version FROM snapshots WHERE user_id = ? AND fingerprint = ?), 0)"
+            " AND kind = 'analysis'",
+            (user_id, user_id, fingerprint),
+        ).fetchone()[0]
+        if since >= settings.SCORE_LOG_SNAPSHOT_EVERY:
+            self.snapshot(user_id, version, user, fingerprint)
+
+    def append_reset(self, user_id: int, version: int, user: UserScores, kind: str = "put") -> None:
+        """Log a state replacement: a quiz result or a client-provided state."""
+        recorded_at = wire._to_us(user.line_chart_history[-1].timestamp) if user.line_chart_history else 0
+        self._conn().execute(
+            "INSERT OR REPLACE INTO events (user_id, version, kind, recorded_at, state) VALUES (?, ?, ?, ?, ?)",
+            (user_id, version, kind, recorded_at, _encode_state(user)),
+        )
+
+    def append_replay(self, user_id: int, version: int, user: UserScores) -> None:
+        """Log a replay's write-back: a marker event for the version, and the state as a snapshot."""
+        recorded_at = wire._to_us(user.line_chart_history[-1].timestamp) if user.line_chart_history else 0
+        self._conn().execute(
+            "INSERT OR REPLACE INTO events (user_id, version, kind, recorded_at) VALUES (?, ?, 'replay', ?)",
+            (user_id, version, recorded_at),
+        )
+        self.snapshot(user_id, version, user)
+
+    def snapshot(self, user_id: int, version: int, user: UserScores, fingerprint: Optional[str] = None) -> None:
+        self._conn().execute(
+            "INSERT INTO snapshots (user_id, fingerprint, version, state) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (user_id, fingerprint) DO UPDATE SET version = excluded.version, state = excluded.state"
+            " WHERE excluded.version > snapshots.version",
+            (user_id, fingerprint or active_weights().fingerprint, version, _encode_state(user)),
+        )
+
+    # -- reads --------------------------------------------------------------
+
+    def _events(self, rows: Sequence[tuple]) -> List[ScoreEvent]:
+        return [
+            ScoreEvent(user_id, version, kind, recorded_at, sublabel,
+                       None if improvement is None else bool(improvement), magnitude, state)
+            for user_id, version, kind, recorded_at, sublabel, improvement, magnitude, state in rows
+        ]
+
+    def user_ids(self) -> List[int]:
+        return [user_id for (user_id,) in self._conn().execute("SELECT DISTINCT user_id FROM events ORDER BY user_id")]
+
+    def streams(self, user_ids: Sequence[int]) -> Dict[int, List[ScoreEvent]]:
+        """Each user's events from their last reset onward, oldest first (users without a reset are left out)."""
+        streams: Dict[int, List[ScoreEvent]] = {}
+        conn = self._conn()
+        for start in range(0, len(user_ids), 500):
+            chunk = list(user_ids[start : start + 500])
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"""
+                SELECT e.user_id, e.version, e.kind, e.recorded_at, e.sublabel, e.is_improvement, e.magnitude, e.state
+                FROM events e
+                JOIN (SELECT user_id, MAX(version) AS version FROM events
+                      WHERE user_id IN ({placeholders}) AND kind IN ('quiz', 'put') GROUP BY user_id) r
+                  ON r.user_id = e.user_id AND e.version >= r.version
+                ORDER BY e.user_id, e.version
+                """,
+                chunk,
+            ).fetchall()
+            for event in self._events(rows):
+                streams.setdefault(event.user_id, []).append(event)
+        return streams
+
+    def rebuild(self, user_id: int) -> Optional[Tuple[UserScores, int]]:
+        """
+        (current state, version) from the newest snapshot for the current
+        weight table, or the last reset if that is newer, plus the analyses after
+        it. Snapshots and resets carry the whole history, so the line chart comes
+        back complete. None without a starting point.
+        """
+        weights = active_weights()
+        conn = self._conn()
+        reset = conn.execute(
+            "SELECT version, state FROM events WHERE user_id = ? AND kind IN ('quiz', 'put') ORDER BY version DESC LIMIT 1",
+            (user_id,),
+        ).fetchone()
+        snapshot = conn.execute(
+            "SELECT version, state FROM snapshots WHERE user_id = ? AND fingerprint = ?",
+            (user_id, weights.fingerprint),
+        ).fetchone()
+        start = max([row for row in (reset, snapshot) if row is not None], key=lambda row: row[0], default=None)
+        if start is None:
+            return None
+
+        version, state = start
+        user = wire.from_compact(_state_decoder.decode(state))[0]
+        if start is snapshot:
+            # Same values as the active table, possibly saved under an earlier version name
+            user.weights_version = weights.version
+        tail = self._events(conn.execute(
+            "SELECT user_id, version, kind, recorded_at, sublabel, is_improvement, magnitude, state FROM events"
+            " WHERE user_id = ? AND version > ? ORDER BY version",
+            (user_id, version),
+        ).fetchall())
+        for event in tail:
+            if event.kind == "replay":
+                # Its snapshot was for other weights; the analyses replayed here give the active ones
+                version = event.version
+                continue
+            if event.kind != "analysis":
+                user, version = event.user(), event.version
+                continue
+            analysis = AIAnalysisResult(
+                sublabel=wire.SUBLABEL_ORDER[wire.SUBLABEL_INDEX[event.sublabel]],
+                is_improvement=event.is_improvement,
+                magnitude=event.magnitude,
+            )
+            update_sublabel_from_ai(user, analysis, timestamp=wire._from_us(event.recorded_at), weights=weights)
+            update_label_from_ai(user, analysis.sublabel.label, weights)
+            version = event.version
+        return user, version
+
+    def stats(self) -> Dict:
+        conn = self._conn()
+        events = dict(conn.execute("SELECT kind, COUNT(*) FROM events GROUP BY kind").fetchall())
+        users, snapshots = conn.execute(
+            "SELECT (SELECT COUNT(DISTINCT user_id) FROM events), (SELECT COUNT(*) FROM snapshots)"
+        ).fetchone()
+        weights = active_weights()
+        return {
+            "users": users,
+            "events": events,
+            "snapshots": snapshots,
+            "weights_version": weights.version,
+            "fingerprint": weights.fingerprint,
+        }
+
+
+score_log = ScoreLog()
@@ -0,0 +1,250 @@
+"""
+Re-score users from the score log (app/services/score_log.py) with a given
+weight table (app/weights.py), e.g. to move everyone to a new version.
+
+Each user's stream starts at their last reset (quiz or put) and is replayed
+across users in lockstep: step t applies every user's t-th analysis as one set
+of array operations. The arithmetic follows process_ai_analysis operation for
+operation: sums run in taxonomy order and `_round` reproduces round().
+Replaying with the table that produced the live scores therefore gives back
+exactly the live scores. Replayed users are tagged with the table's version.
+
+`replay_all` splits the users into chunks and replays them in a process pool.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.constants import DEFAULT_SCORE, MAX_SCORE, MIN_SCORE
+from app.data import wire
+from app.data.user_score import LineChartPoint, UserScores
+from app.label import Label
+from app.weights import WeightTable
+from app.services.score_log import ScoreEvent, ScoreLog
+
+logger = logging.getLogger(__name__)
+
+LABELS = list(Label)
+_LABEL_INDEX = {label: i for i, label in enumerate(LABELS)}
+SUBLABEL_LABEL = np.array([_LABEL_INDEX[member.label] for member in wire.SUBLABEL_ORDER], dtype=np.intp)
+
+
+def _round(values: np.ndarray, ndigits: int) -> np.ndarray:
+    """Elementwise round(value, ndigits), bit for bit. Values too close to a tie to trust rint are rounded by Python."""
+    scale = 10.0 ** ndigits
+    scaled = values * scale
+    rounded = np.rint(scaled) / scale
+    near_tie = np.abs(np.abs(scaled - np.floor(scaled)) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_tie):
+        rounded[i] = round(float(values[i]), ndigits)
+    return rounded
+
+
+class WeightArrays:
+    """A WeightTable as arrays in wire.SUBLABEL_ORDER."""
+
+    def __init__(self, weights: WeightTable) -> None:
+        severity = weights.severity
+        self.severity = np.array([severity[member.value] for member in wire.SUBLABEL_ORDER], dtype=np.float64)
+        self.total_weight = sum(severity[member.value] for member in wire.SUBLABEL_ORDER)
+        # Per label, its sub-labels' columns (padded with -1) and their total weight
+        members = [np.flatnonzero(SUBLABEL_LABEL == i) for i in range(len(LABELS))]
+        width = max(len(m) for m in members)
+        self.members = np.full((len(LABELS), width), -1, dtype=np.intp)
+        for i, columns in enumerate(members):
+            self.members[i, : len(columns)] = columns
+        self.label_weight = np.array(
+            [float(sum(severity[wire.SUBLABEL_ORDER[c].value] for c in columns)) for columns in members]
+        )
+
+    def overall(self, effective: np.ndarray) -> np.ndarray:
+        weighted_sum = np.zeros(len(effective))
+        for column in range(effective.shape[1]):
+            weighted_sum += effective[:, column] * self.severity[column]
+        if self.total_weight <= 0:
+            return np.full(len(effective), DEFAULT_SCORE)
+        return _round(weighted_sum / self.total_weight, 2)
+
+
+@dataclass
+class ReplayResult:
+    user_id: int
+    version: int  # store version of the last replayed event
+    user: UserScores
+    baseline_overall: Optional[float] = None  # final overall score under the baseline table, if asked for
+
+
+@dataclass
+class ReplayProgress:
+    total: int = 0  # users to replay
+    users: int = 0
+    events: int = 0
+    skipped: int = 0  # users with no quiz / put to start from
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def as_dict(self) -> Dict:
+        elapsed = self.elapsed
+        done = self.users + self.skipped
+        users_per_s = done / elapsed if elapsed > 0 else None
+        return {
+            "done": f"{done}/{self.total}",
+            "users": self.users,
+            "events": self.events,
+            "skipped": self.skipped,
+            "elapsed_s": round(elapsed, 2),
+            "users_per_s": round(users_per_s) if users_per_s else None,
+            "events_per_s": round(self.events / elapsed) if elapsed > 0 else None,
+            "eta_s": round((self.total - done) / users_per_s, 1) if users_per_s else None,
+        }
+
+
+def replay_streams(streams: Dict[int, List[ScoreEvent]], table: WeightTable) -> List[ReplayResult]:
+    """Replay each user's stream (starting with a reset, as ScoreLog.streams returns them)."""
+    weights = WeightArrays(table)
+    user_ids = list(streams)
+    n = len(user_ids)
+    if n == 0:
+        return []
+
+    # Starting state of every user, then their analyses as (user row, step) columns
+    sublabels = np.full((n, len(wire.SUBLABEL_ORDER)), np.nan)
+    labels = np.empty((n, len(LABELS)))
+    base_history: List[List[LineChartPoint]] = []
+    initial_report: List[Optional[str]] = []
+    tails: List[List[ScoreEvent]] = []
+    for row, user_id in enumerate(user_ids):
+        reset, *tail = streams[user_id]
+        tail = [event for event in tail if event.kind == "analysis"]  # leave out replay markers
+        start = reset.user()
+        labels[row] = [start.label_scores[label] for label in LABELS]
+        for key, score in start.sublabel_scores.items():
+            sublabels[row, wire.SUBLABEL_INDEX[key]] = score
+        history = start.line_chart_history
+        if reset.kind == "quiz" and history:
+            # The quiz point's overall score depends on the severities, so it is recomputed
+            effective = np.where(np.isnan(sublabels[row : row + 1]), labels[row, SUBLABEL_LABEL], sublabels[row : row + 1])
+            history = [LineChartPoint(history[0].timestamp, float(weights.overall(effective)[0]), 0.0)]
+        base_history.append(history)
+        initial_report.append(start.initial_report)
+        tails.append(tail)
+
+    steps = max(len(tail) for tail in tails)
+    sub_index = np.full((n, steps), -1, dtype=np.intp)
+    improvement = np.zeros((n, steps), dtype=bool)
+    magnitude = np.zeros((n, steps))
+    for row, tail in enumerate(tails):
+        for step, event in enumerate(tail):
+            sub_index[row, step] = wire.SUBLABEL_INDEX[event.sublabel]
+            improvement[row, step] = event.is_improvement
+            magnitude[row, step] = event.magnitude
+    overall_out = np.zeros((n, steps))
+    delta_out = np.zeros((n, steps))
+    previous = np.array([h[-1].overall_score if h else DEFAULT_SCORE for h in base_history], dtype=np.float64)
+
+    for step in range(steps):
+        rows = np.flatnonzero(sub_index[:, step] >= 0)
+        k = sub_index[rows, step]
+        label = SUBLABEL_LABEL[k]
+
+        # update_sublabel_from_ai
+        current = sublabels[rows, k]
+        current = np.where(np.isnan(current), labels[rows, label], current)
+        severity = weights.severity[k]
+        reward = (table.base_reward + severity * table.severity_multiplier) * magnitude[rows, step]
+        penalty = (table.base_penalty + severity * table.severity_multiplier) * magnitude[rows, step]
+        new = np.where(improvement[rows, step], current + reward, current - penalty)
+        sublabels[rows, k] = _round(np.maximum(MIN_SCORE, np.minimum(MAX_SCORE, new)), 2)
+
+        effective = sublabels[rows]
+        effective = np.where(np.isnan(effective), labels[rows][:, SUBLABEL_LABEL], effective)
+        overall = weights.overall(effective)
+        overall_out[rows, step] = overall
+        delta_out[rows, step] = _round(overall - previous[rows], 2)
+        previous[rows] = overall
+
+        # update_label_from_ai: the weighted mean over the label's sub-labels, in taxonomy order
+        weighted_sum = np.zeros(len(rows))
+        for slot in range(weights.members.shape[1]):
+            column = weights.members[label, slot]
+            present = column >= 0
+            safe = np.where(present, column, 0)
+            score = effective[np.arange(len(rows)), safe]
+            weighted_sum += np.where(present, score * weights.severity[safe], 0.0)
+        label_weight = weights.label_weight[label]
+        labels[rows, label] = np.where(
+            label_weight > 0, _round(weighted_sum / np.where(label_weight > 0, label_weight, 1.0), 1), labels[rows, label]
+        )
+
+    results = []
+    for row, user_id in enumerate(user_ids):
+        tail = tails[row]
+        user = UserScores(
+            label_scores=dict(zip(LABELS, labels[row].tolist())),
+            sublabel_scores={
+                wire.SUBLABEL_ORDER[i].value: score
+                for i, score in enumerate(sublabels[row].tolist())
+                if score == score  # not NaN
+            },
+            line_chart_history=base_history[row] + [
+                LineChartPoint(wire._from_us(event.recorded_at), overall, delta)
+                for event, overall, delta in zip(
+                    tail, overall_out[row, : len(tail)].tolist(), delta_out[row, : len(tail)].tolist()
+                )
+            ],
+            initial_report=initial_report[row],
+            weights_version=table.version,
+        )
+        results.append(ReplayResult(user_id, streams[user_id][-1].version, user))
+    return results
+
+
+def _replay_chunk(
+    log_path: str, user_ids: Sequence[int], table: WeightTable, baseline: Optional[WeightTable]
+) -> Tuple[List[ReplayResult], int, int]:
+    """Worker process entry point: (results, events replayed, users without a starting point)."""
+    streams = ScoreLog(path=log_path).streams(user_ids)
+    results = replay_streams(streams, table)
+    if baseline is not None:
+        for result, before in zip(results, replay_streams(streams, baseline)):
+            result.baseline_overall = before.user.line_chart_history[-1].overall_score
+    return results, sum(len(stream) for stream in streams.values()), len(user_ids) - len(streams)
+
+
+def replay_all(
+    log: ScoreLog,
+    table: WeightTable,
+    workers: int = 4,
+    chunk_size: int = 2000,
+    user_ids: Optional[Sequence[int]] = None,
+    baseline: Optional[WeightTable] = None,
+    on_progress: Optional[Callable[[ReplayProgress], None]] = None,
+) -> Iterator[ReplayResult]:
+    """
+    Replay every logged user (or `user_ids`) in a process pool, yielding results
+    as chunks finish. With `baseline`, each result also carries the final overall
+    score under that table, for comparison.
+    """
+    ids = list(user_ids) if user_ids is not None else log.user_ids()
+    chunks = [ids[start : start + chunk_size] for start in range(0, len(ids), chunk_size)]
+    progress = ReplayProgress(total=len(ids))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_replay_chunk, str(log.path), chunk, table, baseline) for chunk in chunks]
+        for future in as_completed(futures):
+            results, events, skipped = future.result()
+            progress.users += len(results)
+            progress.events += events
+            progress.skipped += skipped
+            if on_progress is not None:
+                on_progress(progress)
+            yield from results
@@ -0,0 +1,208 @@
+"""
+What-if projections of a user's scores (POST /scoring/simulate).
+
+A plan says, per sub-label, how often the user expects to log it (events per
+week), how likely each event is to be an improvement, and how large it is. The
+events of a trajectory form a Poisson process over the horizon. Each trajectory
+draws how many events it gets, which sub-label each one hits and in what order.
+The events are then applied with the arithmetic of process_ai_analysis: the
+reward / penalty step, _clamp, rounding, the label recomputation and the
+severity-weighted overall score.
+
+All trajectories advance together, one event per step, as array operations.
+The overall and label sums are matrix products, so a value can differ from
+process_ai_analysis in the last floating-point digit before rounding (see
+bench/score_simulation.py).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.constants import DEFAULT_SCORE, MAX_SCORE, MIN_SCORE
+from app.data import wire
+from app.data.user_score import UserScores
+from app.label import SubLabelBase
+from app.scoring_update import _compute_overall_score
+from app.services.score_replay import LABELS, SUBLABEL_LABEL, WeightArrays
+from app.settings import settings
+from app.weights import WeightTable, active_weights
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+@dataclass
+class PracticePlan:
+    sublabel: SubLabelBase
+    per_week: float  # expected events per week
+    improvement_probability: float
+    magnitude: float = 0.5
+
+
+@dataclass
+class SimulatedEvents:
+    """Events of every trajectory, one column per step; steps at or past `counts[row]` are padding."""
+
+    counts: np.ndarray  # (trajectories,) events per trajectory
+    sublabel: np.ndarray  # (trajectories, steps) column in wire.SUBLABEL_ORDER
+    improvement: np.ndarray  # (trajectories, steps) bool
+    magnitude: np.ndarray  # (trajectories, steps)
+    week: np.ndarray  # (trajectories, steps) 0-based week the event falls in, ascending
+
+
+@dataclass
+class Trajectories:
+    sublabels: np.ndarray  # (trajectories, sub-labels) final scores, NaN = never assessed
+    labels: np.ndarray  # (trajectories, labels) final scores
+    weekly_overall: np.ndarray  # (trajectories, weeks) overall score at the end of each week
+
+
+def draw_events(plan: List[PracticePlan], weeks: int, trajectories: int, rng: np.random.Generator) -> SimulatedEvents:
+    """Draw every trajectory's events. Raises ValueError when they would exceed SIMULATION_MAX_EVENTS."""
+    rates = np.array([item.per_week for item in plan], dtype=np.float64) * weeks
+    total_rate = float(rates.sum())
+    if total_rate <= 0:
+        counts = np.zeros(trajectories, dtype=np.int64)
+    else:
+        counts = rng.poisson(total_rate, size=trajectories)
+    steps = int(counts.max(initial=0))
+    if steps * trajectories > settings.SIMULATION_MAX_EVENTS:
+        raise ValueError(
+            f"plan needs up to {steps * trajectories} simulated events (limit {settings.SIMULATION_MAX_EVENTS}); "
+            "lower the rates, weeks or trajectories"
+        )
+
+    padding = np.arange(steps) >= counts[:, None]
+    # Which plan item each event belongs to: in a merged Poisson process, proportional to its rate
+    item = rng.choice(len(plan), size=(trajectories, steps), p=rates / total_rate) if steps else np.zeros(
+        (trajectories, 0), dtype=np.intp
+    )
+    columns = np.array([wire.SUBLABEL_INDEX[entry.sublabel.value] for entry in plan], dtype=np.intp)
+    improve_p = np.array([entry.improvement_probability for entry in plan], dtype=np.float64)
+    magnitude = np.array([entry.magnitude for entry in plan], dtype=np.float64)
+    # Given the count, the times are uniform over the horizon; padding sorts to the end
+    times = np.where(padding, np.inf, rng.random((trajectories, steps)) * weeks)
+    times.sort(axis=1)
+    return SimulatedEvents(
+        counts=counts,
+        sublabel=columns[item],
+        improvement=rng.random((trajectories, steps)) < improve_p[item],
+        magnitude=magnitude[item],
+        week=np.floor(np.where(padding, 0.0, times)).astype(np.intp),
+    )
+
+
+def run_trajectories(user: UserScores, events: SimulatedEvents, weeks: int, weights: WeightTable) -> Trajectories:
+    """Apply `events` to copies of `user`, all trajectories at once."""
+    arrays = WeightArrays(weights)
+    n = len(events.counts)
+    sublabels = np.full((n, len(wire.SUBLABEL_ORDER)), np.nan)
+    for key, score in user.sublabel_scores.items():
+        if key in wire.SUBLABEL_INDEX:
+            sublabels[:, wire.SUBLABEL_INDEX[key]] = score
+    labels = np.tile([float(user.label_scores.get(label, DEFAULT_SCORE)) for label in LABELS], (n, 1))
+
+    # Severity in each sub-label's own label column: effective @ label_matrix gives every label's weighted sum
+    label_matrix = np.zeros((len(wire.SUBLABEL_ORDER), len(LABELS)))
+    label_matrix[np.arange(len(wire.SUBLABEL_ORDER)), SUBLABEL_LABEL] = arrays.severity
+    label_weight = np.where(arrays.label_weight > 0, arrays.label_weight, 1.0)
+
+    weekly = np.full((n, weeks), np.nan)
+    for step in range(events.sublabel.shape[1]):
+        rows = np.flatnonzero(events.counts > step)
+        k = events.sublabel[rows, step]
+        label = SUBLABEL_LABEL[k]
+
+        current = sublabels[rows, k]
+        current = np.where(np.isnan(current), labels[rows, label], current)
+        bonus = arrays.severity[k] * weights.severity_multiplier
+        improve = events.improvement[rows, step]
+        change = np.where(improve, weights.base_reward + bonus, weights.base_penalty + bonus) * events.magnitude[rows, step]
+        new = np.where(improve, current + change, current - change)
+        sublabels[rows, k] = np.round(np.clip(new, MIN_SCORE, MAX_SCORE), 2)
+
+        effective = sublabels[rows]
+        effective = np.where(np.isnan(effective), labels[rows][:, SUBLABEL_LABEL], effective)
+        if arrays.total_weight > 0:
+            overall = np.round(effective @ arrays.severity / arrays.total_weight, 2)
+        else:
+            overall = np.full(len(rows), DEFAULT_SCORE)
+        # Events are in time order, so the last one of a week leaves that week's value
+        weekly[rows, events.week[rows, step]] = overall
+
+        means = (effective @ label_matrix) / label_weight
+        picked = np.round(means[np.arange(len(rows)), label], 1)
+        labels[rows, label] = np.where(arrays.label_weight[label] > 0, picked, labels[rows, label])
+
+    # Weeks without events carry the previous week's score forward
+    start = _current_overall(user, weights)
+    filled = np.where(np.isnan(weekly), -1, np.arange(weeks))
+    last = np.maximum.accumulate(filled, axis=1)
+    weekly = np.where(last >= 0, np.take_along_axis(weekly, np.maximum(last, 0), axis=1), start)
+    return Trajectories(sublabels=sublabels, labels=labels, weekly_overall=weekly)
+
+
+def _current_overall(user: UserScores, weights: WeightTable) -> float:
+    if user.line_chart_history:
+        return user.line_chart_history[-1].overall_score
+    return _compute_overall_score(user, weights)
+
+
+def _bands(values: np.ndarray) -> Dict[str, float]:
+    return {f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+
+def simulate(
+    user: UserScores,
+    plan: List[PracticePlan],
+    weeks: int,
+    trajectories: int,
+    seed: Optional[int] = None,
+    weights: Optional[WeightTable] = None,
+) -> Dict[str, Any]:
+    """
+    Percentile bands of the overall score at the end of every week, and of the
+    final label and planned sub-label scores. Raises ValueError for a plan
+    that lists a sub-label twice or exceeds SIMULATION_MAX_EVENTS.
+    """
+    weights = weights or active_weights()
+    keys = [item.sublabel.value for item in plan]
+    if len(set(keys)) != len(keys):
+        raise ValueError("each sub-label may appear in the plan only once")
+
+    rng = np.random.default_rng(seed)
+    events = draw_events(plan, weeks, trajectories, rng)
+    result = run_trajectories(user, events, weeks, weights)
+
+    current = _current_overall(user, weights)
+    final = result.weekly_overall[:, -1]
+    final_labels = {label: result.labels[:, i] for i, label in enumerate(LABELS)}
+    current_sub = {
+        key: float(user.sublabel_scores.get(key, user.label_scores.get(item.sublabel.label, DEFAULT_SCORE)))
+        for key, item in zip(keys, plan)
+    }
+    final_sub = {}
+    for key in keys:
+        column = wire.SUBLABEL_INDEX[key]
+        # Never assessed: the score is still its label's
+        values = result.sublabels[:, column]
+        final_sub[key] = np.where(np.isnan(values), result.labels[:, SUBLABEL_LABEL[column]], values)
+    return {
+        "weeks": weeks,
+        "trajectories": trajectories,
+        "weights_version": weights.version,
+        "events_per_trajectory": round(float(events.counts.mean()), 2) if trajectories else 0.0,
+        "overall": {
+            "current": current,
+            "probability_improved": round(float((final > current).mean()), 4),
+            "weekly": [{"week": week + 1, **_bands(result.weekly_overall[:, week])} for week in range(weeks)],
+        },
+        "labels": {
+            label.value: {"current": float(user.label_scores.get(label, DEFAULT_SCORE)), **_bands(values)}
+            for label, values in final_labels.items()
+        },
+        "sublabels": {key: {"current": current_sub[key], **_bands(final_sub[key])} for key in keys},
+    }
@@ -0,0 +1,218 @@
+"""
+Canonical per-user score state for the stateful scoring mode.
+
+The client sends (user_id, version, analysis) and receives a small patch instead
+of round-tripping the whole UserScores. Writes are versioned: a write against a
+stale version raises VersionConflict (optimistic concurrency).
+
+Every committed write is also appended to the score log (app/services/score_log.py)
+under its version; the in-memory store restores users from it after a restart.
+"""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy.exc import IntegrityError
+
+from app.data.packed import PackedUserScores
+from app.data.user_score import AIAnalysisResult, LineChartPoint, UserScores
+from app.scoring_update import process_ai_analysis
+from app.services.score_log import score_log
+from app.settings import settings
+
+
+class VersionConflict(Exception):
+    def __init__(self, user_id: int, expected: int | None, current: int | None) -> None:
+        super().__init__(f"Version conflict for user {user_id}: expected {expected}, current {current}")
+        self.user_id = user_id
+        self.expected = expected
+        self.current = current
+
+
+class UnknownUser(KeyError):
+    pass
+
+
+@dataclass
+class StoredScores:
+    user: UserScores
+    version: int
+
+
+class InMemoryScoreStore:
+    """
+    Process-local store. Per-user locks keep read-modify-write atomic across
+    threadpool workers. Users are held as PackedUserScores (app/data/packed.py)
+    and updated in place; reads get an unpacked copy.
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[int, StoredScores] = {}  # .user is a PackedUserScores
+        self._locks: dict[int, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def lock(self, user_id: int) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(user_id, threading.Lock())
+
+    def _entry(self, user_id: int) -> StoredScores | None:
+        entry = self._entries.get(user_id)
+        if entry is None and settings.SCORE_LOG_ENABLED:
+            rebuilt = score_log.rebuild(user_id)
+            if rebuilt is not None:
+                packed = PackedUserScores.pack(rebuilt[0])
+                entry = self._entries.setdefault(user_id, StoredScores(user=packed, version=rebuilt[1]))
+        return entry
+
+    def get(self, user_id: int) -> StoredScores | None:
+        with self.lock(user_id):
+            entry = self._entry(user_id)
+            return StoredScores(user=entry.user.unpack(), version=entry.version) if entry else None
+
+    def history_page(
+        self, user_id: int, after: datetime | None = None, limit: int = 100
+    ) -> tuple[list[LineChartPoint], datetime | None]:
+        with self.lock(user_id):
+            current = self._entry(user_id)
+            if current is None:
+                raise UnknownUser(user_id)
+            history = current.user.line_chart_history
+            indexes = history.after(after) if after is not None else range(len(history))
+            page = [history[i] for i in indexes[:limit]]
+        return page, page[-1].timestamp if len(indexes) > limit else None
+
+    def put(self, user_id: int, user: UserScores, expected_version: int | None = None, origin: str = "put") -> int:
+        """
+        Replace the user's state. expected_version=None skips the version check.
+        `origin` ("put", "quiz" or "replay") is what the score log records.
+        """
+        with self.lock(user_id):
+            current = self._entry(user_id)
+            current_version = current.version if current else 0
+            if expected_version is not None and expected_version != current_version:
+                raise VersionConflict(user_id, expected_version, current_version)
+            self._entries[user_id] = StoredScores(user=PackedUserScores.pack(user), version=current_version + 1)
+            log_reset(user_id, current_version + 1, user, origin)
+            return current_version + 1
+
+    def apply(self, user_id: int, version: int, analysis: AIAnalysisResult) -> dict[str, Any]:
+        """Apply one analysis to the canonical state and return the patch."""
+        with self.lock(user_id):
+            current = self._entry(user_id)
+            if current is None:
+                raise UnknownUser(user_id)
+            if current.version != version:
+                raise VersionConflict(user_id, version, current.version)
+
+            user = process_ai_analysis(current.user, analysis)
+            current.version += 1
+            if settings.SCORE_LOG_ENABLED:
+                score_log.append_analysis(user_id, current.version, analysis, user)
+            return build_patch(user_id, current.version, user, analysis)
+
+
+class DatabaseScoreStore:
+    """
+    Store backed by user_score_history / user_label_history (app/repositories/scores.py),
+    so every worker sees the same state. Updates load only the latest history point.
+    """
+
+    def __init__(self, repository=None) -> None:
+        from app.repositories.scores import ScoreRepository
+
+        self.repository = repository or ScoreRepository()
+
+    def get(self, user_id: int) -> StoredScores | None:
+        loaded = self.repository.load(user_id)
+        return StoredScores(user=loaded[0], version=loaded[1]) if loaded else None
+
+    def history_page(
+        self, user_id: int, after: datetime | None = None, limit: int = 100
+    ) -> tuple[list[LineChartPoint], datetime | None]:
+        page = self.repository.history_page(user_id, after=after, limit=limit)
+        if not page.points and after is None:
+            raise UnknownUser(user_id)
+        return page.points, page.next_after
+
+    def put(self, user_id: int, user: UserScores, expected_version: int | None = None, origin: str = "put") -> int:
+        if not user.line_chart_history:
+            raise ValueError("user_scores must contain at least one line_chart_history point")
+        try:
+            version = self.repository.replace(user_id, user, expected_version)
+        except IntegrityError:
+            # user_id has no row in Laravel's users table
+            raise UnknownUser(user_id)
+        if version is None:
+            raise VersionConflict(user_id, expected_version, self._current_version(user_id))
+        log_reset(user_id, version, user, origin)
+        return version
+
+    def apply(self, user_id: int, version: int, analysis: AIAnalysisResult) -> dict[str, Any]:
+        loaded = self.repository.load(user_id, history_limit=1)
+        if loaded is None:
+            raise UnknownUser(user_id)
+        user, current_version = loaded
+        if current_version != version:
+            raise VersionConflict(user_id, version, current_version)
+
+        user = process_ai_analysis(user, analysis)
+        sublabel = analysis.sublabel
+        new_version = self.repository.append_update(
+            user_id,
+            expected_version=version,
+            point=user.line_chart_history[-1],
+            changed_scores={
+                sublabel.value: user.sublabel_scores[sublabel.value],
+                sublabel.label.value: user.label_scores[sublabel.label],
+            },
+            weights_version=user.weights_version,
+        )
+        if new_version is None:
+            raise VersionConflict(user_id, version, self._current_version(user_id))
+        if settings.SCORE_LOG_ENABLED:
+            score_log.append_analysis(user_id, new_version, analysis, user)
+        return build_patch(user_id, new_version, user, analysis)
+
+    def _current_version(self, user_id: int) -> int:
+        with self.repository.engine.connect() as conn:
+            return self.repository.version(conn, user_id)
+
+
+def log_reset(user_id: int, version: int, user: UserScores, origin: str) -> None:
+    """
+    Record a state replacement in the score log. A replay's write-back is stored
+    as a snapshot rather than a reset, so the next replay still starts from the
+    original events.
+    """
+    if not settings.SCORE_LOG_ENABLED:
+        return
+    if origin == "replay":
+        score_log.append_replay(user_id, version, user)
+    else:
+        score_log.append_reset(user_id, version, user, origin)
+
+
+def build_patch(user_id: int, version: int, user: UserScores, analysis: AIAnalysisResult) -> dict[str, Any]:
+    """The only fields process_ai_analysis touches: one sub-label, its label and the new history point."""
+    sublabel = analysis.sublabel
+    point = user.line_chart_history[-1]
+    return {
+        "user_id": user_id,
+        "version": version,
+        "sublabel_scores": {sublabel.value: user.sublabel_scores[sublabel.value]},
+        "label_scores": {sublabel.label.value: user.label_scores[sublabel.label]},
+        "point": point,
+    }
+
+
+def _build_store() -> InMemoryScoreStore | DatabaseScoreStore:
+    if settings.SCORE_STORE == "database":
+        return DatabaseScoreStore()
+    return InMemoryScoreStore()
+
+
+score_store = _build_store()
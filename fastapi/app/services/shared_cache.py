@@ -0,0 +1,342 @@
+"""
+Two-tier cache shared by all worker processes on a host.
+
+- front: a per-process LRU of encoded values (SHARED_CACHE_FRONT_SIZE entries)
+- shared: a SQLite file in the storage directory, read concurrently by every
+  worker (WAL) and written under SQLite's own cross-process locks
+
+`get_or_compute` also takes a per-key lease row before computing, so when
+several workers miss on the same key at once only one of them calls the
+upstream and the others wait for its result.
+
+SQLite calls block (a write may wait up to DB_BUSY_TIMEOUT for the lock), so
+the async methods (`aget_many`, `aset_many`, `get_or_compute`) run them in a
+thread and only the front tier is touched on the event loop. Shared-tier hits
+are counted in memory and written in one batch every SHARED_CACHE_HITS_FLUSH_S,
+so reads do not queue on SQLite's single writer.
+
+The file outlives the workers, so a rolling reload (`kill -HUP` on the
+launcher, see app/commands/serve.py) starts the new workers warm.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+import msgspec
+
+from app.settings import settings
+from app.storage import storage_dir
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_MISS = object()
+_encoder = msgspec.msgpack.Encoder()
+_decoder = msgspec.msgpack.Decoder()
+
+
+class SharedCache:
+    def __init__(self, path: Optional[Path] = None, front_size: int = 2048, enabled: bool = True) -> None:
+        self._path = path
+        self.front_size = front_size
+        self.enabled = enabled
+        self.front: "OrderedDict[Tuple[str, str], Tuple[float, bytes]]" = OrderedDict()
+        self.stats: Counter = Counter()
+        self._local = threading.local()
+        self._ready = False
+        self._setup_lock = threading.Lock()
+        # Sync endpoints run in the threadpool, so the front cache is shared between threads
+        self._front_lock = threading.Lock()
+        self._pending_hits: Counter = Counter()
+        self._hits_lock = threading.Lock()
+        self._hits_flushed_at = time.monotonic()
+
+    @property
+    def path(self) -> Path:
+        if self._path is None:
+            self._path = storage_dir() / "cache.sqlite"
+        return self._path
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            # One connection per thread; never reuse one inherited across fork
+            conn = sqlite3.connect(self.path, timeout=settings.DB_BUSY_TIMEOUT / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        if not self._ready:
+            with self._setup_lock:
+                if not self._ready:
+                    self._create_schema(conn)
+                    self._ready = True
+        return conn
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection) -> None:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                expires_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache_leases (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                owner INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID
+            """
+        )
+
+    def setup(self) -> None:
+        """Create the file and drop expired entries; the launcher calls this once before forking."""
+        if not self.enabled:
+            return
+        conn = self._conn()
+        now = time.time()
+        conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+        conn.execute("DELETE FROM cache_leases WHERE expires_at < ?", (now,))
+
+    def _write(self, sql: str, rows: List[tuple]) -> None:
+        """executemany in a single transaction."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(sql, rows)
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    # -- front tier -------------------------------------------------------
+
+    def _front_get(self, full_key: Tuple[str, str]) -> Any:
+        with self._front_lock:
+            entry = self.front.get(full_key)
+            if entry is None:
+                return _MISS
+            expires_at, blob = entry
+            if expires_at < time.time():
+                del self.front[full_key]
+                return _MISS
+            self.front.move_to_end(full_key)
+        return _decoder.decode(blob)
+
+    def _front_put(self, full_key: Tuple[str, str], expires_at: float, blob: bytes) -> None:
+        with self._front_lock:
+            self.front[full_key] = (expires_at, blob)
+            self.front.move_to_end(full_key)
+            while len(self.front) > self.front_size:
+                self.front.popitem(last=False)
+
+    # -- both tiers -------------------------------------------------------
+
+    def _front_get_many(self, namespace: str, keys: Iterable[str], record: bool) -> Tuple[Dict[str, Any], List[str]]:
+        found: Dict[str, Any] = {}
+        missing: List[str] = []
+        for key in keys:
+            value = self._front_get((namespace, key))
+            if value is _MISS:
+                missing.append(key)
+            else:
+                found[key] = value
+                self.stats["front_hits"] += record
+        return found, missing
+
+    def _shared_get_many(self, namespace: str, keys: List[str], record: bool) -> Dict[str, Any]:
+        found: Dict[str, Any] = {}
+        conn = self._conn()
+        now = time.time()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start : start + 500]
+            rows = conn.execute(
+                f"SELECT key, value, expires_at FROM cache WHERE namespace = ? AND key IN ({','.join('?' * len(chunk))})"
+                " AND expires_at >= ?",
+                (namespace, *chunk, now),
+            ).fetchall()
+            for key, blob, expires_at in rows:
+                self._front_put((namespace, key), expires_at, blob)
+                found[key] = _decoder.decode(blob)
+        if found:
+            self._count_hits(namespace, found)
+        if record:
+            self.stats["shared_hits"] += len(found)
+            self.stats["misses"] += len(keys) - len(found)
+        return found
+
+    def _count_hits(self, namespace: str, keys: Iterable[str]) -> None:
+        with self._hits_lock:
+            self._pending_hits.update((namespace, key) for key in keys)
+            if time.monotonic() - self._hits_flushed_at < settings.SHARED_CACHE_HITS_FLUSH_S:
+                return
+            pending, self._pending_hits = self._pending_hits, Counter()
+            self._hits_flushed_at = time.monotonic()
+        try:
+            self._write(
+                "UPDATE cache SET hits = hits + ? WHERE namespace = ? AND key = ?",
+                [(count, namespace, key) for (namespace, key), count in pending.items()],
+            )
+        except sqlite3.OperationalError as e:
+            # Hit counts only order warm(); losing a batch under lock contention is harmless
+            logger.warning("Shared cache hit counts not written: %r", e)
+
+    def get_many(self, namespace: str, keys: Iterable[str], record: bool = True) -> Dict[str, Any]:
+        """Cached values for whichever of `keys` are present; `record=False` leaves the stats alone."""
+        if not self.enabled:
+            return {}
+        found, missing = self._front_get_many(namespace, keys, record)
+        if missing:
+            found.update(self._shared_get_many(namespace, missing, record))
+        return found
+
+    async def aget_many(self, namespace: str, keys: Iterable[str], record: bool = True) -> Dict[str, Any]:
+        """get_many with the shared tier read in a thread."""
+        if not self.enabled:
+            return {}
+        found, missing = self._front_get_many(namespace, keys, record)
+        if missing:
+            found.update(await asyncio.to_thread(self._shared_get_many, namespace, missing, record))
+        return found
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        return self.get_many(namespace, [key]).get(key, default)
+
+    async def aget(self, namespace: str, key: str, default: Any = None) -> Any:
+        return (await self.aget_many(namespace, [key])).get(key, default)
+
+    def _front_put_many(self, namespace: str, items: Dict[str, Any], ttl: Optional[float]) -> List[tuple]:
+        expires_at = time.time() + (settings.SHARED_CACHE_TTL_S if ttl is None else ttl)
+        rows = []
+        for key, value in items.items():
+            blob = _encoder.encode(value)
+            self._front_put((namespace, key), expires_at, blob)
+            rows.append((namespace, key, blob, expires_at))
+        return rows
+
+    def _shared_put_many(self, rows: List[tuple]) -> None:
+        self._write(
+            "INSERT INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            rows,
+        )
+
+    def set_many(self, namespace: str, items: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        if not self.enabled or not items:
+            return
+        self._shared_put_many(self._front_put_many(namespace, items, ttl))
+
+    async def aset_many(self, namespace: str, items: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        """set_many with the shared tier written in a thread."""
+        if not self.enabled or not items:
+            return
+        await asyncio.to_thread(self._shared_put_many, self._front_put_many(namespace, items, ttl))
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.set_many(namespace, {key: value}, ttl)
+
+    # -- single flight across processes -----------------------------------
+
+    def _try_lease(self, namespace: str, key: str) -> bool:
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM cache_leases WHERE namespace = ? AND key = ? AND expires_at < ?", (namespace, key, now)
+            )
+            taken = conn.execute(
+                "INSERT OR IGNORE INTO cache_leases (namespace, key, owner, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, os.getpid(), now + settings.SHARED_CACHE_LEASE_S),
+            ).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return taken == 1
+
+    def _release_lease(self, namespace: str, key: str) -> None:
+        self._conn().execute(
+            "DELETE FROM cache_leases WHERE namespace = ? AND key = ? AND owner = ?", (namespace, key, os.getpid())
+        )
+
+    async def get_or_compute(
+        self,
+        namespace: str,
+        key: str,
+        compute: Callable[[], Awaitable[Optional[T]]],
+        ttl: Optional[float] = None,
+    ) -> Optional[T]:
+        """
+        Cached value, or `compute()` stored for next time. None results are not
+        cached. While another worker holds the lease for `key`, wait for its
+        result (up to SHARED_CACHE_LEASE_S) instead of computing in parallel.
+        """
+        if not self.enabled:
+            return await compute()
+        value = await self.aget(namespace, key, _MISS)
+        if value is not _MISS:
+            return value
+
+        give_up_at = time.monotonic() + settings.SHARED_CACHE_LEASE_S
+        while not await asyncio.to_thread(self._try_lease, namespace, key):
+            self.stats["lease_waits"] += 1
+            await asyncio.sleep(0.05)
+            found = await self.aget_many(namespace, [key], record=False)
+            if key in found:
+                return found[key]
+            if time.monotonic() >= give_up_at:
+                return await compute()
+
+        try:
+            value = await compute()
+            if value is not None:
+                await self.aset_many(namespace, {key: value}, ttl)
+            return value
+        finally:
+            await asyncio.to_thread(self._release_lease, namespace, key)
+
+    def warm(self, limit: int) -> int:
+        """Load the most-hit shared entries into this worker's front cache."""
+        if not self.enabled or limit <= 0:
+            return 0
+        rows = self._conn().execute(
+            "SELECT namespace, key, value, expires_at FROM cache WHERE expires_at >= ? ORDER BY hits DESC LIMIT ?",
+            (time.time(), min(limit, self.front_size)),
+        ).fetchall()
+        for namespace, key, blob, expires_at in reversed(rows):
+            self._front_put((namespace, key), expires_at, blob)
+        return len(rows)
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.stats["front_hits"] + self.stats["shared_hits"] + self.stats["misses"]
+        return {
+            "enabled": self.enabled,
+            "front_entries": len(self.front),
+            **self.stats,
+            "hit_rate": round((lookups - self.stats["misses"]) / lookups, 4) if lookups else None,
+        }
+
+
+shared_cache = SharedCache(front_size=settings.SHARED_CACHE_FRONT_SIZE, enabled=settings.SHARED_CACHE_ENABLED)
@@ -0,0 +1,254 @@
+"""
+Local classifier producing the AIAnalysisResult fields (sub-label, polarity,
+magnitude) from an event's embedding, so routine scoring needs no LLM call.
+
+Three linear heads over the normalised embedding, in NumPy:
+- softmax regression over the sub-labels seen in training
+- logistic regression for is_improvement
+- ridge regression for magnitude (clipped to 0..1)
+
+Training targets come from past analyzer output (ai_diagnostic_results): the
+sub-label whose score lies furthest from DEFAULT_SCORE is the one the event was
+about, its side of DEFAULT_SCORE is the polarity and its distance the magnitude
+(see `derive_target`). `python -m app.commands.train_sublabel_classifier`
+trains, writes the model and an evaluation report to the storage directory.
+
+`classify_event` answers locally when the prediction's confidence reaches
+SUBLABEL_CLASSIFIER_MIN_CONFIDENCE and escalates to Gemini otherwise.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.prompts import ChatPromptTemplate
+
+from app.constants import DEFAULT_SCORE
+from app.services.prompt_budget import compact_sublabel_table, truncate_to_tokens
+from app.services.resilience import gemini_chat
+from app.services.sublabel_ranker import ALL_SUBLABELS, select_sublabels
+from app.settings import settings
+from app.storage import storage_dir
+
+logger = logging.getLogger(__name__)
+
+SUBLABEL_NAMES = {member.value for member in ALL_SUBLABELS}
+
+
+@dataclass
+class Prediction:
+    sublabel: str
+    is_improvement: bool
+    magnitude: float
+    confidence: float
+    source: str = "local"  # "local" or "llm"
+
+    def public(self) -> Dict:
+        return asdict(self)
+
+
+def derive_target(sublabel_scores: Dict[str, float]) -> Optional[Tuple[str, bool, float]]:
+    """(sub-label, is_improvement, magnitude) implied by one analyzer result, or None."""
+    scored = [(name, float(score)) for name, score in (sublabel_scores or {}).items() if name in SUBLABEL_NAMES]
+    if not scored:
+        return None
+    name, score = max(scored, key=lambda item: abs(item[1] - DEFAULT_SCORE))
+    magnitude = min(1.0, abs(score - DEFAULT_SCORE) / DEFAULT_SCORE)
+    return name, score >= DEFAULT_SCORE, round(magnitude, 3)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=-1, keepdims=True), 1e-12)
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class SublabelClassifier:
+    def __init__(self, classes: Sequence[str], weights: Dict[str, np.ndarray], trained_on: int) -> None:
+        self.classes = list(classes)
+        self.w = weights
+        self.trained_on = trained_on
+
+    @property
+    def dimensions(self) -> int:
+        return int(self.w["w_cls"].shape[0])
+
+    @classmethod
+    def fit(
+        cls,
+        vectors: np.ndarray,
+        sublabels: Sequence[str],
+        improvements: Sequence[bool],
+        magnitudes: Sequence[float],
+        epochs: int = 400,
+        learning_rate: float = 2.0,
+        l2: float = 1e-4,
+    ) -> "SublabelClassifier":
+        x = _normalize(vectors)
+        n, dim = x.shape
+        classes = sorted(set(sublabels))
+        index = {name: i for i, name in enumerate(classes)}
+        y = np.zeros((n, len(classes)), dtype=np.float32)
+        y[np.arange(n), [index[name] for name in sublabels]] = 1.0
+        polarity = np.asarray(improvements, dtype=np.float32)
+
+        # Full-batch gradient descent; the inputs are unit vectors, so a large step is stable
+        w_cls = np.zeros((dim, len(classes)), dtype=np.float32)
+        b_cls = np.log((y.mean(axis=0) + 1e-6)).astype(np.float32)
+        w_pol = np.zeros(dim, dtype=np.float32)
+        b_pol = np.float32(np.log((polarity.mean() + 1e-6) / (1 - polarity.mean() + 1e-6)))
+        for _ in range(epochs):
+            error = _softmax(x @ w_cls + b_cls) - y
+            w_cls -= learning_rate * (x.T @ error / n + l2 * w_cls)
+            b_cls -= learning_rate * error.mean(axis=0)
+            error = _sigmoid(x @ w_pol + b_pol) - polarity
+            w_pol -= learning_rate * (x.T @ error / n + l2 * w_pol)
+            b_pol -= learning_rate * error.mean()
+
+        # Ridge regression in closed form, with the bias as an unpenalised column
+        design = np.hstack([x, np.ones((n, 1), dtype=np.float32)])
+        penalty = np.eye(dim + 1, dtype=np.float32) * 1e-1
+        penalty[-1, -1] = 0.0
+        w_mag = np.linalg.solve(design.T @ design + penalty, design.T @ np.asarray(magnitudes, dtype=np.float32))
+
+        weights = {"w_cls": w_cls, "b_cls": b_cls, "w_pol": w_pol, "b_pol": np.array(b_pol), "w_mag": w_mag}
+        return cls(classes, weights, trained_on=n)
+
+    def predict_many(self, vectors: np.ndarray) -> List[Prediction]:
+        x = _normalize(np.atleast_2d(vectors))
+        probabilities = _softmax(x @ self.w["w_cls"] + self.w["b_cls"])
+        improvement = _sigmoid(x @ self.w["w_pol"] + self.w["b_pol"])
+        magnitude = np.clip(np.hstack([x, np.ones((len(x), 1), dtype=np.float32)]) @ self.w["w_mag"], 0.0, 1.0)
+        best = probabilities.argmax(axis=1)
+        confidence = probabilities[np.arange(len(x)), best] * np.maximum(improvement, 1 - improvement)
+        return [
+            Prediction(
+                sublabel=self.classes[best[i]],
+                is_improvement=bool(improvement[i] >= 0.5),
+                magnitude=round(float(magnitude[i]), 3),
+                confidence=round(float(confidence[i]), 4),
+            )
+            for i in range(len(x))
+        ]
+
+    def top_k(self, vectors: np.ndarray, k: int) -> List[List[str]]:
+        probabilities = _softmax(_normalize(np.atleast_2d(vectors)) @ self.w["w_cls"] + self.w["b_cls"])
+        return [[self.classes[i] for i in row] for row in np.argsort(-probabilities, axis=1)[:, :k]]
+
+    def save(self, path: Path) -> None:
+        tmp = path.with_suffix(".tmp.npz")
+        np.savez(tmp, classes=np.array(self.classes), trained_on=self.trained_on, **self.w)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "SublabelClassifier":
+        with np.load(path) as data:
+            weights = {key: data[key] for key in ("w_cls", "b_cls", "w_pol", "b_pol", "w_mag")}
+            return cls(data["classes"].tolist(), weights, trained_on=int(data["trained_on"]))
+
+
+def model_path() -> Path:
+    return storage_dir() / "sublabel_classifier.npz"
+
+
+_loaded: Tuple[Optional[float], Optional[SublabelClassifier]] = (None, None)
+
+
+def get_classifier() -> Optional[SublabelClassifier]:
+    """The trained model, reloaded when the training command has replaced the file."""
+    global _loaded
+    path = model_path()
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    if _loaded[0] != mtime:
+        _loaded = (mtime, SublabelClassifier.load(path))
+    return _loaded[1]
+
+
+CLASSIFY_PROMPT_TEMPLATE = """
+    You are doing event classification for a self-improvement app. Read the user's
+    logged event and decide which ONE sub-label it is mainly about, whether it shows
+    the user improving (true) or slipping (false), and how significant it is.
+
+    Candidate sub-labels (label: sub-label(severity)):
+    {sublabels}
+
+    Event:
+    {text}
+
+    Return ONLY JSON: {{"sublabel": "<one candidate sub-label>", "is_improvement": true|false, "magnitude": 0.0-1.0}}
+"""
+
+
+async def _classify_with_llm(text: str) -> Optional[Prediction]:
+    from app.services.diagnostic import get_llm  # heavy import, only needed when escalating
+
+    llm = get_llm()
+    if llm is None:
+        return None
+    candidates = await select_sublabels(text)
+    chain = ChatPromptTemplate.from_template(CLASSIFY_PROMPT_TEMPLATE) | llm
+    try:
+        response = await gemini_chat.call(lambda: chain.ainvoke({
+            "sublabels": compact_sublabel_table(candidates),
+            "text": truncate_to_tokens(text, 800),
+        }))
+        content = response.content.strip().removeprefix("```json").removeprefix("```").removesuffix("```")
+        data = json.loads(content)
+        if data["sublabel"] not in SUBLABEL_NAMES:
+            raise ValueError(f"Unknown sub-label {data['sublabel']!r}")
+        return Prediction(
+            sublabel=data["sublabel"],
+            is_improvement=bool(data["is_improvement"]),
+            magnitude=round(min(1.0, max(0.0, float(data.get("magnitude", 1.0)))), 3),
+            confidence=1.0,
+            source="llm",
+        )
+    except Exception as e:
+        logger.warning("LLM event classification failed: %r", e)
+        return None
+
+
+async def classify_event(text: Optional[str], vector: Optional[Sequence[float]]) -> Optional[Prediction]:
+    """
+    Local prediction when it is confident enough, else the LLM's answer. Falls
+    back to the low-confidence local prediction if the LLM is unavailable.
+
+    A vector whose dimensions differ from the model's (e.g. after switching
+    embedding models) is not classified locally; the text goes to the LLM, and
+    without text a ValueError is raised.
+    """
+    local = None
+    classifier = get_classifier() if settings.SUBLABEL_CLASSIFIER_ENABLED else None
+    if classifier is not None and vector is not None and len(vector) != classifier.dimensions:
+        if not text:
+            raise ValueError(f"Expected {classifier.dimensions} dimensions, got {len(vector)}")
+        logger.warning(
+            "Embedding has %d dimensions, classifier expects %d; escalating", len(vector), classifier.dimensions
+        )
+        vector = None
+    if classifier is not None and vector is not None:
+        local = classifier.predict_many(np.asarray(vector, dtype=np.float32))[0]
+        if local.confidence >= settings.SUBLABEL_CLASSIFIER_MIN_CONFIDENCE:
+            return local
+    if text:
+        escalated = await _classify_with_llm(text)
+        if escalated is not None:
+            return escalated
+    return local
@@ -0,0 +1,182 @@
+"""
+Local pre-ranking of sub-labels for the diagnostic analyzer.
+
+Scores every sub-label against the conversation before the LLM call so the
+prompt only lists the top-N candidates. The default model is lexical (BM25 over
+the descriptions in app/data/sublabel_descriptions.py); "embedding" and "hybrid"
+compare a query embedding to cached description embeddings instead of, or as
+well as, the lexical scores.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+from app.data.sublabel_descriptions import SUBLABEL_DESCRIPTIONS
+from app.label import SubLabelBase
+from app.scoring_update import LABEL_TO_SUBLABEL_ENUM
+from app.services.fanout import fan_out
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+ALL_SUBLABELS: List[SubLabelBase] = [
+    member for enum_class in LABEL_TO_SUBLABEL_ENUM.values() for member in enum_class
+]
+
+_WORD = re.compile(r"[a-z]+(?:'[a-z]+)?")
+_STOPWORDS = frozenset(
+    "a an and are as at be been but by can could did do does for from had has have he her him his how i if in "
+    "into is it its just me my of on or our she so that the their them then there they this to too up us was "
+    "we were what when which who will with would you your about after all also am any because before get got "
+    "like more most much not now only other out over really some than very".split()
+)
+_SUFFIXES = ("ations", "ation", "ness", "ings", "ing", "ed", "ly", "es", "s")
+
+# Added to a sub-label's score when its name is mentioned outright (e.g. the
+# reflection's identification.sub_category)
+_NAME_MATCH_BONUS = 10.0
+
+
+def _stem(word: str) -> str:
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[: -len(suffix)]
+            break
+    # "blame" / "blamed" / "blaming" share a stem
+    return word[:-1] if word.endswith("e") and len(word) > 3 else word
+
+
+def tokenize(text: str) -> List[str]:
+    words = (word.replace("'", "") for word in _WORD.findall(text.lower()))
+    return [_stem(word) for word in words if len(word) > 1 and word not in _STOPWORDS]
+
+
+class LexicalSublabelModel:
+    """BM25 with sub-labels as documents (name words + description) and the conversation as the query."""
+
+    def __init__(self, descriptions: Dict[str, str], k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.docs: Dict[str, Counter] = {
+            name: Counter(tokenize(name.replace("_", " ") + " " + text)) for name, text in descriptions.items()
+        }
+        self.avg_len = sum(sum(doc.values()) for doc in self.docs.values()) / len(self.docs)
+        doc_freq: Counter = Counter(term for doc in self.docs.values() for term in doc)
+        n = len(self.docs)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    def score(self, text: str) -> Dict[str, float]:
+        query = Counter(tokenize(text))
+        lowered = text.lower()
+        scores: Dict[str, float] = {}
+        for name, doc in self.docs.items():
+            doc_len = sum(doc.values())
+            total = 0.0
+            for term, query_tf in query.items():
+                tf = doc.get(term)
+                if not tf:
+                    continue
+                norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * doc_len / self.avg_len))
+                # Repeated mentions in the conversation count, with diminishing returns
+                total += self.idf[term] * norm * (1 + math.log(query_tf))
+            if name in lowered or name.replace("_", " ") in lowered:
+                total += _NAME_MATCH_BONUS
+            scores[name] = total
+        return scores
+
+
+_lexical_model: Optional[LexicalSublabelModel] = None
+_description_vectors: Optional[Dict[str, List[float]]] = None
+
+
+def get_lexical_model() -> LexicalSublabelModel:
+    global _lexical_model
+    if _lexical_model is None:
+        _lexical_model = LexicalSublabelModel(SUBLABEL_DESCRIPTIONS)
+    return _lexical_model
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+async def _embedding_scores(text: str) -> Optional[Dict[str, float]]:
+    """Cosine similarity to each description; None when embeddings are unavailable."""
+    # Imported here: ai_service builds its Gemini clients at import time
+    from app.services.ai_service import generate_embedding, generate_embeddings_batch
+
+    global _description_vectors
+    if _description_vectors is not None:
+        query_vector = await generate_embedding(text)
+    else:
+        # First call: the description vectors and the query vector are independent
+        names = list(SUBLABEL_DESCRIPTIONS)
+        outcome = await fan_out({
+            "descriptions": generate_embeddings_batch(
+                [f"{name.replace('_', ' ')}: {SUBLABEL_DESCRIPTIONS[name]}" for name in names]
+            ),
+            "query": generate_embedding(text),
+        })
+        vectors = outcome.results.get("descriptions")
+        if not vectors:
+            return None
+        _description_vectors = dict(zip(names, vectors))
+        query_vector = outcome.results.get("query")
+
+    if not query_vector:
+        return None
+    return {name: _cosine(query_vector, vector) for name, vector in _description_vectors.items()}
+
+
+def _normalize(scores: Dict[str, float]) -> Dict[str, float]:
+    low, high = min(scores.values()), max(scores.values())
+    if high <= low:
+        return {name: 0.0 for name in scores}
+    return {name: (value - low) / (high - low) for name, value in scores.items()}
+
+
+async def score_sublabels(text: str, mode: Optional[str] = None) -> Dict[str, float]:
+    """Relevance of each sub-label to `text`; mode is "lexical", "embedding" or "hybrid"."""
+    mode = mode or settings.DIAGNOSTIC_SUBLABEL_PREFILTER
+    lexical = get_lexical_model().score(text)
+    if mode == "lexical":
+        return lexical
+
+    semantic = await _embedding_scores(text)
+    if semantic is None:
+        logger.warning("Sub-label pre-filter: embeddings unavailable, using lexical scores")
+        return lexical
+    if mode == "embedding":
+        return semantic
+    lexical_norm, semantic_norm = _normalize(lexical), _normalize(semantic)
+    return {name: lexical_norm[name] + semantic_norm[name] for name in lexical}
+
+
+async def select_sublabels(
+    text: str,
+    top_n: Optional[int] = None,
+    mode: Optional[str] = None,
+) -> List[SubLabelBase]:
+    """
+    The top_n sub-labels most relevant to `text`, in taxonomy order. Returns
+    the whole taxonomy when the pre-filter is off or nothing in the text
+    matches, so the analyzer is never left without candidates.
+    """
+    mode = mode or settings.DIAGNOSTIC_SUBLABEL_PREFILTER
+    top_n = top_n or settings.DIAGNOSTIC_SUBLABEL_TOP_N
+    if mode == "off" or top_n >= len(ALL_SUBLABELS):
+        return list(ALL_SUBLABELS)
+
+    scores = await score_sublabels(text, mode)
+    if max(scores.values()) <= 0:
+        return list(ALL_SUBLABELS)
+    ranked = sorted(ALL_SUBLABELS, key=lambda member: scores[member.value], reverse=True)
+    keep = set(ranked[:top_n])
+    return [member for member in ALL_SUBLABELS if member in keep]
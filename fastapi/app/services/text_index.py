@@ -0,0 +1,193 @@
+"""
+BM25 inverted index over reflection text, and rank fusion with vector search.
+
+Postings live in a SQLite file in the storage directory (shared by all
+workers, updated per event, kept across restarts), tokenised like the
+sub-label ranker (app/services/sublabel_ranker.py). Document frequencies and
+the total document length are maintained incrementally, so a query touches only
+the postings of its own terms.
+
+`rrf` fuses ranked lists by reciprocal rank, so lexical and vector results can
+be combined without calibrating their scores against each other.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.services.ann_index import SearchFilter
+from app.services.sublabel_ranker import tokenize
+from app.settings import settings
+from app.storage import storage_dir
+
+K1 = 1.2
+B = 0.75
+RRF_K = 60
+
+
+class TextIndex:
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self._path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            path = self._path or storage_dir() / "text_index.sqlite"
+            conn = sqlite3.connect(path, timeout=settings.DB_BUSY_TIMEOUT / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS docs (
+                    id INTEGER PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    public INTEGER NOT NULL,
+                    label TEXT,
+                    length INTEGER NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    doc_id INTEGER NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, doc_id)
+                ) WITHOUT ROWID
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), docs INTEGER, length INTEGER)"
+            )
+            conn.execute("INSERT OR IGNORE INTO totals (id, docs, length) VALUES (0, 0, 0)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _remove(self, conn: sqlite3.Connection, doc_id: int) -> bool:
+        row = conn.execute("SELECT length FROM docs WHERE id = ?", (doc_id,)).fetchone()
+        if row is None:
+            return False
+        terms = [term for (term,) in conn.execute("SELECT term FROM postings WHERE doc_id = ?", (doc_id,))]
+        conn.executemany("UPDATE terms SET df = df - 1 WHERE term = ?", [(term,) for term in terms])
+        # Only this doc's terms can have dropped to zero; each is a primary key lookup
+        conn.executemany("DELETE FROM terms WHERE term = ? AND df <= 0", [(term,) for term in terms])
+        conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+        conn.execute("DELETE FROM docs WHERE id = ?", (doc_id,))
+        conn.execute("UPDATE totals SET docs = docs - 1, length = length - ? WHERE id = 0", (row[0],))
+        return True
+
+    def upsert(self, doc_id: int, text: str, user_id: int, public: bool = False, label: Optional[str] = None) -> None:
+        counts = Counter(tokenize(text))
+        length = sum(counts.values())
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._remove(conn, doc_id)
+            conn.execute(
+                "INSERT INTO docs (id, user_id, public, label, length) VALUES (?, ?, ?, ?, ?)",
+                (doc_id, user_id, int(public), label, length),
+            )
+            conn.executemany(
+                "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                [(term, doc_id, tf) for term, tf in counts.items()],
+            )
+            conn.executemany(
+                "INSERT INTO terms (term, df) VALUES (?, 1) ON CONFLICT (term) DO UPDATE SET df = df + 1",
+                [(term,) for term in counts],
+            )
+            conn.execute("UPDATE totals SET docs = docs + 1, length = length + ? WHERE id = 0", (length,))
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, doc_id: int) -> bool:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            removed = self._remove(conn, doc_id)
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return removed
+
+    def search(self, query: str, k: int = 10, where: Optional[SearchFilter] = None) -> List[Tuple[int, float]]:
+        """(doc id, BM25 score) pairs, best first."""
+        query_terms = Counter(tokenize(query))
+        if not query_terms:
+            return []
+        conn = self._conn()
+        docs, total_length = conn.execute("SELECT docs, length FROM totals WHERE id = 0").fetchone()
+        if not docs:
+            return []
+        avg_length = total_length / docs
+
+        placeholders = ",".join("?" * len(query_terms))
+        weights = [
+            (term, math.log(1 + (docs - df + 0.5) / (df + 0.5)) * query_terms[term])
+            for term, df in conn.execute(f"SELECT term, df FROM terms WHERE term IN ({placeholders})", list(query_terms))
+        ]
+        if not weights:
+            return []
+
+        conditions, params = [], []
+        where = where or SearchFilter()
+        if where.user_id is not None:
+            conditions.append("d.user_id = ?")
+            params.append(where.user_id)
+        if where.exclude_user_id is not None:
+            conditions.append("d.user_id != ?")
+            params.append(where.exclude_user_id)
+        if where.public_only:
+            conditions.append("d.public = 1")
+        if where.label is not None:
+            conditions.append("d.label = ?")
+            params.append(where.label)
+
+        rows = conn.execute(
+            f"""
+            WITH w(term, weight) AS (VALUES {",".join("(?, ?)" for _ in weights)})
+            SELECT p.doc_id,
+                   SUM(w.weight * p.tf * {K1 + 1} / (p.tf + {K1} * (1 - {B} + {B} * d.length / ?))) AS score
+            FROM w
+            JOIN postings p ON p.term = w.term
+            JOIN docs d ON d.id = p.doc_id
+            {"WHERE " + " AND ".join(conditions) if conditions else ""}
+            GROUP BY p.doc_id
+            ORDER BY score DESC
+            LIMIT ?
+            """,
+            [value for pair in weights for value in pair] + [avg_length] + params + [k],
+        ).fetchall()
+        return [(doc_id, score) for doc_id, score in rows]
+
+    def stats(self) -> Dict:
+        conn = self._conn()
+        docs, length = conn.execute("SELECT docs, length FROM totals WHERE id = 0").fetchone()
+        terms = conn.execute("SELECT COUNT(*) FROM terms").fetchone()[0]
+        return {"docs": docs, "terms": terms, "avg_length": round(length / docs, 1) if docs else 0}
+
+
+def rrf(rankings: Iterable[Sequence[int]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    """Reciprocal rank fusion: each list contributes 1 / (k + rank) to the ids it ranks."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+text_index = TextIndex()
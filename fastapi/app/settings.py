@@ -13,6 +13,122 @@ class Settings(BaseSettings):  # type: ignore
     DB_USERNAME: str = "root"
     DB_PASSWORD: str = ""
 
+    # Files owned by the service (job queue, caches, indexes); relative to the repo root
+    FASTAPI_STORAGE_PATH: str = "storage/app/fastapi"
+
+    # SQLite tuning (see app/database.py). DB_BUSY_TIMEOUT / DB_JOURNAL_MODE /
+    # DB_SYNCHRONOUS are shared with Laravel's config/database.php.
+    DB_BUSY_TIMEOUT: int = 5000  # ms
+    DB_JOURNAL_MODE: str = "WAL"
+    DB_SYNCHRONOUS: str = "NORMAL"
+    DB_SQLITE_CACHE_KB: int = 16384
+    DB_SQLITE_MMAP_BYTES: int = 268435456
+    DB_READ_POOL_SIZE: int = 8
+    DB_WRITE_POOL_SIZE: int = 2
+
+    # Where stateful scoring keeps canonical scores: "memory" or "database"
+    SCORE_STORE: str = "memory"
+
+    # Scoring weight tables (see app/weights.py): the version live scoring
+    # uses, and the directory of <version>.json tables, relative to the repo root
+    SCORING_WEIGHTS_VERSION: str = "v1"
+    SCORING_WEIGHTS_PATH: str = "fastapi/app/data/weights"
+
+    # Diagnostic analyzer prompt budget, in estimated tokens (see app/services/prompt_budget.py)
+    DIAGNOSTIC_PROMPT_TOKEN_BUDGET: int = 6000
+    DIAGNOSTIC_EVENT_CONTEXT_TOKENS: int = 800
+    DIAGNOSTIC_MIN_TRANSCRIPT_TOKENS: int = 512
+
+    # Sub-label pre-filter before the analyzer (see app/services/sublabel_ranker.py):
+    # "lexical", "embedding", "hybrid" or "off" (send the whole taxonomy). Off by default:
+    # lexical recall@24 on bench/sublabel_recall.py's held-out cases is below 0.5
+    DIAGNOSTIC_SUBLABEL_PREFILTER: str = "off"
+    DIAGNOSTIC_SUBLABEL_TOP_N: int = 24
+
+    # Concurrent upstream calls (see app/services/fanout.py)
+    LLM_MAX_CONCURRENCY: int = 16
+    FANOUT_TASK_TIMEOUT_S: float = 30.0
+    EMBEDDING_BATCH_CHUNK: int = 25  # texts per concurrent embed_documents call
+
+    # Request deadlines and Gemini resilience (see app/deadline.py, app/services/resilience.py)
+    REQUEST_DEADLINE_S: float = 60.0  # used when the client sends no X-Request-Timeout
+    DEADLINE_HEADROOM_S: float = 0.5
+    UPSTREAM_TIMEOUT_S: float = 25.0  # per attempt
+    UPSTREAM_MAX_RETRIES: int = 2
+    RETRY_BASE_DELAY_S: float = 0.2
+    RETRY_MAX_DELAY_S: float = 2.0
+    RETRY_BUDGET_RATIO: float = 0.2
+    HEDGE_QUANTILE: float = 0.95
+    BREAKER_FAILURE_THRESHOLD: int = 5
+    BREAKER_RESET_S: float = 30.0
+
+    # Background jobs (see app/services/jobs.py)
+    JOB_WORKERS: int = 4
+    JOB_QUEUE_MAX_DEPTH: int = 200
+    JOB_QUEUE_PERSIST: bool = False  # mirror the queue to storage/app/fastapi/jobs.sqlite
+    JOB_TIMEOUT_S: float = 120.0
+    JOB_RESULT_TTL_S: float = 3600.0
+    JOB_CALLBACK_TIMEOUT_S: float = 10.0
+    JOB_CALLBACK_SECRET: str = ""  # signs callback bodies (X-Signature: sha256=...); callback_url is refused without it
+    JOB_CALLBACK_ALLOWED_ORIGINS: str = ""  # comma-separated scheme://host[:port]; empty = APP_URL's origin
+    APP_URL: str = "http://localhost"  # Laravel's base URL, read from the shared .env
+
+    # Multi-worker serving and the shared cache (see app/commands/serve.py, app/services/shared_cache.py)
+    FASTAPI_WORKERS: int = 1
+    GRACEFUL_SHUTDOWN_S: int = 30
+    SHARED_CACHE_ENABLED: bool = True
+    SHARED_CACHE_FRONT_SIZE: int = 2048  # entries per worker
+    SHARED_CACHE_TTL_S: float = 30 * 24 * 3600.0
+    SHARED_CACHE_LEASE_S: float = 30.0
+    SHARED_CACHE_HITS_FLUSH_S: float = 10.0  # how often a worker writes its shared-tier hit counts
+    SHARED_CACHE_WARM_ENTRIES: int = 512
+
+    # Near-duplicate reuse before embedding (see app/services/near_duplicates.py):
+    # "off", "reuse" (return the near-duplicate's vector) or "skip" (also return no
+    # vector when the near-duplicate is an earlier version of the same doc_id)
+    EMBEDDING_DEDUPE_POLICY: str = "reuse"
+    EMBEDDING_DEDUPE_MAX_DISTANCE: float = 0.1  # Jaccard distance over word 3-shingles
+    EMBEDDING_DEDUPE_PERMUTATIONS: int = 128
+    EMBEDDING_DEDUPE_BANDS: int = 16  # LSH bands of PERMUTATIONS / BANDS rows each
+
+    # Cross-user ANN index (see app/services/ann_index.py)
+    ANN_NLIST: int = 256  # coarse lists; capped at training rows / 39
+    ANN_PQ_SUBSPACES: int = 48  # one-byte PQ codes per vector
+    ANN_NPROBE: int = 16
+    ANN_RERANK: int = 10  # PQ candidates re-ranked exactly, per result
+    ANN_TRAIN_MIN: int = 2000  # searches are exact until this many rows
+    ANN_EXACT_MAX: int = 2048  # filters matching at most this many rows are searched exactly
+
+    # Binary embedding store (see app/services/embedding_store.py)
+    EMBEDDING_STORE_FSYNC: bool = True  # fsync vectors before the index records that point at them
+
+    # Materialised per-event neighbour lists (see app/services/neighbor_lists.py)
+    NEIGHBOR_LIST_K: int = 10
+
+    # Local sub-label classifier (see app/services/sublabel_classifier.py)
+    SUBLABEL_CLASSIFIER_ENABLED: bool = True
+    SUBLABEL_CLASSIFIER_MIN_CONFIDENCE: float = 0.6  # below this, the event is sent to the LLM
+
+    # Cohort percentile sketches (see app/services/percentiles.py)
+    PERCENTILE_SKETCHES: bool = True
+    PERCENTILE_COMPRESSION: float = 200  # t-digest size: ~compression centroids, error shrinks as it grows
+    PERCENTILE_FLUSH_SECONDS: float = 5.0  # how often a worker merges its observations into the shared sketches
+
+    # Quiz report cache (see app/services/quiz_reports.py)
+    QUIZ_REPORT_CACHE: str = "answers"  # "answers", "profile" or "off"
+    QUIZ_REPORT_PROFILE_TOLERANCE: float = 5.0  # profile mode: label scores are bucketed this many points wide
+
+    # Score event log (see app/services/score_log.py)
+    SCORE_LOG_ENABLED: bool = True
+    SCORE_LOG_SNAPSHOT_EVERY: int = 100  # analyses between snapshots of a user's state
+
+    # What-if simulation (see app/services/score_simulation.py)
+    SIMULATION_MAX_TRAJECTORIES: int = 20000
+    SIMULATION_MAX_EVENTS: int = 5_000_000  # trajectories x the longest trajectory's events, per request
+
+    # Render responses with orjson (see app/responses.py)
+    FAST_JSON_RESPONSES: bool = True
+
     model_config = {
         "env_file": str(Path(__file__).resolve().parents[2] / ".env"),
         "extra": "allow",
@@ -0,0 +1,12 @@
+from pathlib import Path
+
+from .settings import settings
+
+
+def storage_dir() -> Path:
+    """Directory for files the service owns (queues, caches, indexes); created on first use."""
+    path = Path(settings.FASTAPI_STORAGE_PATH)
+    if not path.is_absolute():
+        path = Path(__file__).resolve().parents[2] / path
+    path.mkdir(parents=True, exist_ok=True)
+    return path
@@ -0,0 +1,131 @@
+"""
+Versioned weight tables for score updates (SCORING_WEIGHTS_VERSION).
+
+The built-in "v1" is the severities in app/label.py plus the constants in
+app/constants.py; other versions are JSON files in SCORING_WEIGHTS_PATH.
+`python -m app.commands.weights` lists, shows and copies them.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import re
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from pathlib import Path
+
+from app.constants import BASE_PENALTY, BASE_REWARD, SEVERITY_MULTIPLIER
+from app.label import LABEL_TO_SUBLABEL_ENUM
+from app.settings import settings
+
+BUILTIN_WEIGHTS_VERSION = "v1"
+_VERSION_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+
+@dataclass(frozen=True)
+class WeightTable:
+    """
+    Everything that decides how an analysis moves a score, as one versioned table.
+    The built-in "v1" holds the severities in app/label.py and the constants in
+    app/constants.py. Other versions are JSON files in SCORING_WEIGHTS_PATH (see
+    load_weights). A published version must never be edited: add a new one.
+    """
+
+    base_reward: float = BASE_REWARD
+    base_penalty: float = BASE_PENALTY
+    severity_multiplier: float = SEVERITY_MULTIPLIER
+    # (sub-label, severity) in taxonomy order, the order the weighted sums run in
+    severities: tuple[tuple[str, float], ...] = tuple(
+        (member.value, member.severity) for enum_class in LABEL_TO_SUBLABEL_ENUM.values() for member in enum_class
+    )
+    version: str = BUILTIN_WEIGHTS_VERSION
+
+    @cached_property
+    def severity(self) -> dict[str, float]:
+        return dict(self.severities)
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifies the values (not the version name), e.g. to tell which snapshots were computed with them."""
+        values = (self.base_reward, self.base_penalty, self.severity_multiplier, self.severities)
+        return hashlib.sha1(repr(values).encode()).hexdigest()[:12]
+
+    def to_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "base_reward": self.base_reward,
+            "base_penalty": self.base_penalty,
+            "severity_multiplier": self.severity_multiplier,
+            "severities": dict(self.severities),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> WeightTable:
+        """Validate a table in the to_dict layout. Raises ValueError."""
+        missing = {"version", "base_reward", "base_penalty", "severity_multiplier", "severities"} - set(data)
+        if missing:
+            raise ValueError(f"weight table is missing {sorted(missing)}")
+        version = data["version"]
+        if not isinstance(version, str) or not _VERSION_NAME.match(version):
+            raise ValueError(f"invalid weight table version {version!r}")
+
+        def number(name: str, value) -> float:
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0:
+                raise ValueError(f"{version}: {name} must be a non-negative number, got {value!r}")
+            return value
+
+        given = data["severities"]
+        taxonomy = [member.value for enum_class in LABEL_TO_SUBLABEL_ENUM.values() for member in enum_class]
+        if not isinstance(given, dict) or set(given) != set(taxonomy):
+            known = set(given) if isinstance(given, dict) else set()
+            raise ValueError(
+                f"{version}: severities must list every sub-label exactly once "
+                f"(missing {sorted(set(taxonomy) - known)}, unknown {sorted(known - set(taxonomy))})"
+            )
+        severities = tuple((key, number(key, given[key])) for key in taxonomy)
+        if sum(severity for _, severity in severities) <= 0:
+            raise ValueError(f"{version}: severities must not all be zero")
+        return cls(
+            base_reward=number("base_reward", data["base_reward"]),
+            base_penalty=number("base_penalty", data["base_penalty"]),
+            severity_multiplier=number("severity_multiplier", data["severity_multiplier"]),
+            severities=severities,
+            version=version,
+        )
+
+
+def weights_dir() -> Path:
+    path = Path(settings.SCORING_WEIGHTS_PATH)
+    if not path.is_absolute():
+        path = Path(__file__).resolve().parents[2] / path
+    return path
+
+
+@lru_cache(maxsize=None)
+def load_weights(version: str) -> WeightTable:
+    """The weight table `version`: the built-in one or `<SCORING_WEIGHTS_PATH>/<version>.json`. Raises ValueError."""
+    if version == BUILTIN_WEIGHTS_VERSION:
+        return WeightTable()
+    if not _VERSION_NAME.match(version):
+        raise ValueError(f"invalid weight table version {version!r}")
+    path = weights_dir() / f"{version}.json"
+    try:
+        table = WeightTable.from_dict(json.loads(path.read_text()))
+    except FileNotFoundError:
+        raise ValueError(f"unknown weight table version {version!r} (no {path})")
+    if table.version != version:
+        raise ValueError(f"{path} declares version {table.version!r}")
+    return table
+
+
+def active_weights() -> WeightTable:
+    """The table live scoring uses (SCORING_WEIGHTS_VERSION)."""
+    return load_weights(settings.SCORING_WEIGHTS_VERSION)
+
+
+def available_weights() -> list[str]:
+    path = weights_dir()
+    files = sorted(p.stem for p in path.glob("*.json")) if path.is_dir() else []
+    return [BUILTIN_WEIGHTS_VERSION] + [version for version in files if version != BUILTIN_WEIGHTS_VERSION]
@@ -0,0 +1,76 @@
+"""
+Recall and latency of the ANN index (app/services/ann_index.py) against exact search.
+
+Builds an index of synthetic clustered vectors in a temporary directory, then for
+each nprobe reports recall@k (share of the exact top-k that the ANN search
+returns) and per-query latency, unfiltered and with a public-only filter.
+
+    uv run python -m bench.ann_recall --rows 20000 --nprobe 1,4,16,64
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.services.ann_index import AnnIndex, SearchFilter
+from app.settings import settings
+
+
+def _dataset(rows: int, dim: int, topics: int, seed: int = 0) -> np.ndarray:
+    # Reflections cluster by topic; a few hundred topics with wide spread is a fair stand-in
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(topics, dim))
+    return (centers[rng.integers(topics, size=rows)] + rng.normal(scale=2.5, size=(rows, dim))).astype(np.float32)
+
+
+def _timed(index: AnnIndex, queries: np.ndarray, k: int, where: SearchFilter, **kwargs):
+    started = time.perf_counter()
+    results = [{n.id for n in index.search(q, k, where, **kwargs)} for q in queries]
+    return results, (time.perf_counter() - started) * 1000 / len(queries)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--topics", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", default="1,2,4,8,16,32,64")
+    opts = parser.parse_args()
+
+    data = _dataset(opts.rows + opts.queries, opts.dim, opts.topics)
+    vectors, queries = data[: opts.rows], data[opts.rows :]
+    rng = np.random.default_rng(1)
+    public = rng.random(opts.rows) < 0.3
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = AnnIndex(Path(tmp))
+        started = time.perf_counter()
+        for start in range(0, opts.rows, 1000):
+            index.upsert_many([
+                (i, vectors[i], i % 500, bool(public[i]), None) for i in range(start, min(opts.rows, start + 1000))
+            ])
+        inserted = time.perf_counter() - started
+        started = time.perf_counter()
+        index.train(force=True)
+        print(f"rows={opts.rows} dim={opts.dim} insert {inserted * 1e6 / opts.rows:.0f}us/row  "
+              f"train {time.perf_counter() - started:.1f}s  {index.stats()}")
+
+        # Force the IVF path for the filtered case as well
+        settings.ANN_EXACT_MAX = 0
+        for label, where in (("all", SearchFilter()), ("public", SearchFilter(public_only=True))):
+            truth, exact_ms = _timed(index, queries, opts.k, where, exact=True)
+            print(f"\n[{label}] exact search {exact_ms:.2f} ms/query")
+            print(f"{'nprobe':>7}{'recall':>9}{'ms/query':>10}{'speedup':>9}")
+            for nprobe in [int(n) for n in opts.nprobe.split(",")]:
+                found, ms = _timed(index, queries, opts.k, where, nprobe=nprobe)
+                recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth) if t])
+                print(f"{nprobe:>7}{recall:>9.3f}{ms:>10.2f}{exact_ms / ms:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
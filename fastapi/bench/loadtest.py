@@ -0,0 +1,367 @@
+"""
+Async load-test harness with SLO reporting.
+
+Drives the app with a weighted mix of the real endpoint shapes and reports
+throughput, latency percentiles and error rate per endpoint. Gemini is replaced
+by the offline stub (app/services/gemini_stub.py) so results size our service,
+not the upstream.
+
+Examples (run from the fastapi/ directory):
+
+    # In-process, no network, sweep concurrency
+    uv run python -m bench.loadtest --concurrency 1,8,32 --duration 10
+
+    # Spawn uvicorn on localhost and sweep worker counts too
+    uv run python -m bench.loadtest --mode localhost --workers 1,2,4 --concurrency 16,64
+
+    # Hit an already running server
+    uv run python -m bench.loadtest --mode localhost --base-url http://127.0.0.1:8001
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+
+from app.questions import QUIZ_QUESTIONS
+from app.scoring_update import LABEL_TO_SUBLABEL_ENUM
+
+FASTAPI_DIR = Path(__file__).resolve().parents[1]
+
+DEFAULT_MIX = "quiz_init=3,update_scores=5,diagnostic_start=1,diagnostic_answer=1,embed=3,embed_batch=1"
+
+SAMPLE_TEXTS = [
+    "I snapped at my partner after a long day and regretted it immediately.",
+    "Skipped the gym again and spent the evening scrolling on my phone.",
+    "Finally told my manager I was overloaded instead of just staying late.",
+    "Kept replaying an awkward conversation from last week in my head.",
+    "Apologized to a friend for a joke that went too far.",
+    "Put off my taxes until the night before the deadline.",
+]
+
+ALL_SUBLABELS = [member.value for enum_class in LABEL_TO_SUBLABEL_ENUM.values() for member in enum_class]
+
+
+# ---------------------------------------------------------------------------
+# Request shapes
+# ---------------------------------------------------------------------------
+
+def _quiz_answers(rng: random.Random) -> dict[str, int]:
+    answers = {}
+    for question in QUIZ_QUESTIONS:
+        if question.options:
+            answers[question.question_id] = rng.randrange(len(question.options))
+        else:
+            answers[question.question_id] = rng.randint(1, 5)
+    return answers
+
+
+def _user_scores_payload(rng: random.Random, history: int) -> dict:
+    start = datetime.now(timezone.utc) - timedelta(days=history)
+    overall = 50.0
+    points = []
+    for i in range(history):
+        delta = round(rng.uniform(-2.0, 2.0), 2)
+        overall = round(min(100.0, max(0.0, overall + delta)), 2)
+        points.append({
+            "timestamp": (start + timedelta(days=i)).isoformat(),
+            "overall_score": overall,
+            "delta": delta,
+        })
+    return {
+        "label_scores": {label.value: round(rng.uniform(30, 90), 1) for label in LABEL_TO_SUBLABEL_ENUM},
+        "sublabel_scores": {name: round(rng.uniform(20, 95), 2) for name in rng.sample(ALL_SUBLABELS, 12)},
+        "line_chart_history": points,
+        "initial_report": None,
+    }
+
+
+def _event_context(rng: random.Random) -> dict:
+    return {
+        "title": "Evening argument",
+        "description": rng.choice(SAMPLE_TEXTS),
+        "emotional_severity": rng.randint(1, 5),
+        "triggers": "Tiredness, feeling unheard",
+        "context": {"location": "home", "people_involved": "partner"},
+        "impact": {"on_self": "guilt", "on_others": "hurt"},
+    }
+
+
+def build_request(endpoint: str, rng: random.Random, opts: argparse.Namespace) -> tuple[str, str, dict]:
+    """Return (method, path, json body) for one request of the given endpoint kind."""
+    if endpoint == "quiz_init":
+        return "POST", "/scoring/init-quiz", {"answers": _quiz_answers(rng)}
+    if endpoint == "update_scores":
+        return "POST", "/scoring/update-scores", {
+            "user_scores": _user_scores_payload(rng, opts.history),
+            "ai_sublabel_value": rng.choice(ALL_SUBLABELS),
+            "ai_is_improvement": rng.random() < 0.5,
+            "ai_magnitude": round(rng.uniform(0.1, 1.0), 2),
+        }
+    if endpoint == "diagnostic_start":
+        return "POST", "/diagnostic/start", {
+            "user_input": rng.choice(SAMPLE_TEXTS),
+            "current_scores": {label.value: 60.0 for label in LABEL_TO_SUBLABEL_ENUM},
+            "event_context": _event_context(rng),
+        }
+    if endpoint == "diagnostic_answer":
+        first = rng.choice(SAMPLE_TEXTS)
+        return "POST", "/diagnostic/answer", {
+            "state": {
+                "user_input": first,
+                "ai_question": "What usually happens right before you notice this pattern?",
+                "conversation_history": [{"question": "What is on your mind?", "answer": first}],
+            },
+            "answer": rng.choice(SAMPLE_TEXTS),
+            "current_scores": {label.value: 60.0 for label in LABEL_TO_SUBLABEL_ENUM},
+            "event_context": _event_context(rng),
+        }
+    if endpoint == "embed":
+        return "POST", "/embeddings/generate", {"text": rng.choice(SAMPLE_TEXTS)}
+    if endpoint == "embed_batch":
+        return "POST", "/embeddings/generate-batch", {
+            "texts": [f"{rng.choice(SAMPLE_TEXTS)} #{i}" for i in range(opts.batch_size)]
+        }
+    raise ValueError(f"Unknown endpoint kind: {endpoint}")
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    for name in mix:
+        build_request(name, random.Random(0), argparse.Namespace(history=1, batch_size=1))
+    return mix
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+@dataclass
+class EndpointStats:
+    latencies_ms: list[float] = field(default_factory=list)
+    errors: int = 0
+    status_counts: dict[int, int] = field(default_factory=dict)
+
+    @property
+    def count(self) -> int:
+        return len(self.latencies_ms)
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile on an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+async def _virtual_user(
+    client: httpx.AsyncClient,
+    mix: dict[str, float],
+    stats: dict[str, EndpointStats],
+    deadline: float,
+    warmup_until: float,
+    seed: int,
+    opts: argparse.Namespace,
+) -> None:
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    while time.perf_counter() < deadline:
+        endpoint = rng.choices(names, weights)[0]
+        method, path, body = build_request(endpoint, rng, opts)
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=body)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 0
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if started < warmup_until:
+            continue
+        entry = stats[endpoint]
+        entry.latencies_ms.append(elapsed_ms)
+        entry.status_counts[status] = entry.status_counts.get(status, 0) + 1
+        if status == 0 or status >= 500:
+            entry.errors += 1
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, opts: argparse.Namespace, mix: dict[str, float]) -> dict:
+    stats = {name: EndpointStats() for name in mix}
+    start = time.perf_counter()
+    warmup_until = start + opts.warmup
+    deadline = warmup_until + opts.duration
+    await asyncio.gather(*(
+        _virtual_user(client, mix, stats, deadline, warmup_until, opts.seed + i, opts)
+        for i in range(concurrency)
+    ))
+    measured = time.perf_counter() - warmup_until
+
+    endpoints = {}
+    for name, entry in stats.items():
+        ordered = sorted(entry.latencies_ms)
+        p95 = percentile(ordered, 95)
+        error_rate = entry.errors / entry.count if entry.count else 0.0
+        endpoints[name] = {
+            "requests": entry.count,
+            "rps": round(entry.count / measured, 2),
+            "p50_ms": round(percentile(ordered, 50), 2),
+            "p90_ms": round(percentile(ordered, 90), 2),
+            "p95_ms": round(p95, 2),
+            "p99_ms": round(percentile(ordered, 99), 2),
+            "max_ms": round(ordered[-1], 2) if ordered else 0.0,
+            "error_rate": round(error_rate, 4),
+            "status_counts": entry.status_counts,
+            "slo_ok": entry.count > 0 and p95 <= opts.slo_p95_ms and error_rate <= opts.slo_error_rate,
+        }
+    total = sum(entry.count for entry in stats.values())
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(measured, 2),
+        "total_rps": round(total / measured, 2),
+        "slo_ok": all(e["slo_ok"] for e in endpoints.values() if e["requests"]),
+        "endpoints": endpoints,
+    }
+
+
+def print_level(workers: int | str, result: dict) -> None:
+    verdict = "PASS" if result["slo_ok"] else "FAIL"
+    print(f"\nworkers={workers} concurrency={result['concurrency']} "
+          f"total={result['total_rps']} req/s  SLO {verdict}")
+    print(f"  {'endpoint':<18}{'req':>7}{'rps':>9}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}{'err%':>7}  slo")
+    for name, e in result["endpoints"].items():
+        print(f"  {name:<18}{e['requests']:>7}{e['rps']:>9}{e['p50_ms']:>9}{e['p90_ms']:>9}"
+              f"{e['p95_ms']:>9}{e['p99_ms']:>9}{e['max_ms']:>9}{e['error_rate'] * 100:>7.2f}  "
+              f"{'ok' if e['slo_ok'] else 'MISS'}")
+
+
+# ---------------------------------------------------------------------------
+# Targets
+# ---------------------------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _spawn_server(workers: int, opts: argparse.Namespace) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    env = {**os.environ, "GEMINI_STUB": "1", "GEMINI_STUB_LATENCY_MS": str(opts.stub_latency_ms)}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=FASTAPI_DIR,
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            if httpx.get(base_url + "/", timeout=1.0).status_code == 200:
+                return proc, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f"uvicorn did not become ready on {base_url}")
+
+
+async def _sweep(client: httpx.AsyncClient, workers: int | str, opts: argparse.Namespace, mix: dict[str, float]) -> list[dict]:
+    results = []
+    for concurrency in opts.concurrency:
+        result = await run_level(client, concurrency, opts, mix)
+        result["workers"] = workers
+        print_level(workers, result)
+        results.append(result)
+    return results
+
+
+def _limits(opts: argparse.Namespace) -> httpx.Limits:
+    peak = max(opts.concurrency)
+    return httpx.Limits(max_connections=peak, max_keepalive_connections=peak)
+
+
+async def run_inprocess(opts: argparse.Namespace, mix: dict[str, float]) -> list[dict]:
+    os.environ["GEMINI_STUB"] = "1"
+    os.environ["GEMINI_STUB_LATENCY_MS"] = str(opts.stub_latency_ms)
+    from app.app import create_app
+
+    transport = httpx.ASGITransport(app=create_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://inprocess", timeout=opts.timeout) as client:
+        return await _sweep(client, "in-process", opts, mix)
+
+
+async def run_localhost(opts: argparse.Namespace, mix: dict[str, float]) -> list[dict]:
+    if opts.base_url:
+        async with httpx.AsyncClient(base_url=opts.base_url, timeout=opts.timeout, limits=_limits(opts)) as client:
+            return await _sweep(client, "external", opts, mix)
+
+    results = []
+    for workers in opts.workers:
+        proc, base_url = _spawn_server(workers, opts)
+        try:
+            async with httpx.AsyncClient(base_url=base_url, timeout=opts.timeout, limits=_limits(opts)) as client:
+                results.extend(await _sweep(client, workers, opts, mix))
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+    return results
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["inprocess", "localhost"], default="inprocess")
+    parser.add_argument("--base-url", help="Target an already running server instead of spawning uvicorn")
+    parser.add_argument("--workers", type=_int_list, default=[1], help="Comma separated uvicorn worker counts (localhost mode)")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 8, 32], help="Comma separated virtual user counts")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before each level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted endpoint mix, e.g. quiz_init=3,embed=1")
+    parser.add_argument("--history", type=int, default=200, help="line_chart_history length sent to update-scores")
+    parser.add_argument("--batch-size", type=int, default=32, help="Texts per embedding batch request")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="Simulated Gemini latency")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--slo-p95-ms", type=float, default=250.0)
+    parser.add_argument("--slo-error-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--json", dest="json_path", help="Write the full report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    opts = parse_args(argv)
+    mix = parse_mix(opts.mix)
+    runner = run_inprocess if opts.mode == "inprocess" else run_localhost
+    results = asyncio.run(runner(opts, mix))
+
+    if opts.json_path:
+        report = {
+            "mode": opts.mode,
+            "mix": mix,
+            "slo": {"p95_ms": opts.slo_p95_ms, "error_rate": opts.slo_error_rate},
+            "stub_latency_ms": opts.stub_latency_ms,
+            "levels": results,
+        }
+        Path(opts.json_path).write_text(json.dumps(report, indent=2))
+    return 0 if all(result["slo_ok"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
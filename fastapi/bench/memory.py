@@ -0,0 +1,85 @@
+"""
+Memory per user for the scoring data models, measured with tracemalloc.
+
+Builds users with 20 assessed sub-labels and the given history lengths, then
+reports the bytes allocated per user as a UserScores and as a PackedUserScores
+(app/data/packed.py), plus the size of one AIAnalysisResult and one
+LineChartPoint with its datetime.
+
+    uv run python -m bench.memory --history 0,10,100,1000
+"""
+
+import argparse
+import gc
+import random
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List
+
+from app.data import wire
+from app.data.packed import PackedUserScores
+from app.data.user_score import AIAnalysisResult, LineChartPoint, UserScores
+from app.label import Label
+
+
+def _user(history: int, rng: random.Random) -> UserScores:
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return UserScores(
+        label_scores={label: round(rng.uniform(20, 80), 1) for label in Label},
+        sublabel_scores={m.value: round(rng.uniform(0, 100), 2) for m in rng.sample(wire.SUBLABEL_ORDER, 20)},
+        line_chart_history=[
+            LineChartPoint(
+                timestamp=start + timedelta(hours=i, microseconds=rng.randrange(1_000_000)),
+                overall_score=round(rng.uniform(30, 70), 2),
+                delta=round(rng.uniform(-2, 2), 2),
+            )
+            for i in range(history)
+        ],
+    )
+
+
+def _bytes_each(build: Callable[[], object], count: int) -> float:
+    """Bytes still allocated per object once `count` of them exist (temporaries freed)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept: List[object] = [build() for _ in range(count)]
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return used / count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", default="0,10,100,1000")
+    parser.add_argument("--points", type=int, default=200_000, help="history points built per measurement")
+    opts = parser.parse_args()
+
+    def measure(history: int) -> tuple[float, float]:
+        count = max(50, min(5000, opts.points // max(history, 1)))
+        # Packed users are built from prepared UserScores, so only the packed form is counted
+        sources = iter([_user(history, random.Random(i)) for i in range(count)])
+        plain = _bytes_each(lambda: _user(history, random.Random(0)), count)
+        packed = _bytes_each(lambda: PackedUserScores.pack(next(sources)), count)
+        return plain, packed
+
+    plain_base, packed_base = measure(0)
+    print(f"{'history':>8}{'UserScores B':>14}{'Packed B':>10}{'ratio':>7}{'B/point':>9}{'packed B/point':>16}")
+    for history in [int(n) for n in opts.history.split(",")]:
+        plain, packed = measure(history) if history else (plain_base, packed_base)
+        per_point = (plain - plain_base) / history if history else 0.0
+        per_packed_point = (packed - packed_base) / history if history else 0.0
+        print(f"{history:>8}{plain:>14.0f}{packed:>10.0f}{plain / packed:>6.1f}x{per_point:>9.1f}{per_packed_point:>16.1f}")
+
+    sublabel = wire.SUBLABEL_ORDER[0]
+    now = datetime.now(timezone.utc)
+    rng = random.Random(0)
+    analysis = _bytes_each(lambda: AIAnalysisResult(sublabel, True, rng.random()), 10_000)
+    point = _bytes_each(lambda: LineChartPoint(now + timedelta(seconds=rng.random()), rng.random(), rng.random()), 10_000)
+    print(f"AIAnalysisResult: {analysis:.0f} B, LineChartPoint with its datetime and floats: {point:.0f} B")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Bulk quiz scoring (initialize_many_from_quiz) against one initialize_from_quiz
+call per user, on random answer sets with some questions skipped.
+
+Reports the time per user for both paths and the number of results that
+differ (expected: 0, timestamps aside).
+
+    uv run python -m bench.quiz_bulk --users 1000,10000,50000
+"""
+
+import argparse
+import random
+import time
+
+from app.data.quiz import QuizQuestionType
+from app.data.user_score import UserScores
+from app.questions import QUIZ_QUESTIONS
+from app.scoring_update import QuizScoreTable, initialize_from_quiz, initialize_many_from_quiz
+
+
+def _submissions(users: int, seed: int = 0) -> list[dict[str, int]]:
+    rng = random.Random(seed)
+    return [
+        {
+            question.question_id: (
+                rng.randrange(len(question.options))
+                if question.question_type == QuizQuestionType.SCENARIO
+                else rng.randint(1, 5)
+            )
+            for question in QUIZ_QUESTIONS
+            if rng.random() > 0.05
+        }
+        for _ in range(users)
+    ]
+
+
+def _same(a: UserScores, b: UserScores) -> bool:
+    return (
+        a.label_scores == b.label_scores
+        and [type(v) for v in a.label_scores.values()] == [type(v) for v in b.label_scores.values()]
+        and repr(a.line_chart_history[0].overall_score) == repr(b.line_chart_history[0].overall_score)
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="1000,10000,50000")
+    opts = parser.parse_args()
+
+    table = QuizScoreTable(QUIZ_QUESTIONS)
+    print(f"{'users':>7}{'single us/user':>16}{'bulk us/user':>14}{'speedup':>9}{'mismatches':>12}")
+    for users in [int(n) for n in opts.users.split(",")]:
+        submissions = _submissions(users)
+        started = time.perf_counter()
+        single = [initialize_from_quiz(UserScores(), QUIZ_QUESTIONS, answers) for answers in submissions]
+        single_s = time.perf_counter() - started
+        started = time.perf_counter()
+        bulk = initialize_many_from_quiz(table, submissions)
+        bulk_s = time.perf_counter() - started
+        mismatches = sum(not _same(a, b) for a, b in zip(bulk, single))
+        print(f"{users:>7}{single_s * 1e6 / users:>16.1f}{bulk_s * 1e6 / users:>14.1f}"
+              f"{single_s / bulk_s:>8.1f}x{mismatches:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+What-if simulation (app/services/score_simulation.py): the vectorized kernel
+against applying the same events one at a time with process_ai_analysis.
+
+Reports the time per trajectory for both paths and the largest difference in
+the final overall and label scores (expected: 0, or one rounding step where
+the matrix-product sums land on the other side of a .005 / .05 tie).
+
+    uv run python -m bench.score_simulation --trajectories 2000 --weeks 4,12,52
+"""
+
+import argparse
+import copy
+import random
+import time
+
+import numpy as np
+
+from app.data import wire
+from app.data.user_score import AIAnalysisResult, UserScores
+from app.questions import QUIZ_QUESTIONS
+from app.scoring_update import initialize_from_quiz, process_ai_analysis
+from app.services.score_replay import LABELS
+from app.services.score_simulation import PracticePlan, draw_events, run_trajectories
+from app.weights import active_weights
+
+
+def _user() -> UserScores:
+    rng = random.Random(0)
+    user = initialize_from_quiz(UserScores(), QUIZ_QUESTIONS, {q.question_id: rng.randint(1, 5) for q in QUIZ_QUESTIONS if not q.options})
+    for _ in range(40):
+        process_ai_analysis(user, AIAnalysisResult(rng.choice(wire.SUBLABEL_ORDER), rng.random() < 0.5, rng.random()))
+    return user
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trajectories", type=int, default=2000)
+    parser.add_argument("--weeks", default="4,12,52")
+    parser.add_argument("--loop-sample", type=int, default=100, help="trajectories replayed one event at a time")
+    opts = parser.parse_args()
+
+    user, weights = _user(), active_weights()
+    plan = [
+        PracticePlan(wire.SUBLABEL_ORDER[0], per_week=3, improvement_probability=0.7, magnitude=0.5),
+        PracticePlan(wire.SUBLABEL_ORDER[20], per_week=2, improvement_probability=0.6, magnitude=0.8),
+        PracticePlan(wire.SUBLABEL_ORDER[40], per_week=1, improvement_probability=0.4, magnitude=0.3),
+    ]
+    print(f"{'weeks':>6}{'events':>8}{'vector us/traj':>16}{'loop us/traj':>14}{'speedup':>9}{'max diff':>10}")
+    for weeks in [int(w) for w in opts.weeks.split(",")]:
+        events = draw_events(plan, weeks, opts.trajectories, np.random.default_rng(weeks))
+        started = time.perf_counter()
+        result = run_trajectories(user, events, weeks, weights)
+        vector_s = time.perf_counter() - started
+
+        sample = min(opts.loop_sample, opts.trajectories)
+        diff = 0.0
+        started = time.perf_counter()
+        for row in range(sample):
+            replayed = copy.deepcopy(user)
+            for step in range(events.counts[row]):
+                analysis = AIAnalysisResult(
+                    wire.SUBLABEL_ORDER[events.sublabel[row, step]],
+                    bool(events.improvement[row, step]),
+                    float(events.magnitude[row, step]),
+                )
+                process_ai_analysis(replayed, analysis, weights)
+            diff = max(
+                diff,
+                abs(replayed.line_chart_history[-1].overall_score - result.weekly_overall[row, -1]),
+                *(abs(replayed.label_scores[label] - result.labels[row, i]) for i, label in enumerate(LABELS)),
+            )
+        loop_s = (time.perf_counter() - started) / sample * opts.trajectories
+
+        print(f"{weeks:>6}{events.counts.mean():>8.0f}{vector_s * 1e6 / opts.trajectories:>16.1f}"
+              f"{loop_s * 1e6 / opts.trajectories:>14.1f}{loop_s / vector_s:>8.1f}x{diff:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compare response serialization paths for the largest payloads we return.
+
+- A 100-vector /embeddings/generate-batch response (768 floats per vector)
+- A /scoring/update-scores response with a long line_chart_history
+
+"stdlib" is FastAPI's previous path: validate through the response model,
+jsonable_encoder, then json.dumps. "orjson" is FastJSONResponse on the raw
+route return value; "orjson+numpy" renders a float32 array directly.
+
+    uv run python -m bench.serialization --repeat 50
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.data.user_score import LineChartPoint, UserScores
+from app.responses import FastJSONResponse
+from app.routers.embeddings import BatchEmbeddingResponse
+
+
+def _stdlib_render(model_type, content) -> bytes:
+    adapter = TypeAdapter(model_type)
+    validated = adapter.validate_python(content)
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def _time(fn, repeat: int) -> tuple[float, int]:
+    fn()  # warm
+    started = time.perf_counter()
+    for _ in range(repeat):
+        body = fn()
+    return (time.perf_counter() - started) / repeat * 1000, len(body)
+
+
+def _batch_payload(vectors: int, dims: int) -> dict:
+    rng = random.Random(7)
+    embeddings = [[rng.uniform(-0.1, 0.1) for _ in range(dims)] for _ in range(vectors)]
+    return {"embeddings": embeddings, "count": vectors, "dimensions": dims}
+
+
+def _user_scores(history: int) -> UserScores:
+    rng = random.Random(7)
+    start = datetime.now(timezone.utc) - timedelta(days=history)
+    user = UserScores()
+    user.sublabel_scores = {f"sublabel_{i}": rng.uniform(0, 100) for i in range(40)}
+    user.line_chart_history = [
+        LineChartPoint(timestamp=start + timedelta(hours=i), overall_score=rng.uniform(0, 100), delta=rng.uniform(-2, 2))
+        for i in range(history)
+    ]
+    return user
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--vectors", type=int, default=100)
+    parser.add_argument("--dims", type=int, default=768)
+    parser.add_argument("--history", type=int, default=2000)
+    opts = parser.parse_args()
+
+    rows = []
+    batch = _batch_payload(opts.vectors, opts.dims)
+    rows.append(("batch embeddings", "stdlib", *_time(lambda: _stdlib_render(BatchEmbeddingResponse, batch), opts.repeat)))
+    rows.append(("batch embeddings", "orjson", *_time(lambda: FastJSONResponse(batch).body, opts.repeat)))
+    try:
+        import numpy as np
+
+        array_batch = {**batch, "embeddings": np.asarray(batch["embeddings"], dtype=np.float32)}
+        rows.append(("batch embeddings", "orjson+numpy", *_time(lambda: FastJSONResponse(array_batch).body, opts.repeat)))
+    except ImportError:
+        pass
+
+    user = _user_scores(opts.history)
+    rows.append(("user scores", "stdlib", *_time(lambda: _stdlib_render(UserScores, user), opts.repeat)))
+    rows.append(("user scores", "orjson", *_time(lambda: FastJSONResponse(user).body, opts.repeat)))
+
+    print(f"{'payload':<18}{'path':<14}{'ms/resp':>10}{'bytes':>12}")
+    baseline = {}
+    for payload, path, ms, size in rows:
+        baseline.setdefault(payload, ms)
+        speedup = baseline[payload] / ms if ms else 0.0
+        print(f"{payload:<18}{path:<14}{ms:>10.2f}{size:>12}   x{speedup:.1f}")
+
+
+if __name__ == "__main__":
+    main()
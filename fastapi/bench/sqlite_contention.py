@@ -0,0 +1,117 @@
+"""
+Reader latency and "database is locked" errors under a concurrent writer.
+
+A separate writer process (standing in for Laravel) inserts rows in short
+transactions while reader threads run the /predict query. Two setups are
+compared on a scratch copy of the schema:
+
+- default: plain create_engine, rollback journal, driver-default lock timeout
+- tuned:   app.database.build_engine (WAL, busy_timeout, mmap/cache, read-only pool)
+
+    uv run python -m bench.sqlite_contention --readers 16 --duration 5
+"""
+
+import argparse
+import multiprocessing
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.database import build_engine
+
+
+def _writer(db_path: str, journal_mode: str, stop_at: float, batch: int, hold: float, counter) -> None:
+    conn = sqlite3.connect(db_path, timeout=5, isolation_level=None)
+    conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+    written = 0
+    while time.time() < stop_at:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("INSERT INTO users (name) VALUES (?)", [(f"user {written + i}",) for i in range(batch)])
+        time.sleep(hold)  # request work done while the transaction is open
+        conn.execute("COMMIT")
+        written += batch
+    counter.value = written
+    conn.close()
+
+
+def _prepare(db_path: Path) -> None:
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT)")
+    conn.executemany("INSERT INTO users (name) VALUES (?)", [(f"seed {i}",) for i in range(10_000)])
+    conn.commit()
+    conn.close()
+
+
+def _run(name: str, read_engine, db_path: Path, journal_mode: str, opts: argparse.Namespace) -> None:
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+    stop_at = time.time() + opts.duration
+
+    counter = multiprocessing.Value("i", 0)
+    writer = multiprocessing.Process(
+        target=_writer, args=(str(db_path), journal_mode, stop_at, opts.write_batch, opts.write_hold_ms / 1000, counter)
+    )
+    writer.start()
+
+    def reader() -> None:
+        nonlocal errors
+        while time.time() < stop_at:
+            started = time.perf_counter()
+            try:
+                with read_engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                    conn.execute(text("SELECT COUNT(*) FROM users")).scalar()
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    latencies.append(elapsed)
+            except OperationalError:
+                with lock:
+                    errors += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(opts.readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.join()
+
+    latencies.sort()
+    total = len(latencies) + errors
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else 0.0
+    print(f"{name:<9}{len(latencies) / opts.duration:>10.1f}{pick(0.5):>9.2f}{pick(0.95):>9.2f}{pick(0.99):>9.2f}"
+          f"{errors:>8}{(errors / total * 100 if total else 0):>8.2f}{counter.value / opts.duration:>12.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--write-batch", type=int, default=50, help="Rows per writer transaction")
+    parser.add_argument("--write-hold-ms", type=float, default=5.0, help="Time each writer transaction stays open")
+    opts = parser.parse_args()
+
+    print(f"{'setup':<9}{'reads/s':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'locked':>8}{'err%':>8}{'writes/s':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        default_db = Path(tmp) / "default.sqlite"
+        _prepare(default_db)
+        default_engine = create_engine(f"sqlite:///{default_db}", pool_size=opts.readers)
+        _run("default", default_engine, default_db, "DELETE", opts)
+        default_engine.dispose()
+
+        tuned_db = Path(tmp) / "tuned.sqlite"
+        _prepare(tuned_db)
+        build_engine(db_path=tuned_db).connect().close()  # writer engine switches the file to WAL
+        tuned_engine = build_engine(read_only=True, db_path=tuned_db)
+        _run("tuned", tuned_engine, tuned_db, "WAL", opts)
+        tuned_engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+Recall of the sub-label pre-filter (app/services/sublabel_ranker.py).
+
+Each case is a short reflection/conversation with the sub-labels a reviewer
+expects the analyzer to score. Recall@N is the share of those that survive the
+pre-filter at top-N; the token column is the size of the resulting sub-label
+table in the analyzer prompt.
+
+DEV_CASES were read while app/data/sublabel_descriptions.py was written.
+HELD_OUT_CASES were written afterwards and must not be used to edit the
+descriptions: they are the recall to quote and to pick DIAGNOSTIC_SUBLABEL_TOP_N
+by. When the descriptions change, add fresh held-out cases and move the old
+ones to DEV_CASES.
+
+    uv run python -m bench.sublabel_recall --top-n 8,16,24,32
+    uv run python -m bench.sublabel_recall --split dev
+    GOOGLE_API_KEY=... uv run python -m bench.sublabel_recall --mode hybrid
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.services.prompt_budget import compact_sublabel_table, estimate_tokens
+from app.services.sublabel_ranker import ALL_SUBLABELS, select_sublabels
+
+DEV_CASES: list[tuple[str, set[str]]] = [
+    (
+        "I yelled at my brother over the dishes and slammed the door. I lost my temper again and "
+        "afterwards I felt so ashamed I couldn't look at him.",
+        {"anger_management", "shame_and_guilt_spirals"},
+    ),
+    (
+        "I keep putting off my thesis until the night before the deadline, then scroll TikTok for "
+        "hours instead of starting.",
+        {"procrastination", "screen_and_digital_addiction"},
+    ),
+    (
+        "My manager praised my report but I feel like a fraud and everyone will find out I don't "
+        "belong on this team.",
+        {"impostor_syndrome", "low_self_confidence"},
+    ),
+    (
+        "I said yes to covering another shift even though I'm exhausted. I can't say no to anyone, "
+        "I just want them to like me.",
+        {"people_pleasing", "inability_to_set_boundaries", "sleep_neglect"},
+    ),
+    (
+        "My grandmother passed away last month and I haven't cried. I just pretend I'm fine at work "
+        "and bottle everything up.",
+        {"grief_and_loss_processing", "emotional_suppression"},
+    ),
+    (
+        "If I fail this exam my whole life is ruined, I'll never get a job. I can't stop replaying "
+        "the questions in my head at night.",
+        {"catastrophizing", "overthinking_and_rumination", "anxiety_and_worry"},
+    ),
+    (
+        "I spent my rent money on new sneakers and a designer bag because I wanted people to see I'm "
+        "doing well. Now my credit card debt is growing.",
+        {"financial_irresponsibility", "materialism_and_status_obsession"},
+    ),
+    (
+        "I read my girlfriend's messages while she was asleep because I was suspicious she was "
+        "talking to her ex.",
+        {"boundary_violation", "trust_issues_and_suspicion", "jealousy_and_envy"},
+    ),
+    (
+        "Every weekend I get drunk with my roommates and wake up hungover, then skip the gym and eat "
+        "fast food all Sunday.",
+        {"substance_misuse", "physical_inactivity", "poor_nutrition"},
+    ),
+    (
+        "When my coworker criticized my code I went silent and gave her the silent treatment for a "
+        "week, then made sarcastic comments in the standup.",
+        {"passive_aggression", "identity_fragility"},
+    ),
+    (
+        "I told my friend a racist joke at the party and when someone called me out I said it was "
+        "their fault for being too sensitive.",
+        {"racism_ethnic_prejudice", "lack_of_accountability"},
+    ),
+    (
+        "I haven't left my room in days. I've stopped answering my friends and feel lonely, but "
+        "there's no point trying, nothing works anyway.",
+        {"isolation_and_withdrawal", "learned_helplessness"},
+    ),
+    (
+        "I redid the presentation slides six times because they weren't perfect, and missed the "
+        "deadline. Any mistake feels unacceptable.",
+        {"toxic_perfectionism", "poor_time_management"},
+    ),
+    (
+        "I've been working until midnight every day for months and I'm burning out, but I feel "
+        "guilty when I stop working.",
+        {"workaholism", "shame_and_guilt_spirals", "sleep_neglect"},
+    ),
+    (
+        "I can't decide whether to switch majors. I keep going back and forth between options and "
+        "second guessing every choice.",
+        {"indecisiveness_and_decision_paralysis", "fear_of_failure"},
+    ),
+    (
+        "I've already put four years into this relationship so I can't leave now, even though we "
+        "fight constantly and scream insults at each other.",
+        {"sunk_cost_fallacy", "destructive_conflict"},
+    ),
+    (
+        "My sister got the promotion I wanted and I felt jealous and resentful. I still can't "
+        "forgive her for not telling me first.",
+        {"jealousy_and_envy", "grudge_holding_and_unforgiveness"},
+    ),
+    (
+        "I lied to my parents about where the money went and covered it up by blaming my brother.",
+        {"dishonesty_and_deception", "lack_of_accountability"},
+    ),
+    (
+        "During the meeting I kept interrupting my teammate and planning my reply instead of "
+        "listening, so I misunderstood the whole plan.",
+        {"active_listening_failure", "poor_communication"},
+    ),
+    (
+        "I avoided the argument with my roommate and kept the peace by staying quiet, even though "
+        "the situation has been bothering me for weeks.",
+        {"conflict_avoidance", "emotional_suppression"},
+    ),
+    (
+        "I feel empty and don't know what my purpose is. Nothing seems meaningful and I don't know "
+        "who I am anymore.",
+        {"lack_of_purpose", "spiritual_existential_disconnection", "identity_fragility"},
+    ),
+    (
+        "I can't focus in lectures, my mind wanders and I'm constantly distracted by my phone "
+        "notifications.",
+        {"attention_and_focus_deficit", "screen_and_digital_addiction"},
+    ),
+    (
+        "Everything always happens to me. My boss is unfair and everyone is against me, so there's "
+        "nothing I can do about it.",
+        {"victim_mentality", "attribution_errors"},
+    ),
+    (
+        "I made an impulsive decision to quit my job on the spot after a bad day and my mood swings "
+        "have been up and down all week.",
+        {"impulsivity", "mood_volatility"},
+    ),
+]
+
+HELD_OUT_CASES: list[tuple[str, set[str]]] = [
+    (
+        "My best friend's dad died and I didn't text her for two weeks because I had no idea what "
+        "to say. I just acted like nothing happened when I saw her.",
+        {"empathy_deficit", "conflict_avoidance"},
+    ),
+    (
+        "Got an A on the midterm and honestly I think the professor graded it wrong. Sooner or later "
+        "people will realise I'm not actually smart.",
+        {"impostor_syndrome", "low_self_worth"},
+    ),
+    (
+        "I snooped through my partner's laptop last night. I'm sure she's hiding something, even "
+        "though she's never given me a reason.",
+        {"boundary_violation", "trust_issues_and_suspicion"},
+    ),
+    (
+        "Three energy drinks a day and I still can't get through the afternoon. I'm in bed by 3am "
+        "most nights.",
+        {"sleep_neglect", "poor_nutrition"},
+    ),
+    (
+        "My group project partner did nothing so I redid his whole section without saying anything "
+        "to him. Now I'm furious and he has no idea.",
+        {"conflict_avoidance", "anger_management", "poor_communication"},
+    ),
+    (
+        "I bought a second gaming console on my credit card even though I'm behind on rent. It felt "
+        "good for about an hour.",
+        {"financial_irresponsibility", "impulsivity"},
+    ),
+    (
+        "Every time my mum calls I feel this knot in my stomach and my heart races. I keep imagining "
+        "she's going to tell me someone is sick.",
+        {"anxiety_and_worry", "catastrophizing"},
+    ),
+    (
+        "I told the whole team that Jamie only got the job because of who she knows. I don't even "
+        "know if that's true.",
+        {"gossip_and_backbiting", "dishonesty_and_deception"},
+    ),
+    (
+        "If my boyfriend doesn't reply within ten minutes I assume he's done with me and I message "
+        "him over and over until he answers.",
+        {"emotional_dependency", "fear_of_rejection", "trust_issues_and_suspicion"},
+    ),
+    (
+        "I haven't been to the gym since January and I spend most evenings on the couch watching "
+        "series until I fall asleep.",
+        {"physical_inactivity", "screen_and_digital_addiction"},
+    ),
+    (
+        "When the coach pointed out a mistake in front of everyone I stormed off and quit the team. "
+        "I can't handle being corrected.",
+        {"identity_fragility", "frustration_tolerance", "impulsivity"},
+    ),
+    (
+        "I made a joke about my coworker's accent and everyone laughed. She looked upset but it was "
+        "just banter.",
+        {"racism_ethnic_prejudice", "empathy_deficit"},
+    ),
+    (
+        "I keep telling my little brother to get off his phone while I'm on mine for six hours a day.",
+        {"hypocrisy", "screen_and_digital_addiction"},
+    ),
+    (
+        "The dishes piled up for a week and I haven't done laundry in ages. I just don't have the "
+        "energy to look after myself.",
+        {"hygiene_and_self_care_neglect", "learned_helplessness"},
+    ),
+    (
+        "Since the layoff I don't really know what I'm doing with my life. Every day feels the same "
+        "and nothing I do seems to matter.",
+        {"lack_of_purpose", "spiritual_existential_disconnection"},
+    ),
+    (
+        "I refuse to let my roommate use the kitchen on weekends because I pay a bit more rent. "
+        "Rules are rules.",
+        {"entitlement_and_selfishness"},
+    ),
+    (
+        "My math teacher said I'd never be good with numbers so I stopped trying. Some people just "
+        "aren't built for it.",
+        {"fixed_mindset", "learned_helplessness"},
+    ),
+    (
+        "I've been drinking alone most nights to take the edge off. I tell my friends I'm busy so I "
+        "don't have to see them.",
+        {"substance_misuse", "isolation_and_withdrawal", "dishonesty_and_deception"},
+    ),
+    (
+        "When my classmate got into the exchange program I told everyone she only got it because the "
+        "teacher likes her.",
+        {"jealousy_and_envy", "gossip_and_backbiting"},
+    ),
+    (
+        "I cried at work today and then pretended it was allergies. I didn't even know why I was "
+        "crying.",
+        {"emotional_awareness", "emotional_suppression"},
+    ),
+    (
+        "I pushed the new intern around in meetings and made fun of her questions until she asked "
+        "to switch teams.",
+        {"bullying_and_intimidation", "cruelty_and_callousness"},
+    ),
+    (
+        "I've had the same job for eight years. It's fine, I don't want to learn anything new, "
+        "why bother.",
+        {"complacency"},
+    ),
+    (
+        "I'm drowning in coursework but I'd rather fail than admit to my advisor that I'm struggling.",
+        {"inability_to_ask_for_help", "fear_of_failure"},
+    ),
+    (
+        "My wife asked me to stop making comments about how women can't drive. I told her she has no "
+        "sense of humor.",
+        {"misogyny_gender_disrespect", "lack_of_accountability"},
+    ),
+    (
+        "I worked on the app for two years, nobody uses it, but I keep pouring weekends into it "
+        "because otherwise all that effort was wasted.",
+        {"sunk_cost_fallacy"},
+    ),
+    (
+        "After the game I was sure we'd lose; I told everyone I'd predicted it. I read only the "
+        "reviews that agree with my take.",
+        {"hindsight_bias", "confirmation_bias"},
+    ),
+    (
+        "I went along with my friends vaping behind the school even though I didn't want to, because "
+        "everyone was doing it.",
+        {"bandwagon_effect", "substance_misuse"},
+    ),
+    (
+        "One minute I'm laughing and the next I'm screaming at my kids. My partner says living with me "
+        "is like walking on eggshells.",
+        {"mood_volatility", "anger_management"},
+    ),
+]
+
+CASES = {"held-out": HELD_OUT_CASES, "dev": DEV_CASES, "all": DEV_CASES + HELD_OUT_CASES}
+
+
+async def _evaluate(mode: str, top_ns: list[int], split: str) -> None:
+    cases = CASES[split]
+    full_tokens = estimate_tokens(compact_sublabel_table(ALL_SUBLABELS))
+    print(f"mode={mode}  split={split}  cases={len(cases)}  sublabels={len(ALL_SUBLABELS)}  full table ~{full_tokens} tokens")
+    print(f"{'top-N':>6}{'recall':>9}{'all-hit':>9}{'tokens':>9}{'ms/case':>9}")
+    for top_n in top_ns:
+        found = expected = all_hit = tokens = 0
+        started = time.perf_counter()
+        for text, labels in cases:
+            selected = await select_sublabels(text, top_n=top_n, mode=mode)
+            names = {member.value for member in selected}
+            hits = len(labels & names)
+            found += hits
+            expected += len(labels)
+            all_hit += hits == len(labels)
+            tokens += estimate_tokens(compact_sublabel_table(selected))
+        elapsed = (time.perf_counter() - started) * 1000 / len(cases)
+        print(f"{top_n:>6}{found / expected:>9.3f}{all_hit / len(cases):>9.3f}"
+              f"{tokens / len(cases):>9.0f}{elapsed:>9.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", default="lexical", choices=["lexical", "embedding", "hybrid"])
+    parser.add_argument("--top-n", default="4,8,12,16,24,32")
+    parser.add_argument("--split", default="held-out", choices=list(CASES))
+    opts = parser.parse_args()
+    asyncio.run(_evaluate(opts.mode, [int(n) for n in opts.top_n.split(",")], opts.split))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Payload size and CPU per update for /scoring/update-scores vs the compact path.
+
+The pydantic path ships the full history both ways. The compact path sends the
+last history point only and receives just the appended point.
+
+    uv run python -m bench.wire_format --history 10,100,1000,5000
+"""
+
+import argparse
+import copy
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import msgspec
+from pydantic import TypeAdapter
+
+from app.data import wire
+from app.data.user_score import AIAnalysisResult, LineChartPoint, UserScores
+from app.responses import FastJSONResponse
+from app.routers.scoring import UpdateScoreRequest
+from app.scoring_update import process_ai_analysis
+
+
+def _user(history: int) -> UserScores:
+    rng = random.Random(history)
+    start = datetime.now(timezone.utc) - timedelta(days=history)
+    user = UserScores()
+    for member in rng.sample(wire.SUBLABEL_ORDER, 20):
+        user.sublabel_scores[member.value] = round(rng.uniform(20, 90), 2)
+    user.line_chart_history = [
+        LineChartPoint(timestamp=start + timedelta(hours=i), overall_score=round(rng.uniform(30, 70), 2),
+                       delta=round(rng.uniform(-2, 2), 2))
+        for i in range(history)
+    ]
+    return user
+
+
+def _pydantic_round_trip(body: bytes) -> bytes:
+    payload = TypeAdapter(UpdateScoreRequest).validate_json(body)
+    analysis = AIAnalysisResult(
+        sublabel=wire.SUBLABEL_ORDER[wire.SUBLABEL_INDEX[payload.ai_sublabel_value]],
+        is_improvement=payload.ai_is_improvement,
+        magnitude=payload.ai_magnitude,
+    )
+    return FastJSONResponse(process_ai_analysis(payload.user_scores, analysis)).body
+
+
+def _compact_round_trip(body: bytes) -> bytes:
+    payload = wire.update_request_decoder.decode(body)
+    user, offset = wire.from_compact(payload.scores)
+    known = len(user.line_chart_history)
+    analysis = AIAnalysisResult(
+        sublabel=wire.SUBLABEL_ORDER[wire.SUBLABEL_INDEX[payload.analysis.sublabel]],
+        is_improvement=payload.analysis.is_improvement,
+        magnitude=payload.analysis.magnitude,
+    )
+    return wire.json_encoder.encode(wire.to_compact(process_ai_analysis(user, analysis), offset=offset, since=known))
+
+
+def _time(fn, body: bytes, repeat: int) -> tuple[float, int]:
+    response = fn(body)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(body)
+    return (time.perf_counter() - started) / repeat * 1000, len(response)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", default="10,100,1000,5000")
+    parser.add_argument("--repeat", type=int, default=50)
+    opts = parser.parse_args()
+
+    print(f"{'history':>8} {'path':<9}{'req bytes':>11}{'resp bytes':>12}{'ms/update':>11}")
+    for history in [int(v) for v in opts.history.split(",")]:
+        user = _user(history)
+        full_body = json.dumps({
+            "user_scores": json.loads(FastJSONResponse(user).body),
+            "ai_sublabel_value": "procrastination",
+            "ai_is_improvement": False,
+            "ai_magnitude": 0.6,
+        }).encode()
+        compact_body = msgspec.json.encode(wire.CompactUpdateRequest(
+            scores=wire.to_compact(copy.deepcopy(user), since=max(0, history - 1)),
+            analysis=wire.CompactAnalysis(sublabel="procrastination", is_improvement=False, magnitude=0.6),
+        ))
+        for name, fn, body in (("pydantic", _pydantic_round_trip, full_body), ("compact", _compact_round_trip, compact_body)):
+            ms, response_size = _time(fn, body, opts.repeat)
+            print(f"{history:>8} {name:<9}{len(body):>11}{response_size:>12}{ms:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
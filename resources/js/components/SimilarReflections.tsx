@@ -3,7 +3,7 @@ import { Link } from '@inertiajs/react';
 import { Card, CardHeader, CardTitle, CardContent } from '@/components/ui/card';
 import { Badge } from '@/components/ui/badge';
 import { Sparkles, Calendar } from 'lucide-react';
-import { eventsShow } from '@/route-helpers';
+import { community, eventsShow } from '@/route-helpers';
 
 interface SimilarReflection {
     id: number;
@@ -21,6 +21,7 @@ interface SimilarReflectionsProps {
 
 export default function SimilarReflections({ eventId }: SimilarReflectionsProps) {
     const [similar, setSimilar] = useState<SimilarReflection[]>([]);
+    const [communitySimilar, setCommunitySimilar] = useState<SimilarReflection[]>([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState<string | null>(null);
 
@@ -37,6 +38,7 @@ export default function SimilarReflections({ eventId }: SimilarReflectionsProps)
             }
             const data = await response.json();
             setSimilar(data.similar_reflections || []);
+            setCommunitySimilar(data.community_reflections || []);
         } catch (err) {
             console.error('Error fetching similar reflections:', err);
             setError(err instanceof Error ? err.message : 'Unknown error');
@@ -75,7 +77,7 @@ export default function SimilarReflections({ eventId }: SimilarReflectionsProps)
         );
     }
 
-    if (similar.length === 0) {
+    if (similar.length === 0 && communitySimilar.length === 0) {
         return (
             <Card>
                 <CardHeader>
@@ -151,6 +153,37 @@ export default function SimilarReflections({ eventId }: SimilarReflectionsProps)
                         </div>
                     </Link>
                 ))}
+                {communitySimilar.length > 0 && (
+                    <div className="space-y-3 pt-2">
+                        <p className="text-sm font-medium">From the community</p>
+                        {communitySimilar.map((reflection) => (
+                            <Link
+                                key={reflection.id}
+                                href={community()}
+                                className="block p-3 rounded-lg border hover:bg-accent transition-colors"
+                            >
+                                <div className="flex items-start justify-between gap-3">
+                                    <div className="flex-1 min-w-0">
+                                        <h4 className="font-medium text-sm truncate mb-1">
+                                            {reflection.title}
+                                        </h4>
+                                        <p className="text-xs text-muted-foreground line-clamp-2">
+                                            {reflection.description}
+                                        </p>
+                                    </div>
+                                    {reflection.similarity_score !== undefined && (
+                                        <Badge
+                                            variant="secondary"
+                                            className="text-xs shrink-0"
+                                        >
+                                            {Math.round(reflection.similarity_score * 100)}% match
+                                        </Badge>
+                                    )}
+                                </div>
+                            </Link>
+                        ))}
+                    </div>
+                )}
             </CardContent>
         </Card>
     );